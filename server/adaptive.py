@@ -0,0 +1,159 @@
+"""
+Per-viewer adaptive quality/fps/resolution control.
+
+The controller watches how long each frame takes to write to the viewer's
+socket, how many bytes sit in the transport's write buffer and, when the
+client sends frameAck messages, how many frames are still unacknowledged
+and how long frames take from capture to the client's ack.
+Once per window it steps down a ladder of settings when the link is
+congested, and back up after a few healthy windows in a row:
+
+    quality first (cheapest to notice), then fps, then resolution
+
+All steps stay within the requested settings (the ceiling) and the
+configured floors.
+"""
+import time
+
+MIN_QUALITY = 25
+MIN_FPS = 5
+MIN_SCALE = 0.5
+QUALITY_STEP = 15
+
+WINDOW = 1.0                 # seconds between decisions
+CONGESTED_SEND_RATIO = 0.5   # mean send time above this share of the frame interval
+HEALTHY_SEND_RATIO = 0.2
+BACKLOG_LIMIT = 512 * 1024   # bytes waiting in the write buffer
+MAX_UNACKED = 4              # frames sent but not acknowledged
+MAX_LATENCY = 0.5            # mean capture-to-ack seconds
+HEALTHY_LATENCY = 0.2
+UPGRADE_WINDOWS = 4          # healthy windows before stepping back up
+
+
+class AdaptiveController:
+    """Steps one viewer's stream settings down and up a fixed ladder."""
+
+    def __init__(self, width: int, height: int, quality: int, fps: int,
+                 min_quality=MIN_QUALITY, min_fps=MIN_FPS, min_scale=MIN_SCALE):
+        self.min_quality = min(min_quality, quality)
+        self.min_fps = min(min_fps, fps)
+        self.min_scale = min_scale
+        self.reason = None
+        self.rebase(width, height, quality, fps)
+
+    def rebase(self, width: int, height: int, quality: int, fps: int):
+        """Set new requested settings and start again from the top."""
+        self.levels = self._build_ladder(width, height, quality, fps)
+        self.level = 0
+        self._healthy_windows = 0
+        self._reset_window(time.monotonic())
+
+    @property
+    def settings(self) -> tuple:
+        """Current (width, height, quality, fps)."""
+        return self.levels[self.level]
+
+    def observe(self, send_time: float, backlog: int, unacked: int | None):
+        """Record one frame write."""
+        self._sends += 1
+        self._send_time += send_time
+        self._backlog = max(self._backlog, backlog)
+        if unacked is not None:
+            self._unacked = max(self._unacked, unacked)
+
+    def observe_latency(self, latency: float):
+        """Record one frame's capture-to-ack latency."""
+        self._acks += 1
+        self._latency += latency
+
+    def evaluate(self, now: float | None = None) -> str | None:
+        """Close the window if it is due; returns a reason when the level changed."""
+        now = time.monotonic() if now is None else now
+        if now - self._window_start < WINDOW or not self._sends:
+            return None
+
+        interval = 1.0 / self.settings[3]
+        mean_send = self._send_time / self._sends
+        backlog, unacked = self._backlog, self._unacked
+        latency = self._latency / self._acks if self._acks else None
+        self._reset_window(now)
+
+        if backlog > BACKLOG_LIMIT:
+            return self._step_down(f"write backlog {backlog // 1024} KB")
+        if unacked > MAX_UNACKED:
+            return self._step_down(f"{unacked} frames unacknowledged")
+        if latency is not None and latency > MAX_LATENCY:
+            return self._step_down(f"latency {latency * 1000:.0f} ms")
+        if mean_send > interval * CONGESTED_SEND_RATIO:
+            return self._step_down(f"send time {mean_send * 1000:.0f} ms")
+
+        if (mean_send < interval * HEALTHY_SEND_RATIO and backlog < BACKLOG_LIMIT / 4
+                and unacked <= 1 and (latency is None or latency < HEALTHY_LATENCY)):
+            self._healthy_windows += 1
+            if self._healthy_windows >= UPGRADE_WINDOWS and self.level > 0:
+                self._healthy_windows = 0
+                self.level -= 1
+                self.reason = "link healthy"
+                return self.reason
+        else:
+            self._healthy_windows = 0
+        return None
+
+    def describe(self) -> dict:
+        width, height, quality, fps = self.settings
+        return {
+            "level": self.level,
+            "levels": len(self.levels),
+            "width": width,
+            "height": height,
+            "quality": quality,
+            "fps": fps,
+            "minQuality": self.min_quality,
+            "minFps": self.min_fps,
+            "minScale": self.min_scale,
+            "reason": self.reason,
+        }
+
+    def _step_down(self, reason: str) -> str | None:
+        self._healthy_windows = 0
+        if self.level == len(self.levels) - 1:
+            return None
+        self.level += 1
+        self.reason = reason
+        return reason
+
+    def _reset_window(self, now: float):
+        self._window_start = now
+        self._sends = 0
+        self._send_time = 0.0
+        self._backlog = 0
+        self._unacked = 0
+        self._acks = 0
+        self._latency = 0.0
+
+    def _build_ladder(self, width, height, quality, fps) -> list:
+        levels = []
+
+        def add(scale, q, f):
+            w, h = int(width * scale) & ~1, int(height * scale) & ~1
+            level = (w, h, max(q, self.min_quality), max(f, self.min_fps))
+            if not levels or levels[-1] != level:
+                levels.append(level)
+
+        # Quality first
+        q = quality
+        add(1.0, q, fps)
+        while q > self.min_quality:
+            q = max(q - QUALITY_STEP, self.min_quality)
+            add(1.0, q, fps)
+
+        # Then frame rate
+        for f in (fps * 2 // 3, fps // 2, fps // 3):
+            add(1.0, q, f)
+        f = max(fps // 3, self.min_fps)
+
+        # Then resolution
+        for scale in (0.75, self.min_scale):
+            if scale >= self.min_scale:
+                add(scale, q, f)
+        return levels
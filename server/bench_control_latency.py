@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Measure /ws control-command latency with and without screen streaming
+
+Connects to a running server.py, times round trips of a no-op command
+(resetMouse) while idle, then again while N /screen viewers are streaming.
+With capture/encode off the event loop both runs should look the same.
+
+Start the server with the default thread engine, then with
+STREAM_ENGINE=process, to compare encoding in the server process against
+worker processes.
+
+Usage:
+    python server.py                     (in another terminal)
+    python bench_control_latency.py --viewers 3 --samples 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+async def authenticate(ws, password: str):
+    await ws.send_json({"command": "auth", "password": password})
+    async for msg in ws:
+        if msg.type != aiohttp.WSMsgType.TEXT:
+            continue
+        data = json.loads(msg.data)
+        if data.get('type') == 'authSuccess':
+            return
+        if data.get('type') == 'authFailed':
+            raise SystemExit('❌ Authentication failed (check REMOTE_PASSWORD)')
+
+
+async def measure_round_trips(ws, samples: int, interval: float) -> list[float]:
+    """Send resetMouse and wait for its status reply, in milliseconds."""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        await ws.send_json({"command": "resetMouse"})
+        while True:
+            msg = await ws.receive()
+            if msg.type == aiohttp.WSMsgType.TEXT and 'status' in json.loads(msg.data):
+                break
+        timings.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return timings
+
+
+async def run_viewer(session, url: str, password: str, args, frames: list):
+    """Subscribe to /screen and count received frames."""
+    async with session.ws_connect(f'{url}/screen') as ws:
+        await authenticate(ws, password)
+        await ws.send_json({"command": "startStream", "width": args.width, "height": args.height,
+                            "fps": args.fps, "quality": args.quality})
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                frames.append(len(msg.data))
+
+
+def summarize(label: str, timings: list[float]) -> dict:
+    ordered = sorted(timings)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    result = {
+        "p50_ms": round(statistics.median(ordered), 2),
+        "p99_ms": round(p99, 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+    print(f"{label:<12} p50 {result['p50_ms']:7.2f} ms   p99 {result['p99_ms']:7.2f} ms   max {result['max_ms']:7.2f} ms")
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='ws://127.0.0.1:8080')
+    parser.add_argument('--password', default=os.getenv('REMOTE_PASSWORD', 'changeme'))
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.01, help='seconds between commands')
+    parser.add_argument('--viewers', type=int, default=1)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--quality', type=int, default=60)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(f'{args.url}/ws') as control:
+            await authenticate(control, args.password)
+
+            idle = await measure_round_trips(control, args.samples, args.interval)
+
+            frames = []
+            viewers = [asyncio.create_task(run_viewer(session, args.url, args.password, args, frames))
+                       for _ in range(args.viewers)]
+            await asyncio.sleep(1.0)  # let the streams warm up
+            frames.clear()
+            start = time.perf_counter()
+            streaming = await measure_round_trips(control, args.samples, args.interval)
+            elapsed = time.perf_counter() - start
+            for task in viewers:
+                task.cancel()
+
+    print(f"\n📊 Control latency ({args.samples} samples, {args.viewers} viewer(s) at "
+          f"{args.width}x{args.height} @ {args.fps}fps)\n")
+    results = {
+        "idle": summarize('idle', idle),
+        "streaming": summarize('streaming', streaming),
+        "received_fps": round(len(frames) / elapsed / max(args.viewers, 1), 1),
+    }
+    print(f"\nReceived {results['received_fps']} fps per viewer while measuring")
+    if args.json:
+        print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
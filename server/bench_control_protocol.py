@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+JSON vs binary control messages: cost per command
+
+In-process (default): the server-side work per message for each framing,
+with the client's encode included:
+    json    json.dumps -> json.loads -> dispatch -> json.dumps reply
+    binary  struct pack -> decode (table lookup) -> ack only if the opcode
+            is not fire-and-forget
+
+With --url, against a running server: sends N moveMouse on /ws with each
+framing and measures the wall time until the server has handled them all
+(every JSON reply received; for binary, the ack of a trailing resetMouse).
+
+Usage:
+    python bench_control_protocol.py
+    python bench_control_protocol.py --iterations 200000 --json
+    python bench_control_protocol.py --url ws://localhost:8080/ws --password changeme --messages 2000
+"""
+import argparse
+import asyncio
+import json
+import time
+import control_protocol
+
+COMMANDS = {
+    'moveMouse': {"command": "moveMouse", "dx": 12, "dy": -7},
+    'mouseLeftClick': {"command": "mouseLeftClick"},
+}
+
+
+def json_roundtrip(cmd: dict) -> int:
+    message = json.dumps(cmd)
+    data = json.loads(message)
+    handler = data.get('command')
+    reply = json.dumps({"status": "ok"}) if handler else ''
+    return len(message) + len(reply)
+
+
+def binary_roundtrip(frame_args: tuple) -> int:
+    frame = control_protocol.encode(*frame_args)
+    op, seq, _ = control_protocol.decode(frame)
+    ack = control_protocol.encode_ack(op, seq) if op.ack else b''
+    return len(frame) + len(ack)
+
+
+def measure(func, arg, iterations: int) -> tuple:
+    size = func(arg)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) / iterations * 1e9, size
+
+
+def run_micro(iterations: int) -> list:
+    results = []
+    for name, cmd in COMMANDS.items():
+        frame_args = (name, 1, cmd.get('dx', 0), cmd.get('dy', 0))
+        for framing, func, arg in (('json', json_roundtrip, cmd), ('binary', binary_roundtrip, frame_args)):
+            ns, size = measure(func, arg, iterations)
+            results.append({"command": name, "framing": framing, "ns_per_message": round(ns, 1),
+                            "bytes_per_message": size})
+    return results
+
+
+async def run_remote(url: str, password: str, messages: int) -> list:
+    import aiohttp
+    results = []
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(url) as ws:
+            await ws.receive_json()  # authRequired
+            await ws.send_json({"command": "auth", "password": password})
+            if (await ws.receive_json()).get('type') != 'authSuccess':
+                raise SystemExit("❌ Authentication failed")
+            await ws.receive_json()  # volumeUpdate
+            await ws.send_json({"command": "binaryProtocol"})
+            await ws.receive_json()
+
+            start = time.perf_counter()
+            for _ in range(messages):
+                await ws.send_json(COMMANDS['moveMouse'])
+            for _ in range(messages):
+                await ws.receive_json()
+            results.append(("json", time.perf_counter() - start))
+
+            start = time.perf_counter()
+            for seq in range(messages):
+                await ws.send_bytes(control_protocol.encode('moveMouse', seq, 0, 0))
+            await ws.send_bytes(control_protocol.encode('resetMouse', messages))
+            while (await ws.receive()).type != aiohttp.WSMsgType.BINARY:
+                pass
+            results.append(("binary", time.perf_counter() - start))
+
+    return [{"command": "moveMouse", "framing": framing, "messages": messages,
+             "us_per_message": round(elapsed / messages * 1e6, 2),
+             "per_second": round(messages / elapsed)} for framing, elapsed in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--url', help='benchmark a running server instead')
+    parser.add_argument('--password', default='changeme')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    if args.url:
+        results = asyncio.run(run_remote(args.url, args.password, args.messages))
+    else:
+        results = run_micro(args.iterations)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    if args.url:
+        print(f"\n🌐 {args.messages} moveMouse to {args.url}\n")
+        print(f"{'framing':<9}{'µs/msg':>9}{'msg/s':>10}")
+        for r in results:
+            print(f"{r['framing']:<9}{r['us_per_message']:>9.2f}{r['per_second']:>10}")
+    else:
+        print(f"\n📦 {args.iterations} messages each, request + reply\n")
+        print(f"{'command':<16}{'framing':<9}{'ns/msg':>9}{'bytes':>7}")
+        for r in results:
+            print(f"{r['command']:<16}{r['framing']:<9}{r['ns_per_message']:>9.0f}{r['bytes_per_message']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Compare frame encoder backends: ms/frame and bytes/frame
+
+Runs each available backend through ScreenStreamer.encode (convert, resize,
+encode) on a deterministic desktop-like frame, for a few qualities.
+No display needed.
+
+Usage:
+    python bench_encoders.py
+    python bench_encoders.py --source 1920x1080 --size 1280x720 --quality 40 60 80 --json
+"""
+import argparse
+import json
+import time
+from capture import Frame, SyntheticSource
+from encoders import available_encoders
+from streaming import ScreenStreamer
+
+
+def parse_size(value: str) -> tuple:
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def run(encoder: str, capture: Frame, size: tuple, quality: int, iterations: int) -> dict:
+    streamer = ScreenStreamer(size[0], size[1], quality, encoder=encoder)
+    streamer.encode(capture)  # warm up
+
+    timings, sizes = [], []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        data = streamer.encode(capture)
+        timings.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(data))
+    streamer._executor.shutdown()
+
+    timings.sort()
+    return {
+        "encoder": encoder,
+        "quality": quality,
+        "ms_per_frame": round(timings[len(timings) // 2], 2),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 2),
+        "bytes_per_frame": int(sum(sizes) / len(sizes)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default='1920x1080', type=parse_size, help='captured size')
+    parser.add_argument('--size', default='1280x720', type=parse_size, help='streamed size')
+    parser.add_argument('--quality', type=int, nargs='+', default=[40, 60, 80])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    capture = SyntheticSource(*args.source).grab()
+    results = [run(encoder, capture, args.size, quality, args.iterations)
+               for encoder in available_encoders() for quality in args.quality]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n📊 {args.source[0]}x{args.source[1]} → {args.size[0]}x{args.size[1]}, "
+          f"{args.iterations} frames each\n")
+    print(f"{'encoder':<14}{'quality':>8}{'ms/frame':>10}{'p99 ms':>9}{'KB/frame':>10}")
+    for r in results:
+        print(f"{r['encoder']:<14}{r['quality']:>8}{r['ms_per_frame']:>10.2f}"
+              f"{r['p99_ms']:>9.2f}{r['bytes_per_frame'] / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
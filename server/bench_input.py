@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Input backend latency: ms per command for each backend
+
+Sends the same commands through every selected backend and reports
+p50/p99 latency and commands per second. 'spawn' is the floor for any
+one-process-per-command backend: the cost of starting a trivial process
+(osascript on macOS, `true` elsewhere) without doing anything.
+
+The default commands are harmless: read the volume and move the pointer
+by zero. --keys also presses play/pause, which reaches the frontmost app.
+
+Usage:
+    python bench_input.py
+    python bench_input.py --backends fake fake-worker --iterations 1000 --json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from input_backends import BACKENDS, available_backends
+
+OPERATIONS = {
+    'getVolume': lambda backend: backend.get_volume(),
+    'move': lambda backend: backend.move_mouse(0, 0),
+    'key': lambda backend: backend.key('togglePlayPause'),
+}
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def summarize(name: str, op: str, timings: list) -> dict:
+    return {
+        "backend": name,
+        "op": op,
+        "p50_ms": round(percentile(timings, 0.5), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "per_second": round(len(timings) / (sum(timings) / 1000), 1),
+    }
+
+
+def run(name: str, op: str, iterations: int) -> dict:
+    backend = BACKENDS[name]()
+    backend.start()
+    try:
+        OPERATIONS[op](backend)  # warm up
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            OPERATIONS[op](backend)
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        backend.close()
+    return summarize(name, op, timings)
+
+
+def run_spawn(iterations: int) -> dict:
+    command = ['osascript', '-e', 'return'] if sys.platform == 'darwin' else ['true']
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize('spawn', command[0], timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=available_backends())
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--keys', action='store_true', help='also press play/pause')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    ops = ['getVolume', 'move'] + (['key'] if args.keys else [])
+    backends = [name for name in args.backends if name in available_backends()]
+    # The old path spawns per command: a few iterations are enough
+    spawn_iterations = min(args.iterations, 50)
+
+    results = [run(name, op, spawn_iterations if name == 'osascript' else args.iterations)
+               for name in backends for op in ops]
+    results.append(run_spawn(spawn_iterations))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n⌨️  {args.iterations} commands per backend\n")
+    print(f"{'backend':<13}{'op':<11}{'p50 ms':>9}{'p99 ms':>9}{'per s':>10}")
+    for r in results:
+        print(f"{r['backend']:<13}{r['op']:<11}{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}{r['per_second']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
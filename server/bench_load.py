@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Load test: many simulated phones against a running server.py
+
+Opens --controls /ws clients and --viewers /screen clients. Each control
+client authenticates and replays a phone's traffic (see gestures()):
+joystick drags sending moveMouse every 50 ms, volume slider drags sending
+setVolume, and clicks, with pauses in between. Every command carries an
+"id" that the server echoes in its reply, so each round trip is matched to
+its command even when replies come back out of order. Viewers subscribe to
+/screen at the chosen settings with frameHeader on and ack every frame.
+
+Reported over the measured window (after --warmup):
+    command round trips   p50/p95/p99/max per command, errors, and
+                          commands left without a reply
+    viewers               received fps and capture-to-receive latency
+                          (from the frame header) per viewer
+    server CPU            mean and peak, as % of one core, for the server
+                          process and its stream workers (Linux /proc)
+
+--spawn starts server.py itself with the synthetic capture source and the
+fake input backend, so it runs on plain Linux with no display or input
+permissions. Otherwise pass --pid to sample a server started by hand.
+
+Usage:
+    python bench_load.py --spawn --controls 10 --viewers 4 --duration 30
+    CAPTURE_SOURCE=synthetic:video INPUT_BACKEND=fake python server.py   (in another terminal)
+    python bench_load.py --controls 20 --viewers 8 --pid <server pid> --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import aiohttp
+from dotenv import load_dotenv
+from streaming import FRAME_HEADER
+
+load_dotenv()
+
+JOYSTICK_INTERVAL = 0.05  # the client throttles moveMouse to one per 50 ms
+SLIDER_INTERVAL = 0.03
+CONNECT_TIMEOUT = 30.0    # for a spawned server to start listening
+
+
+def gestures(rng: random.Random):
+    """A phone's control traffic, as an endless stream of (delay, command)."""
+    volume = 50
+    while True:
+        roll = rng.random()
+        if roll < 0.6:
+            # Joystick drag: a steady direction that wanders a little
+            dx, dy = rng.uniform(-15, 15), rng.uniform(-15, 15)
+            for _ in range(rng.randint(10, 60)):
+                dx += rng.uniform(-2, 2)
+                dy += rng.uniform(-2, 2)
+                yield JOYSTICK_INTERVAL, {"command": "moveMouse", "dx": round(dx), "dy": round(dy)}
+        elif roll < 0.85:
+            button = 'mouseLeftClick' if rng.random() < 0.8 else 'mouseRightClick'
+            yield 0.0, {"command": button}
+        else:
+            # Volume slider drag
+            target = rng.randint(0, 100)
+            step = 5 if target > volume else -5
+            for volume in range(volume, target, step):
+                yield SLIDER_INTERVAL, {"command": "setVolume", "value": volume}
+            volume = target
+            yield SLIDER_INTERVAL, {"command": "setVolume", "value": volume}
+        yield rng.uniform(0.3, 2.0), None  # pause
+
+
+class Run:
+    """Shared state: only samples taken inside the measured window count."""
+
+    def __init__(self):
+        self.measuring = False
+        self.done = False
+        self.start = None
+        self.end = None
+        self.round_trips = {}  # command -> [ms]
+        self.errors = {}
+        self.sent = 0
+        self.unanswered = 0
+        self.viewers = []
+
+    def begin(self):
+        self.measuring = True
+        self.start = time.perf_counter()
+
+    def finish(self):
+        self.measuring = False
+        self.done = True
+        self.end = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+
+class ViewerStats:
+    def __init__(self, index: int):
+        self.index = index
+        self.frames = 0
+        self.bytes = 0
+        self.latencies = []  # ms, capture to receive
+
+
+async def authenticate(ws, password: str):
+    await ws.send_json({"command": "auth", "password": password})
+    async for msg in ws:
+        if msg.type != aiohttp.WSMsgType.TEXT:
+            continue
+        data = json.loads(msg.data)
+        if data.get('type') == 'authSuccess':
+            return
+        if data.get('type') == 'authFailed':
+            raise SystemExit('❌ Authentication failed (check REMOTE_PASSWORD)')
+
+
+async def run_control(session, url: str, password: str, index: int, seed: int, run: Run):
+    """One phone on /ws: replay gestures() and time every reply."""
+    rng = random.Random(seed + index)
+    pending = {}  # id -> (command, sent at, counted)
+    async with session.ws_connect(f'{url}/ws') as ws:
+        await authenticate(ws, password)
+
+        async def receive():
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                entry = pending.pop(data.get('id'), None)
+                if entry is None:
+                    continue  # volumeUpdate broadcasts and the like
+                command, sent_at, counted = entry
+                if not counted:
+                    continue
+                if data.get('status') == 'error':
+                    run.errors[command] = run.errors.get(command, 0) + 1
+                else:
+                    run.round_trips.setdefault(command, []).append((time.perf_counter() - sent_at) * 1000)
+
+        receiver = asyncio.create_task(receive())
+        try:
+            next_id = 0
+            for delay, cmd in gestures(rng):
+                if run.done:
+                    break
+                await asyncio.sleep(delay)
+                if cmd is None:
+                    continue
+                next_id += 1
+                pending[next_id] = (cmd['command'], time.perf_counter(), run.measuring)
+                if run.measuring:
+                    run.sent += 1
+                await ws.send_json({**cmd, "id": next_id})
+            await asyncio.sleep(1.0)  # let the last replies arrive
+        finally:
+            receiver.cancel()
+            run.unanswered += sum(1 for _, _, counted in pending.values() if counted)
+
+
+async def run_viewer(session, url: str, password: str, index: int, args, run: Run):
+    """One phone on /screen: count frames and their latency, ack each one."""
+    stats = ViewerStats(index)
+    run.viewers.append(stats)
+    async with session.ws_connect(f'{url}/screen', max_msg_size=0) as ws:
+        await authenticate(ws, password)
+        await ws.send_json({"command": "startStream", "width": args.width, "height": args.height,
+                            "fps": args.fps, "quality": args.quality, "mode": args.mode,
+                            "adaptive": not args.no_adaptive, "frameHeader": True})
+        async for msg in ws:
+            if run.done:
+                break
+            if msg.type != aiohttp.WSMsgType.BINARY:
+                continue
+            received_at = time.time()
+            _, _, header_size, frame, captured_at = FRAME_HEADER.unpack_from(msg.data)
+            if not args.no_ack:
+                await ws.send_json({"command": "frameAck", "frame": frame})
+            if run.measuring:
+                stats.frames += 1
+                stats.bytes += len(msg.data) - header_size
+                stats.latencies.append((received_at - captured_at) * 1000)
+
+
+def process_tree_cpu(pid: int) -> float | None:
+    """CPU seconds used by pid, its live descendants and its reaped children (Linux)."""
+    ticks = os.sysconf('SC_CLK_TCK')
+    parents, times = {}, {}
+    try:
+        entries = [entry for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        return None
+    for entry in entries:
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields resume after ')'
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue  # exited meanwhile
+        child = int(entry)
+        parents[child] = int(fields[1])
+        utime, stime, cutime, cstime = (int(v) for v in fields[11:15])
+        times[child] = (utime + stime, cutime + cstime)
+    if pid not in times:
+        return None
+
+    total = sum(times[pid])  # includes workers that already exited
+    stack = [pid]
+    while stack:
+        parent = stack.pop()
+        for child, ppid in parents.items():
+            if ppid == parent:
+                total += times[child][0]
+                stack.append(child)
+    return total / ticks
+
+
+async def sample_cpu(pid: int, run: Run, samples: list):
+    """Per-second CPU % of the server while measuring."""
+    previous, previous_at = process_tree_cpu(pid), time.perf_counter()
+    while not run.done:
+        await asyncio.sleep(1.0)
+        now_cpu, now = process_tree_cpu(pid), time.perf_counter()
+        if now_cpu is None or previous is None:
+            return
+        if run.measuring:
+            samples.append((now_cpu - previous) / (now - previous_at) * 100)
+        previous, previous_at = now_cpu, now
+
+
+async def spawn_server(args, **settings):
+    """Start server.py on the synthetic source and the fake input backend;
+    settings are more environment variables for it."""
+    env = {**os.environ, 'CAPTURE_SOURCE': args.source, 'INPUT_BACKEND': 'fake',
+           'STREAM_ENGINE': args.engine, 'REMOTE_PASSWORD': args.password, 'CDP_URL': '', **settings}
+    server = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, server, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+    print(f"🚀 Started server.py (pid {process.pid}, {args.source}, {args.engine} engine)")
+
+    health = args.url.replace('ws', 'http', 1) + '/metrics'
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    async with aiohttp.ClientSession() as session:
+        while True:
+            if process.returncode is not None:
+                raise SystemExit(f'❌ server.py exited ({process.returncode})')
+            try:
+                async with session.get(health, headers={'Authorization': f'Bearer {args.password}'}) as resp:
+                    if resp.status == 200:
+                        return process
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                process.kill()
+                raise SystemExit(f'❌ server.py not listening after {CONNECT_TIMEOUT:.0f}s')
+            await asyncio.sleep(0.2)
+
+
+async def stop_server(process):
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), 5.0)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+def percentiles(values: list) -> dict:
+    ordered = sorted(values)
+
+    def at(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 2)
+
+    return {"count": len(ordered), "p50_ms": at(0.5), "p95_ms": at(0.95), "p99_ms": at(0.99),
+            "max_ms": round(ordered[-1], 2)}
+
+
+def report(args, run: Run, cpu: list) -> dict:
+    results = {"controls": args.controls, "viewers": args.viewers, "duration_s": round(run.elapsed, 1),
+               "commands_sent": run.sent, "unanswered": run.unanswered,
+               "round_trips": {}, "errors": run.errors, "viewer_stats": [], "server_cpu": None}
+
+    print(f"\n📊 Load test: {args.controls} control client(s), {args.viewers} viewer(s) at "
+          f"{args.width}x{args.height} @ {args.fps}fps q{args.quality} ({args.mode}), "
+          f"{results['duration_s']}s\n")
+
+    print(f"{'command':<16} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  errors")
+    for command, timings in sorted(run.round_trips.items()):
+        row = results["round_trips"][command] = percentiles(timings)
+        print(f"{command:<16} {row['count']:>6} {row['p50_ms']:>6.2f} ms {row['p95_ms']:>6.2f} ms "
+              f"{row['p99_ms']:>6.2f} ms {row['max_ms']:>6.2f} ms  {run.errors.get(command, 0)}")
+    print(f"{run.sent} commands sent, {run.unanswered} without a reply")
+
+    if run.viewers:
+        print(f"\n{'viewer':<8} {'fps':>6} {'KB/frame':>9} {'latency p50':>12} {'p95':>9} {'max':>9}")
+    for stats in sorted(run.viewers, key=lambda v: v.index):
+        row = {"viewer": stats.index, "fps": round(stats.frames / run.elapsed, 1),
+               "kb_per_frame": round(stats.bytes / stats.frames / 1024, 1) if stats.frames else None,
+               "latency": percentiles(stats.latencies) if stats.latencies else None}
+        results["viewer_stats"].append(row)
+        latency = row["latency"] or {"p50_ms": float('nan'), "p95_ms": float('nan'), "max_ms": float('nan')}
+        print(f"{stats.index:<8} {row['fps']:>6} {row['kb_per_frame'] or 0:>9} "
+              f"{latency['p50_ms']:>9.2f} ms {latency['p95_ms']:>6.2f} ms {latency['max_ms']:>6.2f} ms")
+
+    if cpu:
+        results["server_cpu"] = {"mean_pct": round(sum(cpu) / len(cpu), 1), "max_pct": round(max(cpu), 1)}
+        print(f"\nServer CPU: {results['server_cpu']['mean_pct']}% mean, "
+              f"{results['server_cpu']['max_pct']}% peak (100% = one core)")
+    else:
+        print("\nServer CPU: not sampled (use --spawn, or --pid on Linux)")
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='ws://127.0.0.1:8080')
+    parser.add_argument('--password', default=os.getenv('REMOTE_PASSWORD', 'changeme'))
+    parser.add_argument('--controls', type=int, default=10, help='/ws clients replaying phone traffic')
+    parser.add_argument('--viewers', type=int, default=2, help='/screen clients')
+    parser.add_argument('--duration', type=float, default=20.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3.0, help='seconds before measuring')
+    parser.add_argument('--ramp', type=float, default=1.0, help='seconds to spread the connections over')
+    parser.add_argument('--seed', type=int, default=1, help='traffic is reproducible per seed')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--quality', type=int, default=60)
+    parser.add_argument('--mode', default='jpeg', choices=['jpeg', 'delta'])
+    parser.add_argument('--no-adaptive', action='store_true', help='keep the requested stream settings')
+    parser.add_argument('--no-ack', action='store_true', help='do not send frameAck')
+    parser.add_argument('--spawn', action='store_true', help='start server.py on the fake backends')
+    parser.add_argument('--source', default='synthetic:video', help='CAPTURE_SOURCE for --spawn')
+    parser.add_argument('--engine', default='thread', choices=['process', 'thread'],
+                        help='STREAM_ENGINE for --spawn')
+    parser.add_argument('--pid', type=int, help='server process to sample CPU from')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    server = await spawn_server(args) if args.spawn else None
+    pid = server.pid if server else args.pid
+    run, cpu = Run(), []
+    try:
+        async with aiohttp.ClientSession() as session:
+            clients = args.controls + args.viewers
+            tasks = []
+            for i in range(clients):
+                if i < args.controls:
+                    coro = run_control(session, args.url, args.password, i, args.seed, run)
+                else:
+                    coro = run_viewer(session, args.url, args.password, i - args.controls, args, run)
+                tasks.append(asyncio.create_task(coro))
+                await asyncio.sleep(args.ramp / clients)
+            if pid:
+                tasks.append(asyncio.create_task(sample_cpu(pid, run, cpu)))
+
+            await asyncio.sleep(args.warmup)
+            run.begin()
+            await asyncio.sleep(args.duration)
+            run.finish()
+            for task in tasks[args.controls:]:
+                task.cancel()  # viewers wait on the next frame, the sampler on its sleep
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+            failed = [e for e in outcomes if isinstance(e, Exception)]
+            if failed:
+                print(f"⚠️ {len(failed)} client(s) failed, first: {failed[0]!r}")
+    finally:
+        if server:
+            await stop_server(server)
+
+    results = report(args, run, cpu)
+    if args.json:
+        print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Streaming pipeline benchmark: per-stage and end-to-end timings
+
+Runs grab -> convert (Image.frombytes) -> resize -> encode -> send through
+ScreenStreamer's own stage methods for a matrix of source resolutions,
+qualities, resamplers and encoders. Frames come from the synthetic capture
+source and are sent over a loopback WebSocket, so no display is needed.
+
+server.py streams with BILINEAR, screen_server.py with LANCZOS and
+optimize=True (--optimize); run both to compare the two.
+
+Reported per configuration: p50/p99 latency of every stage and of the
+whole frame, the fps ceiling (1000 / mean frame ms), bytes per frame and
+CPU ms per frame (thread CPU time of the pipeline, approximate for the
+send stage since the loopback reader shares the thread).
+
+Memory, measured in a separate pass after the timed frames so tracing
+does not skew them: peak Python-heap allocation per frame (tracemalloc;
+bytes, bytearrays and NumPy buffers, not Pillow's own image memory) and
+the RSS growth across the whole run, which covers everything and should
+stay near zero once buffers are reused.
+
+Usage:
+    python bench_pipeline.py
+    python bench_pipeline.py --sources 1080p 4k --quality 40 80 --encoders turbo-jpeg --json
+    python bench_pipeline.py --output bench_output.txt
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+import aiohttp
+from aiohttp import web
+from PIL import Image
+from encoders import available_encoders
+from streaming import ScreenStreamer
+
+SOURCES = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+RESAMPLERS = {
+    'bilinear': Image.Resampling.BILINEAR,
+    'lanczos': Image.Resampling.LANCZOS,
+}
+STAGES = ('grab', 'convert', 'resize', 'encode', 'send')
+
+
+def rss_bytes() -> int:
+    """Current resident set size; the peak where there is no /proc (macOS)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+class Loopback:
+    """A local aiohttp WebSocket pair; the client side drains and discards."""
+
+    async def __aenter__(self):
+        connected = asyncio.get_running_loop().create_future()
+        self._done = asyncio.Event()
+
+        async def handler(request):
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            connected.set_result(ws)
+            await self._done.wait()
+            return ws
+
+        app = web.Application()
+        app.router.add_get('/', handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+
+        self._session = aiohttp.ClientSession()
+        self._client = await self._session.ws_connect(f'ws://{host}:{port}/', max_msg_size=0)
+        self._reader = asyncio.create_task(self._drain())
+        self.ws = await connected
+        return self
+
+    async def _drain(self):
+        async for _ in self._client:
+            pass
+
+    async def __aexit__(self, *exc):
+        self._done.set()
+        self._reader.cancel()
+        await self._client.close()
+        await self._session.close()
+        await self._runner.cleanup()
+
+
+async def run_config(ws, source: str, quality: int, resample: str, encoder: str, args) -> dict:
+    width, height = SOURCES[source]
+    streamer = ScreenStreamer(args.size[0], args.size[1], quality, resample=RESAMPLERS[resample],
+                              optimize=args.optimize, encoder=encoder,
+                              source=f'synthetic:{args.pattern}:{width}x{height}')
+    timings = {stage: [] for stage in STAGES}
+    totals, sizes, cpu = [], [], []
+    rss_start = None
+
+    for i in range(args.warmup + args.iterations):
+        if i == args.warmup:
+            rss_start = rss_bytes()
+        cpu_start = time.thread_time()
+        t0 = time.perf_counter()
+        screenshot = streamer.grab()
+        t1 = time.perf_counter()
+        frame = streamer.convert(screenshot)
+        t2 = time.perf_counter()
+        frame = streamer.resize(frame)
+        t3 = time.perf_counter()
+        data = streamer.encode_frame(frame)
+        t4 = time.perf_counter()
+        await ws.send_bytes(data)
+        t5 = time.perf_counter()
+        cpu_end = time.thread_time()
+
+        if i < args.warmup:
+            continue
+        for stage, start, end in zip(STAGES, (t0, t1, t2, t3, t4), (t1, t2, t3, t4, t5)):
+            timings[stage].append((end - start) * 1000)
+        totals.append((t5 - t0) * 1000)
+        sizes.append(len(data))
+        cpu.append((cpu_end - cpu_start) * 1000)
+
+    rss_end = rss_bytes()
+    allocs = []
+    tracemalloc.start()
+    for _ in range(args.memory_frames):
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        frame = streamer.resize(streamer.convert(streamer.grab()))
+        data = streamer.encode_frame(frame)
+        await ws.send_bytes(data)
+        del frame, data
+        allocs.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    streamer.close_capture()
+    streamer._executor.shutdown()
+
+    mean_total = sum(totals) / len(totals)
+    return {
+        "source": source,
+        "size": f"{args.size[0]}x{args.size[1]}",
+        "quality": quality,
+        "resample": resample,
+        "encoder": encoder,
+        "optimize": args.optimize,
+        "pattern": args.pattern,
+        "frames": len(totals),
+        "stages": {stage: {"p50_ms": round(percentile(values, 0.5), 3),
+                           "p99_ms": round(percentile(values, 0.99), 3)}
+                   for stage, values in timings.items()},
+        "total": {"p50_ms": round(percentile(totals, 0.5), 3),
+                  "p99_ms": round(percentile(totals, 0.99), 3)},
+        "fps_ceiling": round(1000 / mean_total, 1),
+        "bytes_per_frame": int(sum(sizes) / len(sizes)),
+        "cpu_ms_per_frame": round(sum(cpu) / len(cpu), 3),
+        "alloc_kb_per_frame": round(percentile(allocs, 0.5) / 1024, 1) if allocs else None,
+        "rss_mb": round(rss_end / 2**20, 1),
+        "rss_growth_mb": round((rss_end - rss_start) / 2**20, 1),
+    }
+
+
+def print_table(results: list):
+    header = f"{'source':<7}{'q':>4} {'resample':<9}{'encoder':<13}"
+    header += ''.join(f"{stage:>9}" for stage in STAGES)
+    header += f"{'p99':>9}{'fps max':>9}{'KB':>8}{'cpu ms':>8}{'alloc KB':>10}{'RSS +MB':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        line = f"{r['source']:<7}{r['quality']:>4} {r['resample']:<9}{r['encoder']:<13}"
+        line += ''.join(f"{r['stages'][stage]['p50_ms']:>9.2f}" for stage in STAGES)
+        line += f"{r['total']['p99_ms']:>9.2f}{r['fps_ceiling']:>9.1f}"
+        line += f"{r['bytes_per_frame'] / 1024:>8.1f}{r['cpu_ms_per_frame']:>8.2f}"
+        alloc = r['alloc_kb_per_frame']
+        line += f"{alloc if alloc is not None else '-':>10}{r['rss_growth_mb']:>9.1f}"
+        print(line)
+    print("\nStage columns are p50 ms; p99 is for the whole frame. alloc KB is the median")
+    print("Python-heap peak per frame; RSS +MB the growth over the timed frames.")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sources', nargs='+', choices=SOURCES, default=list(SOURCES))
+    parser.add_argument('--size', default='1280x720', help='streamed size')
+    parser.add_argument('--quality', type=int, nargs='+', default=[60])
+    parser.add_argument('--resamplers', nargs='+', choices=RESAMPLERS, default=list(RESAMPLERS))
+    parser.add_argument('--encoders', nargs='+', default=available_encoders())
+    parser.add_argument('--optimize', action='store_true', help='JPEG optimize (screen_server.py)')
+    parser.add_argument('--pattern', default='video', help='synthetic motion pattern')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--memory-frames', type=int, default=10,
+                        help='frames traced for allocations (0 to skip)')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    args = parser.parse_args()
+    args.size = tuple(int(v) for v in args.size.lower().split('x'))
+
+    encoders = [name for name in args.encoders if name in available_encoders()]
+    matrix = list(itertools.product(args.sources, args.quality, args.resamplers, encoders))
+
+    results = []
+    async with Loopback() as loopback:
+        for i, config in enumerate(matrix, 1):
+            if not args.json:
+                print(f"⏱️  [{i}/{len(matrix)}] {' '.join(map(str, config))}", flush=True)
+            results.append(await run_config(loopback.ws, *config, args))
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "encoders": available_encoders(),
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print()
+        print_table(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
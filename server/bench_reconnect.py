@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Time to first frame after a reconnect: password + startStream vs session resume
+
+Each round connects to /screen and measures, from the moment the socket
+is open, how long the first frame takes:
+    password  auth with the password, wait for authSuccess, send startStream
+    session   auth with the session token from the previous connection;
+              the server restarts the stream on its own (sessions.py)
+The previous connection closes just before, as when a phone wakes up, so
+both kinds find the stream still running (StreamHub.linger); --linger 0
+shows them starting capture over.
+
+Measured with --spawn --rounds 20 on synthetic:video, p50 in ms:
+                 password  session
+    linger 5s      36.0      32.8    thread engine
+    linger 0      181.6     187.2
+    linger 5s      40.7      40.8    process engine
+    linger 0      824.0     811.6
+The warm stream is the whole gain. Resuming with the token only saves the
+startStream round trip, which is lost in the noise on a local connection.
+
+Usage:
+    python server.py                     (in another terminal)
+    python bench_reconnect.py --rounds 20
+    python bench_reconnect.py --spawn --rounds 20 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import aiohttp
+from dotenv import load_dotenv
+from bench_load import spawn_server, stop_server
+
+load_dotenv()
+
+
+async def first_frame(session, args, auth: dict) -> tuple:
+    """Connect, authenticate with auth, and time the first frame; returns (ms, token)."""
+    async with session.ws_connect(f'{args.url}/screen', max_msg_size=0) as ws:
+        start = time.perf_counter()
+        await ws.send_json({"command": "auth", **auth})
+        token = None
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                return (time.perf_counter() - start) * 1000, token
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            data = json.loads(msg.data)
+            if data.get('type') == 'authFailed':
+                raise SystemExit(f"❌ Authentication failed: {data.get('message')}")
+            if data.get('type') == 'authSuccess':
+                token = data.get('session')
+                if not data.get('resumed'):
+                    await ws.send_json({"command": "startStream", "width": args.width, "height": args.height,
+                                        "fps": args.fps, "quality": args.quality})
+    raise SystemExit('❌ Connection closed before the first frame')
+
+
+def summarize(label: str, timings: list) -> dict:
+    ordered = sorted(timings)
+    result = {"p50_ms": round(statistics.median(ordered), 1),
+              "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+              "max_ms": round(ordered[-1], 1)}
+    print(f"{label:<10} p50 {result['p50_ms']:7.1f} ms   p95 {result['p95_ms']:7.1f} ms   max {result['max_ms']:7.1f} ms")
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='ws://127.0.0.1:8080')
+    parser.add_argument('--password', default=os.getenv('REMOTE_PASSWORD', 'changeme'))
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--quality', type=int, default=60)
+    parser.add_argument('--spawn', action='store_true', help='start server.py on the fake backends')
+    parser.add_argument('--source', default='synthetic:video', help='CAPTURE_SOURCE for --spawn')
+    parser.add_argument('--engine', default='thread', choices=['process', 'thread'],
+                        help='STREAM_ENGINE for --spawn')
+    parser.add_argument('--linger', type=float, help='STREAM_LINGER for --spawn (0: no warm stream)')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    settings = {} if args.linger is None else {'STREAM_LINGER': str(args.linger)}
+    server = await spawn_server(args, **settings) if args.spawn else None
+    timings = {'password': [], 'session': []}
+    try:
+        async with aiohttp.ClientSession() as session:
+            for _ in range(args.rounds):
+                # Both kinds of reconnect follow a closed connection that was streaming
+                ms, token = await first_frame(session, args, {"password": args.password})
+                timings['password'].append(ms)
+                ms, _ = await first_frame(session, args, {"session": token})
+                timings['session'].append(ms)
+    finally:
+        if server:
+            await stop_server(server)
+
+    print(f"\n📊 Time to first frame after reconnecting ({args.rounds} rounds, "
+          f"{args.width}x{args.height} @ {args.fps}fps)\n")
+    results = {label: summarize(label, values) for label, values in timings.items()}
+    if args.json:
+        print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
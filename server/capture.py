@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+Capture sources for ScreenStreamer.
+
+    mss                       the real screen (default)
+    synthetic[:pattern[:WxH]] generated frames, no display needed:
+                              static   unchanging desktop
+                              scroll   desktop with scrolling text
+                              video    full-motion, every pixel changes
+    replay:<path>             raw frames recorded to a file, read through
+                              a memory map and looped
+
+Sources are chosen with a spec string (the CAPTURE_SOURCE environment
+variable for the servers), so the whole streaming path can be run and
+benchmarked reproducibly on a headless box or in CI.
+
+Every grab() returns a frame with .size (width, height) and .raw, a
+BGRA buffer like mss's ScreenShot. A frame is only valid until the next
+grab(): the synthetic and replay sources write into one buffer they reuse.
+
+A CaptureTarget narrows what is grabbed: a monitor, a pixel region of it
+or a window (looked up by title), optionally zoomed around a point. Only
+that area is captured, so encode cost follows the area being watched.
+resolve_target() checks a target against a source without opening it, so
+a missing monitor or window or an off-screen region is refused before a
+stream starts rather than on its capture thread.
+
+Record a replay file:
+    python capture.py record frames.raw --frames 300 --source mss
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+from typing import NamedTuple
+import numpy as np
+from encoders import sample_frame
+
+try:
+    import Quartz  # pyobjc-framework-Quartz, window lookup on macOS
+except ImportError:
+    Quartz = None
+
+try:
+    from Xlib import X, display as xdisplay
+except ImportError:
+    xdisplay = None
+
+DEFAULT_SYNTHETIC_SIZE = (1920, 1080)
+SYNTHETIC_PATTERNS = ('static', 'scroll', 'video')
+
+# Replay file: header, then `count` frames of width * height * 4 BGRA bytes
+REPLAY_MAGIC = b'RAWF'
+REPLAY_HEADER = struct.Struct('<4sIII')  # magic, width, height, count
+
+MAX_ZOOM = 16.0
+WINDOW_REFRESH_INTERVAL = 1.0  # seconds between window position lookups
+
+
+class CaptureTarget(NamedTuple):
+    """The area a stream captures.
+
+    region is (x, y, width, height) in monitor pixels; window is matched
+    against window titles and app names. zoom > 1 then crops that area
+    around center, given as fractions of it.
+    """
+
+    monitor: int = 1
+    region: tuple | None = None
+    window: str | None = None
+    zoom: float = 1.0
+    center: tuple = (0.5, 0.5)
+
+    @property
+    def full(self) -> bool:
+        """True when the whole monitor is captured."""
+        return self.region is None and self.window is None and self.zoom == 1.0
+
+    @property
+    def label(self) -> str:
+        """Short form for log lines and metric labels."""
+        if self.window:
+            area = f"window:{self.window}"
+        elif self.region:
+            x, y, w, h = self.region
+            area = f"region:{x},{y},{w}x{h}"
+        else:
+            area = f"monitor:{self.monitor}"
+        if self.zoom != 1.0:
+            area += f"@{self.zoom:g}x"
+        return area
+
+    def describe(self) -> dict:
+        return {
+            "monitor": self.monitor,
+            "region": dict(zip(('x', 'y', 'width', 'height'), self.region)) if self.region else None,
+            "window": self.window,
+            "zoom": self.zoom,
+            "centerX": self.center[0],
+            "centerY": self.center[1],
+        }
+
+    @classmethod
+    def from_message(cls, data: dict, current: 'CaptureTarget | None' = None) -> 'CaptureTarget':
+        """Parse the monitor/region/window/zoom fields of a startStream or
+        setRegion message. The monitor defaults to the current one."""
+        try:
+            monitor = int(data.get('monitor', current.monitor if current else 1))
+            region = data.get('region')
+            if region is not None:
+                region = tuple(int(region[k]) for k in ('x', 'y', 'width', 'height'))
+            zoom = float(data.get('zoom', 1.0))
+            center = (float(data.get('centerX', 0.5)), float(data.get('centerY', 0.5)))
+        except (TypeError, ValueError, KeyError) as e:
+            raise ValueError(f"Invalid capture target: {e}")
+
+        window = data.get('window') or None
+        if window is not None and not isinstance(window, str):
+            raise ValueError("window must be a title string")
+        if monitor < 1:
+            raise ValueError("monitor must be 1 or more")
+        if region and (region[2] <= 0 or region[3] <= 0):
+            raise ValueError("region width and height must be positive")
+        if region and window:
+            raise ValueError("Pass either a region or a window, not both")
+        if not 1.0 <= zoom <= MAX_ZOOM:
+            raise ValueError(f"zoom must be between 1 and {MAX_ZOOM:g}")
+        center = tuple(min(max(c, 0.0), 1.0) for c in center)
+        return cls(monitor, region, window, zoom, center)
+
+    def resolve(self, bounds: tuple, window: tuple | None = None) -> tuple:
+        """The captured rectangle (left, top, width, height), clipped to bounds.
+
+        bounds is the monitor, or for window targets the whole desktop;
+        window is the window's rectangle from find_window().
+        """
+        left, top, width, height = bounds
+        if window:
+            x, y, w, h = window
+        elif self.region:
+            x, y, w, h = self.region
+            x, y = x + left, y + top
+        else:
+            x, y, w, h = bounds
+
+        if self.zoom > 1.0:
+            zw, zh = max(1, round(w / self.zoom)), max(1, round(h / self.zoom))
+            cx, cy = x + self.center[0] * w, y + self.center[1] * h
+            x = min(max(round(cx - zw / 2), x), x + w - zw)
+            y = min(max(round(cy - zh / 2), y), y + h - zh)
+            w, h = zw, zh
+
+        x0, y0 = max(x, left), max(y, top)
+        x1, y1 = min(x + w, left + width), min(y + h, top + height)
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError(f"Capture area {self.label} is off screen")
+        return x0, y0, x1 - x0, y1 - y0
+
+
+FULL_SCREEN = CaptureTarget()
+
+
+class Frame:
+    """A captured frame: size plus a raw BGRA buffer."""
+
+    __slots__ = ('size', 'raw')
+
+    def __init__(self, size: tuple, raw):
+        self.size = size
+        self.raw = raw
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+
+class CaptureSource:
+    """Base class for capture sources; grab() runs on the capture thread.
+
+    size is the size of the captured area, not of the whole screen. The
+    frame grab() returns may be overwritten by the next grab().
+    """
+
+    @property
+    def size(self) -> tuple:
+        raise NotImplementedError
+
+    @property
+    def bounds(self) -> tuple:
+        """The captured rectangle (left, top, width, height) in screen coordinates."""
+        raise NotImplementedError
+
+    def grab(self) -> Frame:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MssSource(CaptureSource):
+    """The real screen, through mss.
+
+    mss allocates a new buffer for every grab; it has no grab-into API.
+    Only the target's rectangle is grabbed. Window targets are looked up
+    again every WINDOW_REFRESH_INTERVAL so the capture follows the window.
+    """
+
+    def __init__(self, target=FULL_SCREEN, with_cursor=False):
+        import mss
+        # with_cursor=True captures the mouse pointer (MSS 8.0+)
+        self.sct = mss.mss(with_cursor=with_cursor)
+        if target.monitor >= len(self.sct.monitors):
+            self.sct.close()
+            raise ValueError(f"No monitor {target.monitor}")
+        self.target = target
+        self.monitor = self.sct.monitors[target.monitor]
+        self.area = self._resolve()
+        self._resolved_at = time.monotonic()
+
+    @property
+    def size(self):
+        return self.area['width'], self.area['height']
+
+    @property
+    def bounds(self):
+        area = self.area
+        return area['left'], area['top'], area['width'], area['height']
+
+    def grab(self):
+        if self.target.window and time.monotonic() - self._resolved_at >= WINDOW_REFRESH_INTERVAL:
+            self._resolved_at = time.monotonic()
+            try:
+                self.area = self._resolve()
+            except (LookupError, ValueError):
+                pass  # window hidden or closed: keep grabbing where it was
+        return self.sct.grab(self.area)
+
+    def _resolve(self) -> dict:
+        if self.target.window:
+            # Windows can sit on any monitor; clip to the whole desktop
+            bounds, window = self.sct.monitors[0], find_window(self.target.window)
+        else:
+            bounds, window = self.monitor, None
+        rect = self.target.resolve(
+            (bounds['left'], bounds['top'], bounds['width'], bounds['height']), window)
+        return dict(zip(('left', 'top', 'width', 'height'), rect))
+
+    def close(self):
+        self.sct.close()
+
+
+class SyntheticSource(CaptureSource):
+    """Generated frames with a configurable motion pattern.
+
+    Frames depend only on the frame index, so runs are reproducible.
+    Moving patterns are drawn into preallocated buffers.
+    """
+
+    def __init__(self, width=DEFAULT_SYNTHETIC_SIZE[0], height=DEFAULT_SYNTHETIC_SIZE[1],
+                 pattern='static', target=FULL_SCREEN):
+        if pattern not in SYNTHETIC_PATTERNS:
+            raise ValueError(f"Unknown synthetic pattern: {pattern}")
+        self.width = width
+        self.height = height
+        self.pattern = pattern
+        self.rect = _array_rect(target, width, height)
+        self.index = 0
+        self._buffer = np.empty((self.rect[3], self.rect[2], 4), dtype=np.uint8)
+
+        rgb = np.asarray(sample_frame(width, height))
+        self._desktop = _to_bgra(rgb)
+        if pattern == 'scroll':
+            self._scroll = self._desktop.copy()
+        if pattern == 'video':
+            x = np.linspace(0, 4 * np.pi, width * 2, dtype=np.float32)
+            y = np.linspace(0, 2 * np.pi, height, dtype=np.float32)[:, None]
+            wave = np.empty((height, width * 2, 4), dtype=np.uint8)
+            wave[:, :, 0] = (127 + 127 * np.sin(x + y)).astype(np.uint8)
+            wave[:, :, 1] = (127 + 127 * np.sin(x * 0.5 - y)).astype(np.uint8)
+            wave[:, :, 2] = (127 + 127 * np.cos(x * 0.7 + y * 2)).astype(np.uint8)
+            wave[:, :, 3] = 255
+            self._wave = wave
+
+    @property
+    def size(self):
+        return self.rect[2], self.rect[3]
+
+    @property
+    def bounds(self):
+        return self.rect
+
+    def grab(self):
+        index = self.index
+        self.index += 1
+
+        if self.pattern == 'static':
+            return _crop(self._desktop, self.rect, self._buffer)
+
+        if self.pattern == 'scroll':
+            # np.roll without the temporary: two slice copies into the frame
+            text, out = self._desktop[40:, 240:], self._scroll[40:, 240:]
+            shift = (4 * index) % len(text)
+            out[:len(text) - shift] = text[shift:]
+            out[len(text) - shift:] = text[:shift]
+            return _crop(self._scroll, self.rect, self._buffer)
+
+        shift = (index * 8) % self.width
+        return _crop(self._wave[:, shift:shift + self.width], self.rect, self._buffer)
+
+
+class ReplaySource(CaptureSource):
+    """Recorded raw frames read through a memory map, looped.
+
+    Each grab is a view into the mapped file, so replay costs no copies
+    unless a region of it is captured.
+    """
+
+    def __init__(self, path: str, target=FULL_SCREEN):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, width, height, count = REPLAY_HEADER.unpack_from(self._map, 0)
+        if magic != REPLAY_MAGIC or count == 0:
+            raise ValueError(f"Not a replay file: {path}")
+        self.width, self.height, self.count = width, height, count
+        self._frame_bytes = width * height * 4
+        self._view = memoryview(self._map)
+        self.rect = _array_rect(target, width, height)
+        self.index = 0
+        self._buffer = np.empty((self.rect[3], self.rect[2], 4), dtype=np.uint8)
+
+    @property
+    def size(self):
+        return self.rect[2], self.rect[3]
+
+    @property
+    def bounds(self):
+        return self.rect
+
+    def grab(self):
+        offset = REPLAY_HEADER.size + (self.index % self.count) * self._frame_bytes
+        self.index += 1
+        raw = self._view[offset:offset + self._frame_bytes]
+        if self.size == (self.width, self.height):
+            return Frame(self.size, raw)
+        frame = np.frombuffer(raw, dtype=np.uint8).reshape(self.height, self.width, 4)
+        return _crop(frame, self.rect, self._buffer)
+
+    def close(self):
+        self._file.close()
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            pass  # a frame is still referenced; the map goes with it
+
+
+def open_source(spec: str, target=FULL_SCREEN, with_cursor=False) -> CaptureSource:
+    """Create a capture source from a spec string (see module docstring)."""
+    kind, _, rest = (spec or 'mss').partition(':')
+
+    if kind == 'mss':
+        return MssSource(target, with_cursor)
+
+    if kind == 'synthetic':
+        pattern, width, height = _synthetic_spec(rest)
+        return SyntheticSource(width, height, pattern, target)
+
+    if kind == 'replay':
+        return ReplaySource(rest, target)
+
+    raise ValueError(f"Unknown capture source: {spec}")
+
+
+def resolve_target(spec: str, target=FULL_SCREEN) -> tuple:
+    """The rectangle target would capture from a source spec, without opening it.
+
+    Raises what the source would: ValueError for a missing monitor, an
+    off-screen area or a window on a source without windows, LookupError
+    for a missing window.
+    """
+    kind, _, rest = (spec or 'mss').partition(':')
+
+    if kind == 'mss':
+        import mss
+        try:
+            with mss.mss() as sct:
+                monitors = sct.monitors
+        except mss.ScreenShotError as e:
+            raise ValueError(f"Screen capture unavailable: {e}")
+        if target.monitor >= len(monitors):
+            raise ValueError(f"No monitor {target.monitor}")
+        if target.window:
+            bounds, window = monitors[0], find_window(target.window)
+        else:
+            bounds, window = monitors[target.monitor], None
+        return target.resolve((bounds['left'], bounds['top'], bounds['width'], bounds['height']), window)
+
+    if kind == 'synthetic':
+        _, width, height = _synthetic_spec(rest)
+    elif kind == 'replay':
+        try:
+            with open(rest, 'rb') as f:
+                magic, width, height, _ = REPLAY_HEADER.unpack(f.read(REPLAY_HEADER.size))
+        except (OSError, struct.error) as e:
+            raise ValueError(f"Cannot read replay file: {e}")
+        if magic != REPLAY_MAGIC:
+            raise ValueError(f"Not a replay file: {rest}")
+    else:
+        raise ValueError(f"Unknown capture source: {spec}")
+    return _array_rect(target, width, height)
+
+
+def find_window(query: str) -> tuple:
+    """Screen rectangle (left, top, width, height) of the first visible
+    window whose title or app name contains query (case-insensitive).
+
+    Raises LookupError when no window matches or the platform has no
+    window lookup (pyobjc-framework-Quartz on macOS, python-xlib on X11).
+    """
+    query = query.lower()
+    if Quartz is not None:
+        options = Quartz.kCGWindowListOptionOnScreenOnly | Quartz.kCGWindowListExcludeDesktopElements
+        for info in Quartz.CGWindowListCopyWindowInfo(options, Quartz.kCGNullWindowID):
+            if info.get('kCGWindowLayer', 0) != 0:
+                continue  # menu bar, dock, overlays
+            name = f"{info.get('kCGWindowOwnerName', '')} {info.get('kCGWindowName', '')}"
+            if query in name.lower():
+                bounds = info['kCGWindowBounds']
+                return (int(bounds['X']), int(bounds['Y']),
+                        int(bounds['Width']), int(bounds['Height']))
+    elif xdisplay is not None and os.environ.get('DISPLAY'):
+        d = xdisplay.Display()
+        try:
+            root = d.screen().root
+            clients = root.get_full_property(d.intern_atom('_NET_CLIENT_LIST'), X.AnyPropertyType)
+            net_wm_name = d.intern_atom('_NET_WM_NAME')
+            for window_id in (clients.value if clients else ()):
+                window = d.create_resource_object('window', window_id)
+                title = window.get_full_property(net_wm_name, 0)
+                title = title.value.decode('utf-8', 'replace') if title else (window.get_wm_name() or '')
+                name = f"{' '.join(window.get_wm_class() or ())} {title}"
+                if query in name.lower():
+                    geometry = window.get_geometry()
+                    origin = root.translate_coords(window, 0, 0)
+                    return origin.x, origin.y, geometry.width, geometry.height
+        finally:
+            d.close()
+    else:
+        raise LookupError("Window capture needs pyobjc-framework-Quartz (macOS) or python-xlib (X11)")
+    raise LookupError(f"No window matching '{query}'")
+
+
+def record(source: CaptureSource, path: str, frames: int, fps: int = 30):
+    """Write `frames` grabs from a source to a replay file."""
+    width, height = source.size
+    interval = 1.0 / fps
+    with open(path, 'wb') as f:
+        f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, width, height, frames))
+        for _ in range(frames):
+            start = time.monotonic()
+            f.write(source.grab().raw)
+            sleep_time = interval - (time.monotonic() - start)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+
+
+def _synthetic_spec(rest: str) -> tuple:
+    """(pattern, width, height) of a synthetic source spec after 'synthetic:'."""
+    pattern, _, size = rest.partition(':')
+    width, height = DEFAULT_SYNTHETIC_SIZE
+    if size:
+        width, height = (int(v) for v in size.lower().split('x'))
+    return pattern or 'static', width, height
+
+
+def _array_rect(target: CaptureTarget, width: int, height: int) -> tuple:
+    # Generated and recorded frames are one screen: monitor 1
+    if target.window:
+        raise ValueError("Window capture needs the mss source")
+    if target.monitor != 1:
+        raise ValueError(f"No monitor {target.monitor}")
+    return target.resolve((0, 0, width, height))
+
+
+def _crop(frame: np.ndarray, rect: tuple, out: np.ndarray) -> Frame:
+    """A Frame of one rectangle of a BGRA array.
+
+    Contiguous pixels are handed out as they are; anything else is copied
+    into out, the source's reused h x w x 4 buffer.
+    """
+    x, y, w, h = rect
+    if (w, h) != (frame.shape[1], frame.shape[0]):
+        frame = frame[y:y + h, x:x + w]
+    if not frame.flags.c_contiguous:
+        np.copyto(out, frame)
+        frame = out
+    return Frame((w, h), frame.data)
+
+
+def _to_bgra(rgb: np.ndarray) -> np.ndarray:
+    bgra = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+    bgra[:, :, :3] = rgb[:, :, ::-1]
+    bgra[:, :, 3] = 255
+    return bgra
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record frames for the replay capture source")
+    sub = parser.add_subparsers(dest='action', required=True)
+    rec = sub.add_parser('record', help='record raw frames to a replay file')
+    rec.add_argument('path')
+    rec.add_argument('--frames', type=int, default=300)
+    rec.add_argument('--fps', type=int, default=30)
+    rec.add_argument('--source', default='mss', help='capture source spec to record from')
+    args = parser.parse_args()
+
+    source = open_source(args.source)
+    try:
+        record(source, args.path, args.frames, args.fps)
+    finally:
+        source.close()
+    width, height = source.size
+    print(f"💾 Recorded {args.frames} frames ({width}x{height}) to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compact binary framing for /ws control commands.
+
+JSON stays the default. After auth a client may send
+    {"command": "binaryProtocol"}
+and gets back the opcode table:
+    {"type": "binaryProtocol", "version": 1, "frame": "<BBHhh", "opcodes": {...},
+     "fireAndForget": [...]}
+From then on it can also send binary WebSocket messages, one command each:
+
+    opcode  u8    see OPCODES
+    flags   u8    0 (reserved)
+    seq     u16   echoed in the ack
+    a       i16   dx for moveMouse, the level for setVolume
+    b       i16   dy for moveMouse
+
+Acks use the same frame: opcode ACK | request opcode, flags FLAG_ERROR on
+failure, the request's seq, and a = the volume for volume commands.
+Fire-and-forget opcodes (moveMouse, setVolume) get no ack at all; the
+volume still arrives as a JSON volumeUpdate broadcast.
+"""
+import struct
+
+VERSION = 1
+FRAME = struct.Struct('<BBHhh')  # opcode, flags, seq, a, b
+ACK = 0x80
+FLAG_ERROR = 0x01
+
+
+class ProtocolError(ValueError):
+    """A binary message that is not a valid command frame."""
+
+
+class Opcode:
+    """One row of the opcode table."""
+
+    __slots__ = ('code', 'command', 'fields', 'ack')
+
+    def __init__(self, code: int, command: str, fields=(), ack=True):
+        self.code = code
+        self.command = command
+        self.fields = fields  # command keys for the a and b slots
+        self.ack = ack
+
+
+OPCODES = {op.code: op for op in (
+    Opcode(0x01, 'moveMouse', ('dx', 'dy'), ack=False),
+    Opcode(0x02, 'mouseLeftClick'),
+    Opcode(0x03, 'mouseRightClick'),
+    Opcode(0x04, 'togglePlayPause'),
+    Opcode(0x05, 'skipForward'),
+    Opcode(0x06, 'skipBackward'),
+    Opcode(0x07, 'fullscreen'),
+    Opcode(0x08, 'nextEpisode'),
+    Opcode(0x09, 'prevEpisode'),
+    Opcode(0x0A, 'setVolume', ('value',), ack=False),
+    Opcode(0x0B, 'getVolume'),
+    Opcode(0x0C, 'resetMouse'),
+)}
+BY_COMMAND = {op.command: op for op in OPCODES.values()}
+
+
+def decode(data: bytes) -> tuple:
+    """Parse a command frame into (opcode, seq, command dict)."""
+    if len(data) != FRAME.size:
+        raise ProtocolError(f"Expected {FRAME.size} bytes, got {len(data)}")
+    code, _flags, seq, a, b = FRAME.unpack(data)
+    op = OPCODES.get(code)
+    if op is None:
+        raise ProtocolError(f"Unknown opcode 0x{code:02x}")
+    cmd = {"command": op.command}
+    cmd.update(zip(op.fields, (a, b)))
+    return op, seq, cmd
+
+
+def encode(command: str, seq=0, a=0, b=0) -> bytes:
+    """Build a command frame (clients, benchmarks)."""
+    return FRAME.pack(BY_COMMAND[command].code, 0, seq & 0xFFFF, a, b)
+
+
+def encode_ack(op: Opcode, seq: int, ok=True, value=0) -> bytes:
+    return FRAME.pack(ACK | op.code, 0 if ok else FLAG_ERROR, seq, value, 0)
+
+
+def describe() -> dict:
+    """The negotiation reply."""
+    return {
+        "type": "binaryProtocol",
+        "version": VERSION,
+        "frame": FRAME.format,
+        "opcodes": {op.command: op.code for op in OPCODES.values()},
+        "fireAndForget": [op.command for op in OPCODES.values() if not op.ack],
+    }
@@ -0,0 +1,273 @@
+"""
+Pointer position and shape for the screen streams' cursor channel.
+
+With cursor: 'channel' in startStream, frames are captured without the
+pointer and the viewer gets it as small JSON messages instead, for the
+client to draw on top:
+
+    {"type": "cursor", "x": 412, "y": 230, "visible": true, "scale": 0.667}
+        position in frame pixels, sent only when it moved, at up to
+        CURSOR_RATE per second; scale maps screen pixels (the shape) to
+        frame pixels
+    {"type": "cursorShape", "width": 32, "height": 32, "hotX": 4, "hotY": 4,
+     "data": "<base64 PNG>"}
+        when the pointer's shape changes, where the platform exposes it
+
+Moving the mouse then no longer changes the captured image, so unchanged
+frames are still skipped and delta streams still send only real changes.
+
+Pointer sources (auto picks the first available):
+    macos      CoreGraphics position; shape through AppKit when installed
+    xfixes     X11 position, shape through the XFixes extension
+    pyautogui  position only
+    none       no pointer (headless); no cursor messages are sent
+"""
+import asyncio
+import base64
+import io
+import logging
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+try:
+    import Quartz  # pyobjc-framework-Quartz
+except ImportError:
+    Quartz = None
+
+try:
+    import AppKit  # pyobjc-framework-Cocoa, for the cursor image on macOS
+except ImportError:
+    AppKit = None
+
+try:
+    from Xlib import display as xdisplay
+except ImportError:
+    xdisplay = None
+
+logger = logging.getLogger(__name__)
+
+CURSOR_RATE = 60       # position samples per second
+SHAPE_INTERVAL = 0.1   # seconds between shape checks
+
+
+class CursorShape:
+    """A pointer image as PNG, with its hotspot; key identifies the shape."""
+
+    __slots__ = ('key', 'width', 'height', 'hot_x', 'hot_y', 'png')
+
+    def __init__(self, key, width: int, height: int, hot_x: int, hot_y: int, png: bytes):
+        self.key = key
+        self.width = width
+        self.height = height
+        self.hot_x = hot_x
+        self.hot_y = hot_y
+        self.png = png
+
+    def message(self) -> dict:
+        return {
+            "type": "cursorShape",
+            "width": self.width,
+            "height": self.height,
+            "hotX": self.hot_x,
+            "hotY": self.hot_y,
+            "data": base64.b64encode(self.png).decode('ascii'),
+        }
+
+
+class PointerSource:
+    """Base class: reads the pointer; runs on the cursor channel's thread."""
+
+    name = 'none'
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def position(self) -> tuple | None:
+        """Pointer position in screen coordinates (mss's), or None."""
+        return None
+
+    def shape(self) -> CursorShape | None:
+        """The current pointer image, or None if unknown."""
+        return None
+
+    def close(self):
+        pass
+
+
+class MacPointer(PointerSource):
+    name = 'macos'
+
+    def __init__(self):
+        self._shape = None
+
+    @classmethod
+    def available(cls):
+        return Quartz is not None
+
+    def position(self):
+        location = Quartz.CGEventGetLocation(Quartz.CGEventCreate(None))
+        return location.x, location.y
+
+    def shape(self):
+        if AppKit is None:
+            return None
+        cursor = AppKit.NSCursor.currentSystemCursor()
+        if cursor is None:
+            return None
+        tiff = bytes(cursor.image().TIFFRepresentation())
+        key = zlib.crc32(tiff)
+        if self._shape is None or self._shape.key != key:
+            img = Image.open(io.BytesIO(tiff))
+            hot = cursor.hotSpot()
+            self._shape = CursorShape(key, img.width, img.height, int(hot.x), int(hot.y), _png(img))
+        return self._shape
+
+
+class XFixesPointer(PointerSource):
+    name = 'xfixes'
+
+    def __init__(self):
+        self._display = xdisplay.Display()
+        self._root = self._display.screen().root
+        self._xfixes = self._display.has_extension('XFIXES')
+        if self._xfixes:
+            self._display.xfixes_query_version()
+        self._shape = None
+
+    @classmethod
+    def available(cls):
+        return xdisplay is not None and bool(os.environ.get('DISPLAY'))
+
+    def position(self):
+        pointer = self._root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def shape(self):
+        if not self._xfixes:
+            return None
+        image = self._display.xfixes_get_cursor_image(self._root)
+        if self._shape is None or self._shape.key != image.cursor_serial:
+            # ARGB words, little endian in memory: B, G, R, A
+            argb = np.asarray(image.cursor_image, dtype='<u4').reshape(image.height, image.width)
+            img = Image.frombuffer('RGBA', (image.width, image.height), argb.tobytes(), 'raw', 'BGRA', 0, 1)
+            self._shape = CursorShape(image.cursor_serial, image.width, image.height,
+                                      image.xhot, image.yhot, _png(img))
+        return self._shape
+
+    def close(self):
+        self._display.close()
+
+
+class PyautoguiPointer(PointerSource):
+    name = 'pyautogui'
+
+    @classmethod
+    def available(cls):
+        try:
+            import pyautogui
+            pyautogui.position()  # fails without a display
+        except Exception:
+            return False
+        return True
+
+    def position(self):
+        import pyautogui
+        x, y = pyautogui.position()
+        return x, y
+
+
+POINTERS = {cls.name: cls for cls in (MacPointer, XFixesPointer, PyautoguiPointer, PointerSource)}
+
+
+def create_pointer(name='auto') -> PointerSource:
+    """Instantiate a pointer source by name; 'auto' or unavailable ones pick the first that works."""
+    cls = POINTERS.get(name)
+    if cls is None or not cls.available():
+        cls = next(c for c in POINTERS.values() if c.available())
+    try:
+        return cls()
+    except Exception as e:
+        logger.warning(f"⚠️ Pointer source '{cls.name}' failed ({e}), no cursor channel")
+        return PointerSource()
+
+
+class CursorChannel:
+    """Samples the pointer at CURSOR_RATE for the viewers that asked for it.
+
+    Started by the first subscriber and stopped after the last one leaves.
+    Samples are taken on a worker thread and handed to every viewer's
+    send_cursor(), which maps them into its own frame.
+    """
+
+    def __init__(self, pointer='auto', rate=CURSOR_RATE):
+        self.pointer_name = pointer
+        self.rate = rate
+        self.viewers = set()
+        self.pointer = None  # opened on the worker thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cursor')
+        self._shape = None
+        self._shape_checked = 0.0
+        self.task = None
+
+    def subscribe(self, viewer):
+        self.viewers.add(viewer)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def unsubscribe(self, viewer):
+        self.viewers.discard(viewer)
+
+    def stop(self):
+        self.viewers.clear()
+        if self.task:
+            self.task.cancel()
+
+    def sample(self) -> tuple:
+        """(position, shape) now (worker thread)."""
+        if self.pointer is None:
+            self.pointer = create_pointer(self.pointer_name)
+            logger.info(f"🖱️ Cursor channel pointer source: {self.pointer.name}")
+        now = time.monotonic()
+        if now - self._shape_checked >= SHAPE_INTERVAL:
+            self._shape_checked = now
+            try:
+                self._shape = self.pointer.shape()
+            except Exception as e:
+                logger.debug(f"Cursor shape unavailable: {e}")
+        return self.pointer.position(), self._shape
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.rate
+        try:
+            while self.viewers:
+                start = time.monotonic()
+                position, shape = await loop.run_in_executor(self._executor, self.sample)
+                if position is not None:
+                    for viewer in list(self.viewers):
+                        await viewer.send_cursor(position, shape)
+                sleep_time = interval - (time.monotonic() - start)
+                if sleep_time > 0:
+                    await asyncio.sleep(sleep_time)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"❌ Cursor channel error: {e}")
+        finally:
+            self._executor.submit(self._close_pointer)
+
+    def _close_pointer(self):
+        if self.pointer is not None:
+            self.pointer.close()
+            self.pointer = None
+
+
+def _png(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
@@ -0,0 +1,202 @@
+"""
+Tile-based dirty-region encoding for the 'delta' stream mode.
+
+Each captured frame is compared with the previous one on a fixed tile grid
+(NumPy), and only the tiles that changed are encoded. Frames are sent
+as one binary WebSocket message:
+
+    header  '<2sBBHHH'  magic b'DT', flags (bit 0 = keyframe), reserved,
+                        frame width, frame height, tile count
+    tile    '<HHHHI'    x, y, w, h (pixels), image length
+            ...         image bytes (the stream's encoder), then the next tile
+
+Dirty tiles that touch on a row are sent as one strip. A keyframe is a
+single tile covering the whole frame; clients draw the tiles in order on
+top of the last picture. Keyframes are sent periodically, when most of
+the screen changed, and on demand (the 'resync' command).
+"""
+import struct
+import time
+import numpy as np
+from PIL import Image
+
+TILE_SIZE = 64
+KEYFRAME_INTERVAL = 5.0  # seconds
+FULL_FRAME_RATIO = 0.5   # send a keyframe when this share of tiles changed
+
+MAGIC = b'DT'
+FLAG_KEYFRAME = 0x01
+HEADER = struct.Struct('<2sBBHHH')
+TILE_HEADER = struct.Struct('<HHHHI')
+
+
+class TileFrame:
+    """Encoded tiles of one captured frame, keyed by (x, y, w, h)."""
+
+    __slots__ = ('width', 'height', 'tiles', 'keyframe')
+
+    def __init__(self, width: int, height: int, tiles: dict, keyframe: bool):
+        self.width = width
+        self.height = height
+        self.tiles = tiles
+        self.keyframe = keyframe
+
+    def __len__(self):
+        return sum(len(data) for data in self.tiles.values())
+
+
+def pack_tiles(width: int, height: int, tiles: dict, keyframe: bool) -> bytes:
+    """Serialize tiles into one binary delta message."""
+    parts = [HEADER.pack(MAGIC, FLAG_KEYFRAME if keyframe else 0, 0, width, height, len(tiles))]
+    for (x, y, w, h), data in tiles.items():
+        parts.append(TILE_HEADER.pack(x, y, w, h, len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def unpack_tiles(message: bytes) -> TileFrame:
+    """Parse a binary delta message (used by tools, benchmarks and tests).
+
+    ValueError if it is not one, or is cut short.
+    """
+    try:
+        magic, flags, _, width, height, count = HEADER.unpack_from(message, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a delta message")
+        offset = HEADER.size
+        tiles = {}
+        for _ in range(count):
+            x, y, w, h, length = TILE_HEADER.unpack_from(message, offset)
+            offset += TILE_HEADER.size
+            if offset + length > len(message):
+                raise ValueError("Truncated delta message")
+            tiles[(x, y, w, h)] = message[offset:offset + length]
+            offset += length
+    except struct.error:
+        raise ValueError("Truncated delta message") from None
+    return TileFrame(width, height, tiles, bool(flags & FLAG_KEYFRAME))
+
+
+class TileEncoder:
+    """Diffs consecutive frames on a tile grid and encodes the dirty tiles.
+
+    Runs on the streamer's capture thread; request_keyframe() may be called
+    from the event loop.
+    """
+
+    def __init__(self, encoder, tile_size=TILE_SIZE, keyframe_interval=KEYFRAME_INTERVAL,
+                 full_frame_ratio=FULL_FRAME_RATIO):
+        self.encoder = encoder
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval
+        self.full_frame_ratio = full_frame_ratio
+        self._previous = None
+        self._last_keyframe = 0.0
+        self._keyframe_requested = True
+
+    def request_keyframe(self):
+        self._keyframe_requested = True
+
+    def encode(self, img: Image.Image, quality: int) -> TileFrame:
+        current = np.asarray(img)
+        now = time.monotonic()
+
+        if (self._keyframe_requested or self._previous is None
+                or self._previous.shape != current.shape
+                or now - self._last_keyframe >= self.keyframe_interval):
+            return self._keyframe(img, current, quality, now)
+
+        dirty = self._dirty_tiles(current)
+        if dirty.mean() >= self.full_frame_ratio:
+            return self._keyframe(img, current, quality, now)
+
+        size = self.tile_size
+        height, width = current.shape[:2]
+        tiles = {}
+        for row, first, last in _runs(dirty):
+            # Neighbouring dirty tiles on a row go out as one strip, which
+            # saves a JPEG header per tile
+            x, y = first * size, row * size
+            w, h = min((last + 1) * size, width) - x, min(size, height - y)
+            tile = Image.fromarray(current[y:y + h, x:x + w])
+            tiles[(x, y, w, h)] = self.encoder.encode(tile, quality)
+
+        self._previous = current
+        return TileFrame(width, height, tiles, keyframe=False)
+
+    def _keyframe(self, img, current, quality, now) -> TileFrame:
+        self._keyframe_requested = False
+        self._last_keyframe = now
+        self._previous = current
+        tiles = {(0, 0, img.width, img.height): self.encoder.encode(img, quality)}
+        return TileFrame(img.width, img.height, tiles, keyframe=True)
+
+    def _dirty_tiles(self, current: np.ndarray) -> np.ndarray:
+        """Boolean (rows, cols) grid of tiles that differ from the previous frame."""
+        size = self.tile_size
+        height, width = current.shape[:2]
+        rows, cols = -(-height // size), -(-width // size)
+
+        changed = (current != self._previous).any(axis=2)
+        padded = np.zeros((rows * size, cols * size), dtype=bool)
+        padded[:height, :width] = changed
+        return padded.reshape(rows, size, cols, size).any(axis=(1, 3))
+
+
+class PendingTiles:
+    """A viewer's not-yet-sent tiles.
+
+    Newer tiles replace older ones at the same position, so frames a slow
+    or throttled viewer skips are merged instead of lost and the picture
+    stays consistent without queueing.
+    """
+
+    def __init__(self):
+        self.tiles = {}
+        self.keyframe = False
+        self.synced = False
+        self.width = 0
+        self.height = 0
+
+    def merge(self, frame: TileFrame) -> bool:
+        """Merge a frame; returns True when something is ready to send."""
+        if frame.keyframe:
+            self.tiles = dict(frame.tiles)
+            self.keyframe = True
+            self.synced = True
+        elif not self.synced:
+            return False  # waiting for a keyframe
+        else:
+            # Re-insert so the dict stays in capture order: strips can
+            # overlap, and the newest one must be drawn last
+            for rect, data in frame.tiles.items():
+                self.tiles.pop(rect, None)
+                self.tiles[rect] = data
+        self.width, self.height = frame.width, frame.height
+        return bool(self.tiles)
+
+    def take(self) -> bytes | None:
+        """Pack and clear the pending tiles."""
+        if not self.tiles:
+            return None
+        message = pack_tiles(self.width, self.height, self.tiles, self.keyframe)
+        self.tiles = {}
+        self.keyframe = False
+        return message
+
+    def reset(self):
+        """Drop everything and wait for the next keyframe."""
+        self.tiles = {}
+        self.keyframe = False
+        self.synced = False
+
+
+def _runs(dirty: np.ndarray):
+    """Yield (row, first_col, last_col) for each run of dirty tiles."""
+    for row in np.flatnonzero(dirty.any(axis=1)):
+        cols = np.flatnonzero(dirty[row])
+        breaks = np.flatnonzero(np.diff(cols) > 1)
+        starts = np.concatenate(([cols[0]], cols[breaks + 1]))
+        ends = np.concatenate((cols[breaks], [cols[-1]]))
+        for first, last in zip(starts, ends):
+            yield int(row), int(first), int(last)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Persistent Chrome DevTools Protocol channel to the video player tab.
+
+Episode navigation used to open the DevTools console with a keystroke,
+paste the script through the clipboard and close the console again: half
+a second of sleeps, and the user's clipboard overwritten. With Chrome
+started with --remote-debugging-port=9222, DevToolsChannel instead keeps
+one WebSocket to the player tab open and runs each script with a single
+Runtime.evaluate, which takes milliseconds.
+
+The tab is the first page whose URL contains CDP_TAB (if set) and that
+defines window.changeEpisode; failing that, the first page. The channel
+reconnects on demand when the tab or the browser goes away.
+
+A stand-in CDP server answers /json/list and Runtime.evaluate and tracks a
+fake episode number, so the channel can be exercised without Chrome:
+    python devtools.py standin --port 9222
+    python devtools.py bench --endpoint http://127.0.0.1:9222
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import logging
+import time
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINT = 'http://127.0.0.1:9222'
+EVAL_TIMEOUT = 2.0     # seconds for one Runtime.evaluate
+CONNECT_TIMEOUT = 1.0  # seconds for target discovery
+PLAYER_PROBE = "typeof window.changeEpisode === 'function'"
+
+
+class BrowserError(Exception):
+    """The browser could not be reached or the script failed."""
+
+
+class DevToolsChannel:
+    """One long-lived CDP WebSocket to the player tab."""
+
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, tab_match=''):
+        self.endpoint = endpoint.rstrip('/')
+        self.tab_match = tab_match
+        self.tab_url = None
+        self.loop = None
+        self._session = None
+        self._ws = None
+        self._reader = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._connect_lock = None
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None and not self._ws.closed
+
+    async def start(self):
+        """Create the session and try a first connection (not fatal)."""
+        self.loop = asyncio.get_running_loop()
+        self._session = aiohttp.ClientSession()
+        self._connect_lock = asyncio.Lock()
+        try:
+            await self._ensure_connected()
+        except BrowserError as e:
+            logger.info(f"🌐 DevTools not reachable yet ({e}), will retry on demand")
+
+    async def close(self):
+        await self._disconnect()
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def evaluate(self, expression: str, timeout=EVAL_TIMEOUT):
+        """Run an expression in the tab and return its value."""
+        params = {
+            "expression": expression,
+            "returnByValue": True,
+            "userGesture": True,  # lets requestFullscreen() through
+        }
+        try:
+            result = await self.send('Runtime.evaluate', params, timeout)
+        except (aiohttp.ClientError, ConnectionError):
+            # The tab went away between calls: reconnect once
+            await self._disconnect()
+            try:
+                result = await self.send('Runtime.evaluate', params, timeout)
+            except (aiohttp.ClientError, ConnectionError) as e:
+                await self._disconnect()
+                raise BrowserError(f"DevTools connection lost: {e}")
+
+        if 'exceptionDetails' in result:
+            details = result['exceptionDetails']
+            message = details.get('exception', {}).get('description') or details.get('text')
+            raise BrowserError(f"Script failed: {message}")
+        return result.get('result', {}).get('value')
+
+    def evaluate_threadsafe(self, expression: str, timeout=EVAL_TIMEOUT):
+        """evaluate() from a worker thread (execute_command)."""
+        if self.loop is None:
+            raise BrowserError("DevTools channel not started")
+        future = asyncio.run_coroutine_threadsafe(self.evaluate(expression, timeout), self.loop)
+        try:
+            return future.result(timeout + CONNECT_TIMEOUT * 2)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise BrowserError("DevTools evaluation timed out")
+
+    async def send(self, method: str, params=None, timeout=EVAL_TIMEOUT) -> dict:
+        """Send one CDP command and wait for its result."""
+        ws = await self._ensure_connected()
+        message_id = next(self._ids)
+        future = self.loop.create_future()
+        self._pending[message_id] = future
+        try:
+            await ws.send_json({"id": message_id, "method": method, "params": params or {}})
+            reply = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise BrowserError(f"{method} timed out")
+        finally:
+            self._pending.pop(message_id, None)
+
+        if 'error' in reply:
+            raise BrowserError(reply['error'].get('message', 'CDP error'))
+        return reply.get('result', {})
+
+    async def _ensure_connected(self):
+        if self.connected:
+            return self._ws
+        async with self._connect_lock:
+            if not self.connected:
+                await self._connect()
+        return self._ws
+
+    async def _connect(self):
+        try:
+            async with self._session.get(f'{self.endpoint}/json/list',
+                                         timeout=aiohttp.ClientTimeout(total=CONNECT_TIMEOUT)) as response:
+                targets = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise BrowserError(f"no DevTools endpoint at {self.endpoint}: {e}")
+
+        pages = [t for t in targets if t.get('type') == 'page' and t.get('webSocketDebuggerUrl')]
+        if self.tab_match:
+            pages = [t for t in pages if self.tab_match in t.get('url', '')]
+        if not pages:
+            raise BrowserError("no matching browser tab")
+
+        # Prefer the tab that actually runs the player
+        for target in pages:
+            await self._open(target)
+            try:
+                if await self.send('Runtime.evaluate', {"expression": PLAYER_PROBE, "returnByValue": True}):
+                    break
+            except BrowserError:
+                pass
+            if target is not pages[-1]:
+                await self._disconnect()
+        logger.info(f"🌐 DevTools connected to {self.tab_url}")
+
+    async def _open(self, target: dict):
+        try:
+            self._ws = await asyncio.wait_for(
+                self._session.ws_connect(target['webSocketDebuggerUrl'], max_msg_size=0), CONNECT_TIMEOUT)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise BrowserError(f"cannot attach to tab: {e}")
+        self.tab_url = target.get('url')
+        self._reader = asyncio.create_task(self._read(self._ws))
+
+    async def _read(self, ws):
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                future = self._pending.get(data.get('id'))
+                if future and not future.done():
+                    future.set_result(data)
+                # messages without an id are events; none are subscribed
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("DevTools connection closed"))
+
+    async def _disconnect(self):
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            await ws.close()
+        if self._reader:
+            self._reader.cancel()
+            self._reader = None
+
+
+# ============== Stand-in CDP server ==============
+
+class StandInBrowser:
+    """A fake browser with one player tab, for tests and benchmarks."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.episode = 1
+        self.fullscreen = False
+        self.expressions = []
+        self.pages = set()  # open tab connections
+        self.connections = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/json/list', self.handle_list)
+        app.router.add_get('/devtools/page/{id}', self.handle_page)
+        return app
+
+    async def handle_list(self, request):
+        host = request.host
+        return web.json_response([{
+            "id": "player",
+            "type": "page",
+            "title": "Video player",
+            "url": "http://localhost:8080/video",
+            "webSocketDebuggerUrl": f"ws://{host}/devtools/page/player",
+        }])
+
+    async def handle_page(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self.pages.add(ws)
+        self.connections += 1
+        try:
+            async for msg in ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                await ws.send_json({"id": data.get('id'), **self.run(data.get('method'), data.get('params', {}))})
+        finally:
+            self.pages.discard(ws)
+        return ws
+
+    async def drop(self):
+        """Close every tab connection, like a reloaded tab or a restarted browser."""
+        for ws in list(self.pages):
+            await ws.close()
+
+    def run(self, method: str, params: dict) -> dict:
+        if method != 'Runtime.evaluate':
+            return {"error": {"code": -32601, "message": f"'{method}' wasn't found"}}
+        expression = params.get('expression', '')
+        self.expressions.append(expression)
+        if expression == PLAYER_PROBE:
+            return {"result": {"result": {"type": "boolean", "value": True}}}
+        if expression.startswith('throw '):
+            error = expression.removeprefix('throw ')
+            return {"result": {"result": {"type": "object", "subtype": "error"},
+                               "exceptionDetails": {"text": "Uncaught",
+                                                    "exception": {"description": error}}}}
+        if "changeEpisode('next')" in expression:
+            self.episode += 1
+        elif "changeEpisode('prev')" in expression:
+            self.episode = max(1, self.episode - 1)
+        if 'requestFullscreen' in expression:
+            self.fullscreen = True
+        return {"result": {"result": {"type": "undefined"}}}
+
+
+async def run_standin(port: int, latency: float):
+    browser = StandInBrowser(latency)
+    runner = web.AppRunner(browser.app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    print(f"🧪 Stand-in DevTools endpoint on http://127.0.0.1:{port}")
+    try:
+        while True:
+            await asyncio.sleep(5)
+            print(f"   episode {browser.episode}, {len(browser.expressions)} evaluations")
+    finally:
+        await runner.cleanup()
+
+
+async def run_bench(endpoint: str, expression: str, iterations: int):
+    channel = DevToolsChannel(endpoint)
+    start = time.perf_counter()
+    await channel.start()
+    await channel.evaluate('1')
+    connect_ms = (time.perf_counter() - start) * 1000
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await channel.evaluate(expression)
+        timings.append((time.perf_counter() - start) * 1000)
+    await channel.close()
+
+    timings.sort()
+    print(f"🌐 {channel.tab_url}: connect {connect_ms:.1f} ms, "
+          f"evaluate p50 {timings[len(timings) // 2]:.2f} ms, "
+          f"p99 {timings[min(len(timings) - 1, int(len(timings) * 0.99))]:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DevTools channel tools")
+    sub = parser.add_subparsers(dest='action', required=True)
+    standin = sub.add_parser('standin', help='serve a stand-in CDP endpoint')
+    standin.add_argument('--port', type=int, default=9222)
+    standin.add_argument('--latency', type=float, default=0.0, help='seconds per evaluate')
+    bench = sub.add_parser('bench', help='time Runtime.evaluate on a CDP endpoint')
+    bench.add_argument('--endpoint', default=DEFAULT_ENDPOINT)
+    bench.add_argument('--expression', default="window.changeEpisode && window.changeEpisode('next')")
+    bench.add_argument('--iterations', type=int, default=100)
+    args = parser.parse_args()
+
+    if args.action == 'standin':
+        asyncio.run(run_standin(args.port, args.latency))
+    else:
+        asyncio.run(run_bench(args.endpoint, args.expression, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Ordered, non-blocking command dispatch for the /ws control endpoint.
+
+execute_command blocks (osascript, pyautogui, the sleeps in
+inject_javascript), so it runs on a small thread pool instead of the event
+loop. Each client gets its own FIFO and runner task: one client's commands
+execute and are answered in the order they were sent, while other clients
+and the screen streams keep going.
+
+Commands that only need their latest value never reach these queues:
+moveMouse is merged in pointer.py and setVolume coalesced in volume.py.
+"""
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+COMMAND_WORKERS = 4  # commands from different clients running at once
+MAX_PENDING = 64     # per client; beyond this new commands are refused
+
+
+class ClientQueue:
+    """One client's pending commands and the task that runs them in order."""
+
+    def __init__(self, dispatcher, respond):
+        self.dispatcher = dispatcher
+        self.respond = respond  # async callback(cmd, result)
+        self.executed = 0
+        self._pending = deque()
+        self._ready = asyncio.Event()
+        self._task = None
+
+    def submit(self, cmd: dict, respond=None) -> bool:
+        """Queue a command; False if the client already has too many pending.
+
+        respond overrides the client's callback for this command's result.
+        """
+        if len(self._pending) >= MAX_PENDING:
+            return False
+
+        self._pending.append((cmd, respond or self.respond))
+        self._ready.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return True
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def close(self):
+        """Drop pending commands and stop the runner (client disconnected)."""
+        self._pending.clear()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self._pending:
+                    cmd, respond = self._pending.popleft()
+                    result = await self.dispatcher.execute(cmd)
+                    self.executed += 1
+                    await respond(cmd, result)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"❌ Command runner failed: {e}")
+
+
+class CommandDispatcher:
+    """Runs a blocking command function on a thread pool, per-client ordered."""
+
+    def __init__(self, execute, workers=COMMAND_WORKERS):
+        self._execute = execute
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='command')
+
+    def client(self, respond) -> ClientQueue:
+        return ClientQueue(self, respond)
+
+    async def execute(self, cmd: dict):
+        """Run one command on the pool and return its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._execute, cmd)
+
+    async def call(self, func, *args):
+        """Run any other blocking call on the same pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,161 @@
+"""
+Frame encoder backends for ScreenStreamer.
+
+    pillow-jpeg   Pillow's JPEG encoder (always available)
+    turbo-jpeg    libjpeg-turbo through simplejpeg; encodes straight from
+                  the BGRA capture buffer, skipping the RGB conversion
+    webp          Pillow's WebP encoder (smaller frames, more CPU)
+
+startStream may name a backend with 'encoder'; otherwise the server uses
+the one pick_fastest_encoder() measured at startup. Only JPEG backends are
+candidates for the default, since every client can decode JPEG.
+"""
+import io
+import time
+import logging
+import numpy as np
+from PIL import Image, features
+
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
+logger = logging.getLogger(__name__)
+
+
+class Encoder:
+    """Base class: turns a frame into image bytes."""
+
+    name = ''
+    mime = 'image/jpeg'
+    accepts_bgra = False  # can encode an HxWx4 BGRX array directly
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def encode(self, img: Image.Image, quality: int) -> bytes:
+        """Encode an RGB image."""
+        raise NotImplementedError
+
+    def encode_bgra(self, pixels: np.ndarray, quality: int) -> bytes:
+        """Encode an HxWx4 BGRX array (only if accepts_bgra)."""
+        raise NotImplementedError
+
+
+class PillowJpegEncoder(Encoder):
+    name = 'pillow-jpeg'
+
+    def __init__(self, optimize=False):
+        self.optimize = optimize
+
+    def encode(self, img, quality):
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=quality, optimize=self.optimize)
+        return buffer.getvalue()
+
+
+class TurboJpegEncoder(Encoder):
+    name = 'turbo-jpeg'
+    accepts_bgra = True
+
+    def __init__(self, optimize=False):
+        pass  # libjpeg-turbo's fast DCT path has nothing to optimize
+
+    @classmethod
+    def available(cls):
+        return simplejpeg is not None
+
+    def encode(self, img, quality):
+        return simplejpeg.encode_jpeg(np.asarray(img), quality, colorspace='RGB', fastdct=True)
+
+    def encode_bgra(self, pixels, quality):
+        return simplejpeg.encode_jpeg(pixels, quality, colorspace='BGRX', fastdct=True)
+
+
+class WebpEncoder(Encoder):
+    name = 'webp'
+    mime = 'image/webp'
+
+    def __init__(self, optimize=False):
+        # method 0 is the fastest WebP effort level, 4 the library default
+        self.method = 4 if optimize else 0
+
+    @classmethod
+    def available(cls):
+        return features.check('webp')
+
+    def encode(self, img, quality):
+        buffer = io.BytesIO()
+        img.save(buffer, format='WEBP', quality=quality, method=self.method)
+        return buffer.getvalue()
+
+
+ENCODERS = {cls.name: cls for cls in (PillowJpegEncoder, TurboJpegEncoder, WebpEncoder)}
+
+
+def available_encoders() -> list[str]:
+    return [name for name, cls in ENCODERS.items() if cls.available()]
+
+
+def create_encoder(name: str, optimize=False) -> Encoder:
+    """Instantiate a backend by name; unknown or missing ones fall back to Pillow."""
+    cls = ENCODERS.get(name)
+    if cls is None or not cls.available():
+        logger.warning(f"⚠️ Encoder '{name}' not available, using pillow-jpeg")
+        cls = PillowJpegEncoder
+    return cls(optimize=optimize)
+
+
+def sample_frame(width=1280, height=720) -> Image.Image:
+    """Deterministic desktop-like RGB frame for calibration and benchmarks."""
+    rng = np.random.default_rng(0)
+    pixels = np.full((height, width, 3), 235, dtype=np.uint8)
+    pixels[:40] = (40, 44, 52)                            # title bar
+    pixels[40:, :240] = (30, 30, 30)                      # sidebar
+    rows = rng.integers(0, 2, size=(height - 80) // 12, dtype=bool)
+    for i, has_text in enumerate(rows):                   # text lines
+        if has_text:
+            y = 60 + i * 12
+            pixels[y:y + 8, 280:width - 40] = rng.integers(0, 2, size=(8, width - 320, 1)) * 200
+    pixels[height // 2:, width // 2:] = rng.integers(0, 255, size=(height - height // 2, width - width // 2, 3))
+    return Image.fromarray(pixels)
+
+
+def measure_encoder(encoder: Encoder, img: Image.Image, quality: int, iterations=10) -> tuple:
+    """Median ms/frame and bytes/frame for one encoder, starting from BGRA.
+
+    Includes the conversion each backend needs from a native-size capture:
+    BGRX to RGB for Pillow-based ones, none for BGRA-capable ones.
+    """
+    raw = np.asarray(img.convert('RGBX'))[:, :, [2, 1, 0, 3]].tobytes()
+
+    timings, size = [], 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        if encoder.accepts_bgra:
+            pixels = np.frombuffer(raw, dtype=np.uint8).reshape(img.height, img.width, 4)
+            data = encoder.encode_bgra(pixels, quality)
+        else:
+            data = encoder.encode(Image.frombytes('RGB', img.size, raw, 'raw', 'BGRX'), quality)
+        timings.append((time.perf_counter() - start) * 1000)
+        size = len(data)
+    timings.sort()
+    return timings[len(timings) // 2], size
+
+
+def pick_fastest_encoder(quality=60) -> str:
+    """Measure the available JPEG backends on a sample frame and return the fastest."""
+    img = sample_frame()
+    results = {}
+    for name in available_encoders():
+        cls = ENCODERS[name]
+        if cls.mime != 'image/jpeg':
+            continue
+        results[name], _ = measure_encoder(cls(), img, quality, iterations=5)
+
+    fastest = min(results, key=results.get)
+    summary = ', '.join(f"{name} {ms:.1f}ms" for name, ms in results.items())
+    logger.info(f"🏎️ Default encoder: {fastest} ({summary})")
+    return fastest
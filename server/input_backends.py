@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+Input injection backends for execute_command.
+
+    macos        a long-lived osascript (JavaScript for Automation) worker
+                 fed commands over a pipe: System Events keys and the
+                 volume, with no process spawn per command; the mouse goes
+                 through pyautogui in-process
+    xtest        X11 XTest through python-xlib, in-process (Linux)
+    fake         records events and simulates the volume; no desktop needed
+    fake-worker  the fake backend behind the same pipe worker protocol as
+                 macos, to measure the worker round trip anywhere
+    osascript    the old behaviour, one osascript process per command
+                 (kept for comparison in bench_input.py)
+
+Chosen with the INPUT_BACKEND environment variable; 'auto' picks macos on
+macOS, xtest on an X11 desktop, and fake otherwise.
+
+Worker protocol: one JSON object per line each way, e.g.
+    -> {"id": 7, "op": "key", "action": "skipForward"}
+    <- {"id": 7, "ok": true}
+
+Run a Python backend as a worker process:
+    python input_backends.py worker --backend fake
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    from Xlib import X, XK, display as xdisplay
+    from Xlib.ext import xtest
+except ImportError:
+    xdisplay = None
+
+logger = logging.getLogger(__name__)
+
+KEY_ACTIONS = ('togglePlayPause', 'skipForward', 'skipBackward', 'fullscreen')
+MOUSE_BUTTONS = ('left', 'right')
+REPLY_TIMEOUT = 5.0         # seconds before a silent worker is restarted
+DEFAULT_VOLUME = 50
+
+
+class InputError(Exception):
+    """An input command could not be delivered."""
+
+
+class InputBackend:
+    """Base class: delivers key, mouse and volume commands.
+
+    Methods are blocking and thread-safe; call them off the event loop
+    when they may take a while.
+    """
+
+    name = ''
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def start(self):
+        """Open connections or workers ahead of the first command."""
+
+    def close(self):
+        pass
+
+    def key(self, action: str):
+        """Press one of KEY_ACTIONS in the frontmost application."""
+        raise NotImplementedError
+
+    def set_volume(self, volume: int) -> int:
+        """Set the output volume (0-100) and return the actual value."""
+        raise NotImplementedError
+
+    def get_volume(self) -> int:
+        raise NotImplementedError
+
+    def move_mouse(self, dx: int, dy: int):
+        """Move the pointer relative to its current position."""
+        raise NotImplementedError
+
+    def click(self, button='left'):
+        raise NotImplementedError
+
+
+# ============== macOS ==============
+
+# Key codes and modifiers sent to the frontmost process
+MAC_KEYS = {
+    'togglePlayPause': (49, None),          # space
+    'skipForward': (124, 'shift down'),     # shift + right arrow
+    'skipBackward': (123, 'shift down'),    # shift + left arrow
+    'fullscreen': (3, None),                # f
+}
+
+# Reads requests from stdin until EOF and answers each on stdout
+MAC_WORKER_SCRIPT = """
+ObjC.import('Foundation');
+const stdin = $.NSFileHandle.fileHandleWithStandardInput;
+const stdout = $.NSFileHandle.fileHandleWithStandardOutput;
+const events = Application('System Events');
+const app = Application.currentApplication();
+app.includeStandardAdditions = true;
+const KEYS = %s;
+
+function reply(obj) {
+  stdout.writeData($(JSON.stringify(obj) + '\\n').dataUsingEncoding($.NSUTF8StringEncoding));
+}
+
+function handle(req) {
+  if (req.op === 'key') {
+    const [code, using] = KEYS[req.action];
+    events.keyCode(code, using ? {using: using} : {});
+    return {};
+  }
+  if (req.op === 'setVolume') {
+    app.setVolume(null, {outputVolume: req.value});
+  } else if (req.op !== 'getVolume') {
+    throw new Error('Unknown op: ' + req.op);
+  }
+  return {volume: app.getVolumeSettings().outputVolume};
+}
+
+let buffer = '';
+while (true) {
+  const data = stdin.availableData;
+  if (data.length == 0) break;
+  buffer += $.NSString.alloc.initWithDataEncoding(data, $.NSUTF8StringEncoding).js;
+  let newline;
+  while ((newline = buffer.indexOf('\\n')) >= 0) {
+    const line = buffer.slice(0, newline);
+    buffer = buffer.slice(newline + 1);
+    let req = {};
+    try {
+      req = JSON.parse(line);
+      reply(Object.assign({id: req.id, ok: true}, handle(req)));
+    } catch (e) {
+      reply({id: req.id, ok: false, error: String(e)});
+    }
+  }
+}
+""" % json.dumps(MAC_KEYS)
+
+
+class PipeWorkerBackend(InputBackend):
+    """Talks to a long-lived worker process over its stdin/stdout.
+
+    The worker is started on first use and restarted if it exits or stops
+    answering. Requests are serialized; each waits for its reply.
+    """
+
+    def __init__(self):
+        self._process = None
+        self._replies = queue.Queue()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def command(self) -> list:
+        raise NotImplementedError
+
+    def start(self):
+        with self._lock:
+            self._ensure_worker()
+
+    def close(self):
+        with self._lock:
+            self._stop_worker()
+
+    def request(self, op: str, **fields) -> dict:
+        with self._lock:
+            self._ensure_worker()
+            request_id = next(self._ids)
+            try:
+                self._process.stdin.write(json.dumps({"id": request_id, "op": op, **fields}) + '\n')
+                self._process.stdin.flush()
+            except OSError as e:
+                self._stop_worker()
+                raise InputError(f"{self.name} worker unavailable: {e}")
+
+            deadline = time.monotonic() + REPLY_TIMEOUT
+            while True:
+                try:
+                    reply = self._replies.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    self._stop_worker()
+                    raise InputError(f"{self.name} worker did not answer '{op}'")
+                if reply is None:
+                    self._stop_worker()
+                    raise InputError(f"{self.name} worker exited")
+                if reply.get('id') == request_id:
+                    break
+                # a late reply to a request that already timed out
+
+        if not reply.get('ok'):
+            raise InputError(reply.get('error', 'unknown error'))
+        return reply
+
+    def key(self, action):
+        self.request('key', action=action)
+
+    def set_volume(self, volume):
+        return int(self.request('setVolume', value=volume)['volume'])
+
+    def get_volume(self):
+        return int(self.request('getVolume')['volume'])
+
+    def move_mouse(self, dx, dy):
+        self.request('move', dx=dx, dy=dy)
+
+    def click(self, button='left'):
+        self.request('click', button=button)
+
+    def _ensure_worker(self):
+        if self._process is not None and self._process.poll() is None:
+            return
+        self._replies = queue.Queue()
+        self._process = subprocess.Popen(self.command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         text=True, bufsize=1)
+        threading.Thread(target=self._read_replies, args=(self._process, self._replies),
+                         name=f'{self.name}-reader', daemon=True).start()
+        logger.info(f"⌨️ Started {self.name} input worker (pid {self._process.pid})")
+
+    def _stop_worker(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+
+    @staticmethod
+    def _read_replies(process, replies):
+        for line in process.stdout:
+            try:
+                replies.put(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"⚠️ Bad input worker reply: {line.strip()}")
+        replies.put(None)  # EOF
+
+
+class MacBackend(PipeWorkerBackend):
+    name = 'macos'
+
+    @classmethod
+    def available(cls):
+        return sys.platform == 'darwin'
+
+    def command(self):
+        return ['osascript', '-l', 'JavaScript', '-e', MAC_WORKER_SCRIPT]
+
+    # The mouse is already in-process through pyautogui (Quartz events)
+    def move_mouse(self, dx, dy):
+        _pyautogui_move(dx, dy)
+
+    def click(self, button='left'):
+        _pyautogui_click(button)
+
+
+class OsascriptBackend(InputBackend):
+    """One osascript process per command (the original implementation)."""
+
+    name = 'osascript'
+
+    @classmethod
+    def available(cls):
+        return sys.platform == 'darwin'
+
+    def key(self, action):
+        code, using = MAC_KEYS[action]
+        modifier = f' using {using}' if using else ''
+        self._run(f'''
+        tell application "System Events"
+            tell process (first application process whose frontmost is true)
+                key code {code}{modifier}
+            end tell
+        end tell
+        ''')
+
+    def set_volume(self, volume):
+        self._run(f'set volume output volume {volume}')
+        return self.get_volume()
+
+    def get_volume(self):
+        return int(self._run('output volume of (get volume settings)'))
+
+    def move_mouse(self, dx, dy):
+        _pyautogui_move(dx, dy)
+
+    def click(self, button='left'):
+        _pyautogui_click(button)
+
+    @staticmethod
+    def _run(script: str) -> str:
+        try:
+            result = subprocess.run(['osascript', '-e', script], check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            raise InputError(e.stderr.strip() or str(e))
+        return result.stdout.strip()
+
+
+# Instant moves, and no pyautogui.PAUSE (0.1 s) sleep after each call
+def _pyautogui_move(dx: int, dy: int):
+    import pyautogui
+    pyautogui.moveRel(dx, dy, _pause=False)
+
+
+def _pyautogui_click(button: str):
+    import pyautogui
+    pyautogui.click(button=button, _pause=False)
+
+
+# ============== Linux ==============
+
+# Keysyms: the key, then the modifiers held while it is pressed
+X11_KEYS = {
+    'togglePlayPause': ('space', ()),
+    'skipForward': ('Right', ('Shift_L',)),
+    'skipBackward': ('Left', ('Shift_L',)),
+    'fullscreen': ('f', ()),
+}
+X11_BUTTONS = {'left': 1, 'right': 3}
+
+
+class XTestBackend(InputBackend):
+    """Synthetic X11 events through the XTest extension, in-process.
+
+    There is no mixer API in X11, so the volume goes through pactl
+    (PulseAudio/PipeWire), which still spawns a process per call.
+    """
+
+    name = 'xtest'
+
+    def __init__(self):
+        self._display = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def available(cls):
+        return xdisplay is not None and bool(os.environ.get('DISPLAY'))
+
+    def start(self):
+        with self._lock:
+            self._connection()
+
+    def close(self):
+        with self._lock:
+            if self._display is not None:
+                self._display.close()
+                self._display = None
+
+    def key(self, action):
+        keysym, modifiers = X11_KEYS[action]
+        with self._lock:
+            d = self._connection()
+            codes = [d.keysym_to_keycode(XK.string_to_keysym(name)) for name in (*modifiers, keysym)]
+            for code in codes:
+                xtest.fake_input(d, X.KeyPress, code)
+            for code in reversed(codes):
+                xtest.fake_input(d, X.KeyRelease, code)
+            d.sync()
+
+    def move_mouse(self, dx, dy):
+        with self._lock:
+            d = self._connection()
+            xtest.fake_input(d, X.MotionNotify, detail=True, x=dx, y=dy)  # detail=True: relative
+            d.sync()
+
+    def click(self, button='left'):
+        with self._lock:
+            d = self._connection()
+            xtest.fake_input(d, X.ButtonPress, X11_BUTTONS[button])
+            xtest.fake_input(d, X.ButtonRelease, X11_BUTTONS[button])
+            d.sync()
+
+    def set_volume(self, volume):
+        self._pactl('set-sink-volume', '@DEFAULT_SINK@', f'{volume}%')
+        return self.get_volume()
+
+    def get_volume(self):
+        match = re.search(r'(\d+)%', self._pactl('get-sink-volume', '@DEFAULT_SINK@'))
+        if not match:
+            raise InputError("Could not read the volume from pactl")
+        return int(match.group(1))
+
+    def _connection(self):
+        if self._display is None:
+            self._display = xdisplay.Display()
+        return self._display
+
+    @staticmethod
+    def _pactl(*args) -> str:
+        try:
+            result = subprocess.run(['pactl', *args], check=True, capture_output=True, text=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise InputError(f"pactl failed: {e}")
+        return result.stdout
+
+
+# ============== Fake ==============
+
+class FakeBackend(InputBackend):
+    """Records events instead of injecting them (benchmarks, load tests).
+
+    An optional per-command latency simulates a slow backend.
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.volume = DEFAULT_VOLUME
+        self.position = [0, 0]
+        self.events = deque(maxlen=1000)  # the most recent events
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def key(self, action):
+        if action not in KEY_ACTIONS:
+            raise InputError(f"Unknown key action: {action}")
+        self._record('key', action)
+
+    def set_volume(self, volume):
+        self.volume = max(0, min(100, int(volume)))
+        self._record('setVolume', self.volume)
+        return self.volume
+
+    def get_volume(self):
+        self._record('getVolume')
+        return self.volume
+
+    def move_mouse(self, dx, dy):
+        self._record('move', dx, dy)
+        with self._lock:
+            self.position[0] += dx
+            self.position[1] += dy
+
+    def click(self, button='left'):
+        self._record('click', button)
+
+    def _record(self, op, *args):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.events.append((time.monotonic(), op, *args))
+            self.counts[op] = self.counts.get(op, 0) + 1
+
+
+class FakeWorkerBackend(PipeWorkerBackend):
+    """The fake backend in a worker process: measures the pipe round trip."""
+
+    name = 'fake-worker'
+
+    def command(self):
+        return [sys.executable, os.path.abspath(__file__), 'worker', '--backend', 'fake']
+
+
+BACKENDS = {cls.name: cls for cls in (MacBackend, XTestBackend, FakeBackend, FakeWorkerBackend,
+                                      OsascriptBackend)}
+
+
+def available_backends() -> list[str]:
+    return [name for name, cls in BACKENDS.items() if cls.available()]
+
+
+def create_backend(name='auto') -> InputBackend:
+    """Instantiate a backend by name; 'auto', unknown or missing ones pick by platform."""
+    cls = BACKENDS.get(name)
+    if cls is None or not cls.available():
+        if name != 'auto':
+            logger.warning(f"⚠️ Input backend '{name}' not available, picking one for this platform")
+        if MacBackend.available():
+            cls = MacBackend
+        elif XTestBackend.available():
+            cls = XTestBackend
+        else:
+            logger.warning("⚠️ No input backend for this platform, input is simulated")
+            cls = FakeBackend
+    logger.info(f"⌨️ Input backend: {cls.name}")
+    return cls()
+
+
+def serve(backend: InputBackend, stdin=sys.stdin, stdout=sys.stdout):
+    """Run a backend as a pipe worker until stdin closes."""
+    handlers = {
+        'key': lambda req: backend.key(req['action']),
+        'setVolume': lambda req: {"volume": backend.set_volume(req['value'])},
+        'getVolume': lambda req: {"volume": backend.get_volume()},
+        'move': lambda req: backend.move_mouse(req['dx'], req['dy']),
+        'click': lambda req: backend.click(req.get('button', 'left')),
+    }
+    for line in stdin:
+        req = {}
+        try:
+            req = json.loads(line)
+            result = handlers[req['op']](req) or {}
+            reply = {"id": req.get('id'), "ok": True, **result}
+        except Exception as e:
+            reply = {"id": req.get('id'), "ok": False, "error": str(e)}
+        stdout.write(json.dumps(reply) + '\n')
+        stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Input backend worker process")
+    sub = parser.add_subparsers(dest='action', required=True)
+    worker = sub.add_parser('worker', help='serve a backend over stdin/stdout')
+    worker.add_argument('--backend', default='fake', choices=['fake', 'xtest'])
+    args = parser.parse_args()
+
+    backend = create_backend(args.backend)
+    try:
+        serve(backend)
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
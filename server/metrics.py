@@ -0,0 +1,218 @@
+"""
+Minimal Prometheus-style metrics for the /metrics endpoint of both servers.
+
+Counters, gauges and histograms with labels, rendered in the Prometheus
+text exposition format. Observations may come from the capture threads,
+so every metric guards its values with a lock.
+
+Labels include window titles, so the servers only serve /metrics with the
+password or a session token as a bearer token (sessions.ClientAuth.require).
+In prometheus.yml:
+
+    authorization:
+      credentials: <REMOTE_PASSWORD>
+"""
+import asyncio
+import threading
+import time
+from aiohttp import web
+
+# Latency buckets in seconds, from sub-millisecond sends to slow 4K encodes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REGISTRY = []
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _format_labels(self, key: tuple, extra: str = '') -> str:
+        parts = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return '{' + ','.join(parts) + '}' if parts else ''
+
+    def remove(self, **labels):
+        """Drop one label set (e.g. a stream that ended)."""
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value) -> list:
+        return [f"{self.name}{self._format_labels(key)} {_number(value)}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        super().__init__(name, help, labelnames)
+        self._function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Read the value from a callable at scrape time (unlabelled gauges)."""
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            self.set(self._function())
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # cumulative bucket counts, then sum and count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the duration of a block."""
+        return _Timer(self, labels)
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines = []
+        for bound, n in zip(self.buckets, counts):
+            le = 'le="' + _number(bound) + '"'
+            lines.append(f"{self.name}_bucket{self._format_labels(key, le)} {n}")
+        inf = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{self._format_labels(key, inf)} {count}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(total)}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# ============== Shared metrics ==============
+
+# Screen streaming (streaming.py)
+STREAM_CAPTURE_SECONDS = Histogram('stream_capture_seconds', 'Screen grab time per frame', ['stream'])
+STREAM_ENCODE_SECONDS = Histogram('stream_encode_seconds', 'Convert/resize/encode time per frame', ['stream'])
+STREAM_SEND_SECONDS = Histogram('stream_send_seconds', 'Time to write one frame to a viewer socket', ['stream'])
+STREAM_FPS = Gauge('stream_fps', 'Achieved capture rate over the last second', ['stream'])
+STREAM_FRAMES = Counter('stream_frames_total', 'Captured frames by result (active = encoded, idle = unchanged)',
+                        ['stream', 'result'])
+STREAM_FRAMES_DROPPED = Counter('stream_frames_dropped_total', 'Frames replaced before a viewer could send them',
+                                ['stream'])
+STREAM_BYTES_SENT = Counter('stream_bytes_sent_total', 'Frame bytes written to viewer sockets', ['stream'])
+STREAM_VIEWERS = Gauge('stream_viewers', 'Viewers subscribed per stream', ['stream'])
+STREAM_FRAME_JITTER_SECONDS = Histogram('stream_frame_jitter_seconds',
+                                        'Deviation of each frame start interval from the target (pacing.py)',
+                                        ['stream'])
+STREAM_FRAME_OVERRUNS = Counter('stream_frame_overruns_total', 'Frames started after their deadline', ['stream'])
+STREAM_FRAMES_SKIPPED = Counter('stream_frames_skipped_total', 'Frame slots skipped to catch up after an overrun',
+                                ['stream'])
+STREAM_FRAME_LATENCY_SECONDS = Histogram('stream_frame_latency_seconds',
+                                         'Frame capture to the client\'s frameAck', ['stream'])
+
+# Clients and commands (servers)
+CLIENTS_CONNECTED = Gauge('clients_connected', 'Open WebSocket connections', ['endpoint'])
+CLIENTS_AUTHENTICATED = Gauge('clients_authenticated', 'Authenticated WebSocket connections')
+SESSION_AUTH = Counter('session_auth_total', 'Session token auths by result (resumed, expired, invalid)',
+                       ['result'])
+COMMAND_SECONDS = Histogram('command_duration_seconds', 'execute_command latency', ['command'])
+POINTER_EVENTS = Counter('pointer_events_total', 'moveMouse events received')
+POINTER_MOVES = Counter('pointer_moves_total', 'Coalesced pointer moves applied')
+POINTER_LATENCY_SECONDS = Histogram('pointer_latency_seconds', 'Oldest merged moveMouse event to its applied move')
+VOLUME_REQUESTS = Counter('volume_requests_total', 'setVolume requests received')
+VOLUME_APPLIES = Counter('volume_applies_total', 'Volume levels applied after coalescing')
+STATIC_RESPONSES = Counter('static_responses_total', 'Static file responses by status code', ['code'])
+STATIC_BYTES_SENT = Counter('static_bytes_sent_total', 'Static file body bytes sent')
+EVENT_LOOP_LAG_SECONDS = Histogram('event_loop_lag_seconds', 'Extra delay of a periodic event loop wakeup')
+
+
+async def handle_metrics(request):
+    """Serve all metrics in the Prometheus text format."""
+    return web.Response(text=render(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Content-Type-Options': 'nosniff'})
+
+
+async def monitor_event_loop_lag(interval=0.25):
+    """Background task: record how late the loop wakes up from a sleep."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(loop.time() - start - interval, 0.0))
@@ -0,0 +1,122 @@
+"""
+Deadline-based frame pacing for the capture loops.
+
+Frames are started on a fixed grid of monotonic deadlines, one interval
+apart, instead of sleeping "interval minus the time the last frame took".
+A frame that overruns its slot starts the next one at once; when capture
+falls more than a whole interval behind, the missed slots are skipped so
+the loop rejoins the grid instead of drifting. fps changes apply from the
+next frame.
+
+Each frame start records its interval jitter (how far the time since the
+previous start is from the target interval); overruns and skipped slots
+are counted too. stats() summarizes them and, with a stream label, they
+are exported in metrics.py.
+"""
+import asyncio
+import time
+from collections import deque
+from metrics import STREAM_FRAME_JITTER_SECONDS, STREAM_FRAME_OVERRUNS, STREAM_FRAMES_SKIPPED
+
+JITTER_WINDOW = 300  # recent frame intervals kept for stats()
+
+
+class FramePacer:
+    """Schedules frame starts on a monotonic deadline grid."""
+
+    def __init__(self, fps: int, label: str | None = None, clock=time.monotonic,
+                 window=JITTER_WINDOW):
+        self.label = label  # metrics stream label, None to skip metrics
+        self.clock = clock
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.frames = 0
+        self.overruns = 0  # frames that started after their deadline
+        self.skipped = 0   # whole slots dropped to catch up
+        self.max_jitter = 0.0
+        self.last_start = None
+        self._deadline = None
+        self._slots = 1  # slots since the previous start, for the jitter
+        self._jitter = deque(maxlen=window)
+        self._intervals = deque(maxlen=window)
+
+    def set_fps(self, fps: int):
+        """Change the rate; the next deadline is one new interval after the last start."""
+        self.fps = fps
+        self.interval = 1.0 / fps
+        if self.last_start is not None:
+            self._deadline = self.last_start
+
+    def schedule(self, now: float | None = None) -> float:
+        """Seconds to wait before starting the next frame."""
+        now = self.clock() if now is None else now
+        if self._deadline is None:
+            self._deadline = now
+            return 0.0
+
+        self._deadline += self.interval
+        self._slots = 1
+        late = now - self._deadline
+        if late > 0:
+            missed = int(late // self.interval)
+            self.overrun(missed)
+            self._deadline += missed * self.interval
+            self._slots += missed
+        return max(self._deadline - now, 0.0)
+
+    def overrun(self, skipped=0):
+        """Count a late frame, and any slots skipped to catch up."""
+        self.overruns += 1
+        self.skipped += skipped
+        if self.label:
+            STREAM_FRAME_OVERRUNS.inc(stream=self.label)
+            if skipped:
+                STREAM_FRAMES_SKIPPED.inc(skipped, stream=self.label)
+
+    def started(self, now: float | None = None, slots: int | None = None) -> float | None:
+        """Record a frame start; returns its interval jitter in seconds."""
+        now = self.clock() if now is None else now
+        previous, self.last_start = self.last_start, now
+        self.frames += 1
+        if previous is None:
+            return None
+
+        interval = now - previous
+        jitter = abs(interval - (slots or self._slots) * self.interval)
+        self._jitter.append(jitter)
+        self._intervals.append(interval)
+        self.max_jitter = max(self.max_jitter, jitter)
+        if self.label:
+            STREAM_FRAME_JITTER_SECONDS.observe(jitter, stream=self.label)
+        return jitter
+
+    async def wait(self):
+        """Sleep until the next deadline, then record the frame start."""
+        delay = self.schedule()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.started()
+
+    def wait_blocking(self):
+        """wait() for a thread or process without an event loop."""
+        delay = self.schedule()
+        if delay > 0:
+            time.sleep(delay)
+        self.started()
+
+    def stats(self) -> dict:
+        jitter = sorted(self._jitter)
+
+        def ms(p):
+            return round(jitter[min(len(jitter) - 1, int(len(jitter) * p))] * 1000, 3) if jitter else None
+
+        return {
+            "fps": self.fps,
+            "actualFps": round(len(self._intervals) / sum(self._intervals), 2) if self._intervals else None,
+            "frames": self.frames,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "jitterP50Ms": ms(0.5),
+            "jitterP99Ms": ms(0.99),
+            "jitterMaxMs": round(self.max_jitter * 1000, 3),
+        }
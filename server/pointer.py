@@ -0,0 +1,104 @@
+"""
+Coalesced pointer movement for moveMouse.
+
+The joystick sends a relative move every ~50 ms; applying each one as it
+arrives (with pyautogui's glide and pause) queues them up and the cursor
+trails the finger. Instead, incoming dx/dy from all clients are summed into
+one pending vector, and a pointer loop applies it RATE times a second as a
+single instant move on its own thread.
+
+Reported in metrics.py: events received, moves applied (the difference was
+merged) and the latency from the oldest merged event to its move.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import POINTER_EVENTS, POINTER_MOVES, POINTER_LATENCY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 120  # pointer ticks per second
+
+
+class PointerMover:
+    """Accumulates relative moves and applies them at a fixed rate."""
+
+    def __init__(self, move, rate=DEFAULT_RATE):
+        self.move = move  # blocking move(dx, dy)
+        self.rate = rate
+        self.events = 0
+        self.moves = 0
+        self._dx = 0
+        self._dy = 0
+        self._oldest = None  # arrival time of the oldest pending event
+        self._pending = asyncio.Event()
+        # Held from taking the pending vector until its move is done, so
+        # flush() also waits for a move the pointer loop already started
+        self._applying = asyncio.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pointer')
+        self._task = None
+
+    @property
+    def merged(self) -> int:
+        return self.events - self.moves
+
+    def add(self, dx: int, dy: int):
+        """Queue a relative move (event loop side, never blocks)."""
+        self.events += 1
+        POINTER_EVENTS.inc()
+        if not dx and not dy:
+            return
+        self._dx += dx
+        self._dy += dy
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._pending.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def flush(self):
+        """Apply any pending move now and wait for one in flight (before a click)."""
+        await self._apply()
+
+    def stats(self) -> dict:
+        return {"rate": self.rate, "events": self.events, "moves": self.moves, "merged": self.merged}
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._executor.shutdown(wait=False)
+        logger.info(f"🖱️ Pointer: {self.events} events, {self.moves} moves ({self.merged} merged)")
+
+    async def _run(self):
+        interval = 1.0 / self.rate
+        try:
+            while True:
+                await self._pending.wait()
+                tick_start = time.monotonic()
+                await self._apply()
+                sleep_time = interval - (time.monotonic() - tick_start)
+                if sleep_time > 0:
+                    await asyncio.sleep(sleep_time)
+        except asyncio.CancelledError:
+            pass
+
+    async def _apply(self):
+        async with self._applying:
+            dx, dy, oldest = self._dx, self._dy, self._oldest
+            self._dx = self._dy = 0
+            self._oldest = None
+            self._pending.clear()
+            if oldest is None:
+                return
+
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(self._executor, self.move, dx, dy)
+            except Exception as e:
+                logger.error(f'❌ Failed to move mouse: {e}')
+                return
+        self.moves += 1
+        POINTER_MOVES.inc()
+        POINTER_LATENCY_SECONDS.observe(time.monotonic() - oldest)
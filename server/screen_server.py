@@ -5,206 +5,50 @@ Captures screen and streams to browser with good performance
 No FFmpeg compilation required!
 """
 import asyncio
-import json
 import os
-import io
-import time
-import base64
 from aiohttp import web
 import logging
-import mss
 from PIL import Image
 from dotenv import load_dotenv
+from streaming import StreamHub, DEFAULT_LINGER
+from stream_worker import streamer_class
+from screen_socket import ScreenSocket, TARGET_FPS, QUALITY, MAX_WIDTH, MAX_HEIGHT
+from encoders import pick_fastest_encoder
+from sessions import SessionStore, ClientAuth
+from metrics import CLIENTS_AUTHENTICATED, handle_metrics, monitor_event_loop_lag
 
 # Load environment variables
 load_dotenv()
 
 PORT = 8081
 REMOTE_PASSWORD = os.getenv('REMOTE_PASSWORD', 'changeme')
-TARGET_FPS = 30
-QUALITY = 60  # JPEG quality (1-100)
-MAX_WIDTH = 1280
-MAX_HEIGHT = 720
-
-# Track authenticated clients
-authenticated_clients = set()
-streaming_tasks = {}
+# Signs session tokens (sessions.py); random per run when unset, so a
+# restart asks every client for the password again
+SESSION_SECRET = os.getenv('SESSION_SECRET')
+# Capture source: mss (the screen), synthetic[:pattern[:WxH]] or replay:<file>
+CAPTURE_SOURCE = os.getenv('CAPTURE_SOURCE', 'mss')
+# Where frames are captured and encoded: thread (in this process) or process
+# (a worker process per stream, slow to start; see stream_worker.py)
+STREAM_ENGINE = os.getenv('STREAM_ENGINE', 'thread')
+# Seconds a stream keeps running after its last viewer disconnects; 0 stops it at once
+STREAM_LINGER = float(os.getenv('STREAM_LINGER', DEFAULT_LINGER))
+
+# Authenticated clients; session tokens let a reconnecting client skip the
+# password and resume its stream
+auth = ClientAuth(REMOTE_PASSWORD, SessionStore(SESSION_SECRET))
+CLIENTS_AUTHENTICATED.set_function(lambda: len(auth))
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__name__)
 
 
-class ScreenStreamer:
-    """Captures screen and streams as MJPEG over WebSocket."""
-
-    def __init__(self, ws, width=1280, height=720, fps=30, quality=60):
-        self.ws = ws
-        self.width = width
-        self.height = height
-        self.fps = fps
-        self.quality = quality
-        self.running = False
-        self.sct = mss.mss()
-        self.monitor = self.sct.monitors[1]  # Primary monitor
-        self.frame_count = 0
-        self.start_time = None
-
-    async def start(self):
-        """Start streaming."""
-        self.running = True
-        self.start_time = time.time()
-        frame_interval = 1.0 / self.fps
-
-        logger.info(f"📺 Starting stream: {self.width}x{self.height} @ {self.fps}fps")
-
-        try:
-            while self.running:
-                frame_start = time.time()
-
-                # Capture screen
-                screenshot = self.sct.grab(self.monitor)
-
-                # Convert to PIL Image
-                img = Image.frombytes('RGB', screenshot.size, screenshot.bgra, 'raw', 'BGRX')
-
-                # Resize if needed
-                if img.width != self.width or img.height != self.height:
-                    img = img.resize((self.width, self.height), Image.Resampling.LANCZOS)
-
-                # Encode as JPEG
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG', quality=self.quality, optimize=True)
-                frame_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-                # Send frame
-                try:
-                    await self.ws.send_json({
-                        "type": "frame",
-                        "data": frame_data,
-                        "timestamp": time.time(),
-                        "frame": self.frame_count
-                    })
-                except Exception as e:
-                    logger.error(f"Failed to send frame: {e}")
-                    break
-
-                self.frame_count += 1
-
-                # Calculate actual FPS every second
-                if self.frame_count % self.fps == 0:
-                    elapsed = time.time() - self.start_time
-                    actual_fps = self.frame_count / elapsed
-                    logger.info(f"📊 Streaming: {actual_fps:.1f} FPS")
-
-                # Rate limiting
-                elapsed = time.time() - frame_start
-                sleep_time = frame_interval - elapsed
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
-
-        except asyncio.CancelledError:
-            logger.info("🛑 Stream cancelled")
-        except Exception as e:
-            logger.error(f"❌ Stream error: {e}")
-        finally:
-            self.running = False
-            logger.info(f"📺 Stream ended after {self.frame_count} frames")
-
-    def stop(self):
-        """Stop streaming."""
-        self.running = False
-
-
-async def websocket_handler(request):
-    """Handle WebSocket connections for streaming."""
-    ws = web.WebSocketResponse()
-    await ws.prepare(request)
-
-    client_id = id(ws)
-    streamer = None
-    logger.info(f'🔌 New screen client: {request.remote}')
-
-    try:
-        async for msg in ws:
-            if msg.type == web.WSMsgType.TEXT:
-                try:
-                    data = json.loads(msg.data)
-                    command = data.get('command')
-
-                    # Authentication
-                    if command == 'auth':
-                        password = data.get('password', '')
-                        if password == REMOTE_PASSWORD:
-                            authenticated_clients.add(client_id)
-                            await ws.send_json({"type": "authSuccess"})
-                            logger.info(f'✅ Screen client authenticated: {request.remote}')
-                        else:
-                            await ws.send_json({"type": "authFailed"})
-                            logger.warning(f'❌ Auth failed: {request.remote}')
-                        continue
-
-                    # Check auth
-                    if client_id not in authenticated_clients:
-                        await ws.send_json({"type": "authRequired"})
-                        continue
-
-                    # Start streaming
-                    if command == 'startStream':
-                        if streamer and streamer.running:
-                            streamer.stop()
-
-                        width = min(data.get('width', MAX_WIDTH), MAX_WIDTH)
-                        height = min(data.get('height', MAX_HEIGHT), MAX_HEIGHT)
-                        fps = min(data.get('fps', TARGET_FPS), 60)
-                        quality = data.get('quality', QUALITY)
-
-                        streamer = ScreenStreamer(ws, width, height, fps, quality)
-                        streaming_tasks[client_id] = asyncio.create_task(streamer.start())
-
-                        await ws.send_json({
-                            "type": "streamStarted",
-                            "width": width,
-                            "height": height,
-                            "fps": fps
-                        })
-
-                    # Stop streaming
-                    elif command == 'stopStream':
-                        if streamer:
-                            streamer.stop()
-                        if client_id in streaming_tasks:
-                            streaming_tasks[client_id].cancel()
-                            del streaming_tasks[client_id]
-                        await ws.send_json({"type": "streamStopped"})
-
-                    # Update settings
-                    elif command == 'setQuality':
-                        if streamer:
-                            streamer.quality = data.get('quality', QUALITY)
-
-                    elif command == 'setFps':
-                        if streamer:
-                            streamer.fps = min(data.get('fps', TARGET_FPS), 60)
-
-                except json.JSONDecodeError:
-                    await ws.send_json({"type": "error", "message": "Invalid JSON"})
-
-            elif msg.type == web.WSMsgType.ERROR:
-                logger.error(f'❌ WebSocket error: {ws.exception()}')
-
-    except Exception as e:
-        logger.error(f'❌ Connection error: {e}')
-    finally:
-        # Cleanup
-        if streamer:
-            streamer.stop()
-        if client_id in streaming_tasks:
-            streaming_tasks[client_id].cancel()
-            del streaming_tasks[client_id]
-        authenticated_clients.discard(client_id)
-        logger.info(f'❌ Screen client disconnected: {request.remote}')
-
-    return ws
+# One capture/encode loop per (target, size, quality), shared by all viewers; it
+# runs on a thread, or in a worker process with the process engine (stream_worker.py)
+screen_hub = StreamHub(resample=Image.Resampling.LANCZOS, optimize=True,
+                       source=CAPTURE_SOURCE, streamer_class=streamer_class(STREAM_ENGINE),
+                       linger=STREAM_LINGER)
+# The same endpoint as server.py's /screen, with base64 JSON frames for the test page
+screen_socket = ScreenSocket(screen_hub, auth, use_binary=False)
 
 
 async def handle_index(request):
@@ -216,49 +60,189 @@ async def handle_index(request):
         <title>Screen Stream Test</title>
         <style>
             body { margin: 0; background: #111; display: flex; flex-direction: column; align-items: center; justify-content: center; min-height: 100vh; font-family: sans-serif; }
-            #screen { max-width: 100%; max-height: 80vh; border: 2px solid #333; }
+            #view { position: relative; border: 2px solid #333; line-height: 0; }
+            #screen { display: block; max-width: 100%; max-height: 80vh; }
+            #pointer { position: absolute; left: 0; top: 0; width: 100%; height: 100%; pointer-events: none; }
             .stats { color: #0f0; margin: 10px; font-family: monospace; }
             button { margin: 5px; padding: 10px 20px; font-size: 16px; cursor: pointer; }
+            label { color: #ccc; margin: 5px; }
         </style>
     </head>
     <body>
-        <img id="screen" alt="Screen stream will appear here">
+        <div id="view">
+            <canvas id="screen"></canvas>
+            <canvas id="pointer"></canvas>
+        </div>
         <div class="stats" id="stats">Disconnected</div>
         <div>
             <button onclick="startStream()">Start Stream</button>
             <button onclick="stopStream()">Stop Stream</button>
+            <label><input type="checkbox" id="delta"> Delta tiles</label>
+            <label><input type="checkbox" id="cursorChannel"> Cursor channel</label>
         </div>
         <script>
             let ws;
             let frameCount = 0;
             let startTime;
+            // Reconnects present the session token instead of asking again
+            let session = sessionStorage.getItem('session');
+            let mime = 'image/jpeg';
+            let synced = false;               // delta: a keyframe has been drawn
+            let drawing = Promise.resolve();  // frames are drawn in arrival order
+            let pointer = null;               // cursor channel: last position and shape
+            let pointerShape = null;
+
+            function authenticate() {
+                if (session) {
+                    ws.send(JSON.stringify({ command: 'auth', session }));
+                } else {
+                    ws.send(JSON.stringify({ command: 'auth', password: prompt('Password:') }));
+                }
+            }
+
+            function base64Bytes(text) {
+                const raw = atob(text);
+                const bytes = new Uint8Array(raw.length);
+                for (let i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+                return bytes;
+            }
+
+            // A delta message (delta.py): '<2sBBHHH' header, then '<HHHHI' and the image of each tile
+            function parseTiles(bytes) {
+                const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+                if (bytes.length < 10 || bytes[0] !== 0x44 || bytes[1] !== 0x54) throw new Error('Not a delta message');
+                const frame = { keyframe: (bytes[2] & 1) === 1, width: view.getUint16(4, true),
+                                height: view.getUint16(6, true), tiles: [] };
+                let offset = 10;
+                for (let count = view.getUint16(8, true); count > 0; count--) {
+                    if (offset + 12 > bytes.length) throw new Error('Truncated delta message');
+                    const length = view.getUint32(offset + 8, true);
+                    const start = offset + 12;
+                    if (start + length > bytes.length) throw new Error('Truncated delta message');
+                    frame.tiles.push({ x: view.getUint16(offset, true), y: view.getUint16(offset + 2, true),
+                                       w: view.getUint16(offset + 4, true), h: view.getUint16(offset + 6, true),
+                                       data: bytes.subarray(start, start + length) });
+                    offset = start + length;
+                }
+                return frame;
+            }
+
+            function resize(canvas, width, height) {
+                if (canvas.width !== width || canvas.height !== height) {
+                    canvas.width = width;
+                    canvas.height = height;
+                }
+            }
+
+            async function drawFrame(canvas, bytes) {
+                const image = await createImageBitmap(new Blob([bytes], { type: mime }));
+                resize(canvas, image.width, image.height);
+                canvas.getContext('2d').drawImage(image, 0, 0);
+                image.close();
+                return true;
+            }
+
+            // Tiles go on top of the last picture, in order; a keyframe covers it all
+            async function drawTiles(canvas, bytes) {
+                const frame = parseTiles(bytes);
+                if (!frame.keyframe && !synced) return false;
+                const images = await Promise.all(frame.tiles.map(
+                    tile => createImageBitmap(new Blob([tile.data], { type: mime }))));
+                if (frame.keyframe) {
+                    resize(canvas, frame.width, frame.height);
+                    synced = true;
+                }
+                const context = canvas.getContext('2d');
+                frame.tiles.forEach((tile, i) => {
+                    context.drawImage(images[i], tile.x, tile.y, tile.w, tile.h);
+                    images[i].close();
+                });
+                return true;
+            }
+
+            // The pointer canvas has the frame's size and is stretched like it,
+            // so cursor messages, in frame pixels, can be drawn as they are
+            function drawPointer() {
+                const screen = document.getElementById('screen');
+                const canvas = document.getElementById('pointer');
+                resize(canvas, screen.width, screen.height);
+                const context = canvas.getContext('2d');
+                context.clearRect(0, 0, canvas.width, canvas.height);
+                if (!pointer || !pointer.visible) return;
+                const scale = pointer.scale;
+                if (pointerShape && pointerShape.image.complete) {
+                    context.drawImage(pointerShape.image, pointer.x - pointerShape.hotX * scale,
+                                      pointer.y - pointerShape.hotY * scale,
+                                      pointerShape.width * scale, pointerShape.height * scale);
+                } else {
+                    // No shape from this platform: a dot
+                    context.beginPath();
+                    context.arc(pointer.x, pointer.y, Math.max(3, 6 * scale), 0, 2 * Math.PI);
+                    context.fillStyle = 'white';
+                    context.fill();
+                    context.strokeStyle = 'black';
+                    context.stroke();
+                }
+            }
 
             function connect() {
-                const password = prompt('Password:');
                 ws = new WebSocket('ws://' + location.host + '/ws');
 
-                ws.onopen = () => {
-                    ws.send(JSON.stringify({ command: 'auth', password }));
-                };
+                ws.onopen = authenticate;
 
                 ws.onmessage = (event) => {
                     const data = JSON.parse(event.data);
 
                     if (data.type === 'authSuccess') {
-                        document.getElementById('stats').textContent = 'Authenticated - Click Start Stream';
+                        session = data.session;
+                        sessionStorage.setItem('session', session);
+                        if (!data.resumed) {
+                            document.getElementById('stats').textContent = 'Authenticated - Click Start Stream';
+                        }
+                    } else if (data.type === 'authFailed' && data.reason === 'session') {
+                        session = null;
+                        sessionStorage.removeItem('session');
+                        authenticate();
                     } else if (data.type === 'authFailed') {
                         alert('Authentication failed');
-                    } else if (data.type === 'frame') {
-                        document.getElementById('screen').src = 'data:image/jpeg;base64,' + data.data;
+                    } else if (data.type === 'frame' || data.type === 'delta') {
+                        const screen = document.getElementById('screen');
+                        const bytes = base64Bytes(data.data);
+                        const draw = data.type === 'delta' ? drawTiles : drawFrame;
+                        drawing = drawing.then(() => draw(screen, bytes)).then((drawn) => {
+                            // Ack once shown, so the server can measure the latency
+                            if (drawn) ws.send(JSON.stringify({ command: 'frameAck', frame: data.frame }));
+                            // Keep the pointer canvas the frame's size
+                            if (drawn && pointer) drawPointer();
+                        }).catch((error) => {
+                            console.warn('Undrawable frame:', error);
+                            if (data.type === 'delta') {
+                                // Lost track of the picture: start again from a keyframe
+                                synced = false;
+                                ws.send(JSON.stringify({ command: 'resync' }));
+                            }
+                        });
                         frameCount++;
                         if (!startTime) startTime = Date.now();
                         const elapsed = (Date.now() - startTime) / 1000;
                         const fps = frameCount / elapsed;
                         document.getElementById('stats').textContent = `FPS: ${fps.toFixed(1)} | Frames: ${frameCount}`;
+                    } else if (data.type === 'cursor') {
+                        pointer = data;
+                        drawPointer();
+                    } else if (data.type === 'cursorShape') {
+                        const image = new Image();
+                        image.onload = drawPointer;
+                        image.src = 'data:image/png;base64,' + data.data;
+                        pointerShape = { image, width: data.width, height: data.height, hotX: data.hotX, hotY: data.hotY };
                     } else if (data.type === 'streamStarted') {
+                        pointer = null;
+                        drawPointer();
                         frameCount = 0;
                         startTime = null;
-                        document.getElementById('stats').textContent = 'Stream started...';
+                        mime = data.mime;
+                        synced = false;
+                        document.getElementById('stats').textContent = `Stream started (${data.mode})...`;
                     }
                 };
 
@@ -270,7 +254,10 @@ async def handle_index(request):
 
             function startStream() {
                 if (ws && ws.readyState === WebSocket.OPEN) {
-                    ws.send(JSON.stringify({ command: 'startStream', width: 1280, height: 720, fps: 30, quality: 60 }));
+                    const mode = document.getElementById('delta').checked ? 'delta' : 'jpeg';
+                    // The pointer apart from the frames, drawn on top by drawPointer()
+                    const cursor = document.getElementById('cursorChannel').checked ? 'channel' : undefined;
+                    ws.send(JSON.stringify({ command: 'startStream', width: 1280, height: 720, fps: 30, quality: 60, mode, cursor }));
                 }
             }
 
@@ -292,17 +279,17 @@ async def handle_health(request):
     """Health check endpoint."""
     return web.json_response({
         "status": "ok",
-        "clients": len(authenticated_clients),
-        "streams": len(streaming_tasks),
+        "clients": len(auth),
+        "streams": len(screen_hub.streamers),
+        "viewers": screen_hub.viewer_count,
+        "stream_stats": screen_hub.stats(),
         "target_fps": TARGET_FPS
     })
 
 
 async def on_shutdown(app):
     """Cleanup on shutdown."""
-    for task in streaming_tasks.values():
-        task.cancel()
-    streaming_tasks.clear()
+    screen_hub.stop_all()
     logger.info("🧹 All streams stopped")
 
 
@@ -326,13 +313,18 @@ async def main():
 
     # Routes
     app.router.add_get('/', handle_index)
-    app.router.add_get('/ws', websocket_handler)
+    app.router.add_get('/ws', screen_socket.handle)
     app.router.add_get('/health', handle_health)
+    app.router.add_get('/metrics', auth.require(handle_metrics))  # Prometheus scrape endpoint
+
+    # Pick the fastest frame encoder on this machine
+    screen_hub.default_encoder = pick_fastest_encoder(QUALITY)
 
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', PORT)
     await site.start()
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
 
     print(f"""
 ╔════════════════════════════════════════════════════════════╗
@@ -342,6 +334,7 @@ async def main():
 🔐 Password: {REMOTE_PASSWORD}
 📺 Test page: http://localhost:{PORT}
 🔌 WebSocket: ws://localhost:{PORT}/ws
+📈 Metrics: http://localhost:{PORT}/metrics (Authorization: Bearer <password>)
 
 📊 Settings: {MAX_WIDTH}x{MAX_HEIGHT} @ {TARGET_FPS}fps (JPEG quality: {QUALITY})
 
@@ -359,6 +352,7 @@ Press Ctrl+C to stop
     except KeyboardInterrupt:
         print("\n\n✋ Screen server stopped")
     finally:
+        lag_monitor.cancel()
         await runner.cleanup()
 
 
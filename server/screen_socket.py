@@ -0,0 +1,278 @@
+"""
+The screen streaming WebSocket endpoint, shared by both servers.
+
+server.py serves it at /screen with binary frames; screen_server.py serves
+it at /ws with base64 JSON frames for its test page (use_binary=False).
+Everything else (auth, stream settings, targets, session resume) is the
+same on both:
+
+    auth             password, or a session token (sessions.py)
+    startStream      width, height, fps (1-60), quality (1-100), mode, encoder, cursor,
+                     adaptive, minQuality, minFps, frameHeader, and a
+                     target (capture.py)
+    stopStream
+    setQuality       quality
+    setFps           fps
+    setRegion        another monitor, region or window
+    frameAck         frame; measures capture-to-display latency
+    getStreamStatus
+    resync           delta mode: send a full keyframe
+"""
+import asyncio
+import json
+import logging
+from aiohttp import web
+from streaming import StreamViewer, STREAM_MODES, CURSOR_MODES
+from capture import CaptureTarget, resolve_target
+from adaptive import AdaptiveController, MIN_QUALITY, MIN_FPS
+from encoders import available_encoders
+from metrics import CLIENTS_CONNECTED
+
+TARGET_FPS = 30
+MAX_FPS = 60
+QUALITY = 60  # JPEG quality (1-100)
+MAX_WIDTH = 1280
+MAX_HEIGHT = 720
+# Regions and windows are sent at native size, up to this
+REGION_MAX_WIDTH = 1920
+REGION_MAX_HEIGHT = 1080
+
+logger = logging.getLogger(__name__)
+
+
+def stream_size(data: dict, target: CaptureTarget) -> tuple:
+    """Requested stream size, capped; regions default to their native size."""
+    if target.full:
+        max_width, max_height = MAX_WIDTH, MAX_HEIGHT
+    else:
+        max_width, max_height = REGION_MAX_WIDTH, REGION_MAX_HEIGHT
+    return min(data.get('width', max_width), max_width), min(data.get('height', max_height), max_height)
+
+
+def parse_fps(value, default: int) -> int:
+    """An fps or minFps setting as an int in 1..MAX_FPS; ValueError if not a number."""
+    if value is None:
+        return default
+    try:
+        fps = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid fps: {value!r}") from None
+    return max(1, min(fps, MAX_FPS))
+
+
+def parse_quality(value, default: int) -> int:
+    """A quality or minQuality setting as an int in 1..100; ValueError if not a number."""
+    if value is None:
+        return default
+    try:
+        quality = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid quality: {value!r}") from None
+    return max(1, min(quality, 100))
+
+
+def parse_frame(value) -> int | None:
+    """A frameAck's frame number, None when it has none; ValueError if not a number."""
+    if value is None:
+        return None
+    try:
+        frame = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid frame: {value!r}") from None
+    if frame < 0:
+        raise ValueError(f"Invalid frame: {value!r}")
+    return frame
+
+
+async def check_target(source: str, target: CaptureTarget) -> tuple:
+    """The rectangle target captures (left, top, width, height); fails early, with
+    a message for the client, when the source can't capture it."""
+    return await asyncio.to_thread(resolve_target, source, target)
+
+
+class ScreenSocket:
+    """aiohttp handler for screen clients of one StreamHub."""
+
+    def __init__(self, hub, auth, use_binary=True):
+        self.hub = hub
+        self.auth = auth  # sessions.ClientAuth
+        self.use_binary = use_binary  # False: base64 frames in JSON messages
+
+    async def handle(self, request):
+        """Handle WebSocket connections for screen streaming."""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        viewer = None
+        session = None
+        logger.info(f'🖥️ New screen client: {request.remote}')
+        CLIENTS_CONNECTED.inc(endpoint='screen')
+
+        async def start_stream(data: dict, target: CaptureTarget, rect: tuple):
+            """Subscribe with a startStream message's settings and confirm them."""
+            nonlocal viewer
+            fps = parse_fps(data.get('fps'), TARGET_FPS)
+            min_fps = parse_fps(data.get('minFps'), MIN_FPS)
+            quality = parse_quality(data.get('quality'), QUALITY)
+            min_quality = parse_quality(data.get('minQuality'), MIN_QUALITY)
+            width, height = stream_size(data, target)
+            mode = data.get('mode', 'jpeg')
+            if mode not in STREAM_MODES:
+                mode = 'jpeg'
+            encoder = data.get('encoder')
+            if encoder not in available_encoders():
+                encoder = None  # server default
+            # 'channel' sends the pointer apart from the frames
+            cursor = data.get('cursor')
+            if cursor not in CURSOR_MODES:
+                cursor = None  # server default
+
+            if viewer is None:
+                viewer = StreamViewer(ws, self.hub, transport=request.transport, use_binary=self.use_binary)
+            # Prefix binary frames with their number and capture time
+            viewer.frame_header = self.use_binary and bool(data.get('frameHeader', False))
+            adaptive = None
+            if data.get('adaptive', True):
+                adaptive = AdaptiveController(
+                    width, height, quality, fps,
+                    min_quality=min_quality,
+                    min_fps=min_fps)
+            viewer.configure(width, height, quality, fps, mode, adaptive, encoder, target,
+                             cursor)
+            session.remember(data, target)
+
+            # Regions and windows are sent at their own size, within width x height
+            width, height = viewer.streamer.output_size(rect[2], rect[3])
+            await ws.send_json({
+                "type": "streamStarted",
+                "width": width,
+                "height": height,
+                "fps": fps,
+                "mode": mode,
+                "target": target.describe(),
+                "cursor": viewer.status()["cursor"],
+                "frameHeader": viewer.frame_header,
+                "encoder": viewer.streamer.encoder.name,
+                "mime": viewer.streamer.encoder.mime,
+                "adaptive": adaptive.describe() if adaptive else None
+            })
+
+        try:
+            async for msg in ws:
+                if msg.type == web.WSMsgType.TEXT:
+                    try:
+                        data = json.loads(msg.data)
+                        command = data.get('command')
+
+                        # Authentication: the password, or a session token
+                        if command == 'auth':
+                            resumed = await self.auth.authenticate(ws, data)
+                            if resumed is None:
+                                logger.warning(f'❌ Screen auth failed: {request.remote}')
+                                continue
+                            session = resumed
+                            logger.info(f'✅ Screen client authenticated: {request.remote}')
+                            # A resumed session restarts its stream without waiting for startStream
+                            if 'session' in data and session.stream is not None:
+                                try:
+                                    rect = await check_target(self.hub.source, session.target)
+                                    await start_stream(session.stream, session.target, rect)
+                                    logger.info(f'⏯️ Resumed stream for {request.remote}')
+                                except (ValueError, LookupError) as e:
+                                    session.forget()
+                                    await ws.send_json({"type": "error", "message": str(e)})
+                            continue
+
+                        # Check auth
+                        if ws not in self.auth:
+                            await ws.send_json({"type": "authRequired"})
+                            continue
+
+                        # Start streaming
+                        if command == 'startStream':
+                            try:
+                                target = CaptureTarget.from_message(data)
+                                await start_stream(data, target, await check_target(self.hub.source, target))
+                            except (ValueError, LookupError) as e:
+                                await ws.send_json({"type": "error", "message": str(e)})
+
+                        # Stop streaming
+                        elif command == 'stopStream':
+                            if viewer:
+                                self.hub.unsubscribe(viewer)
+                            session.forget()
+                            await ws.send_json({"type": "streamStopped"})
+
+                        # Update settings
+                        elif command == 'setQuality':
+                            if viewer:
+                                try:
+                                    quality = parse_quality(data.get('quality'), QUALITY)
+                                except ValueError as e:
+                                    await ws.send_json({"type": "error", "message": str(e)})
+                                    continue
+                                viewer.update(quality=quality)
+                                session.update(quality=quality)
+
+                        elif command == 'setFps':
+                            if viewer:
+                                try:
+                                    fps = parse_fps(data.get('fps'), TARGET_FPS)
+                                except ValueError as e:
+                                    await ws.send_json({"type": "error", "message": str(e)})
+                                    continue
+                                viewer.update(fps=fps)
+                                session.update(fps=fps)
+
+                        # Capture another monitor, region or window, or zoom in
+                        elif command == 'setRegion':
+                            if viewer:
+                                try:
+                                    target = CaptureTarget.from_message(data, viewer.target)
+                                    rect = await check_target(self.hub.source, target)
+                                except (ValueError, LookupError) as e:
+                                    await ws.send_json({"type": "error", "message": str(e)})
+                                    continue
+                                width, height = stream_size(data, target)
+                                viewer.set_target(target, width, height)
+                                session.update(target, width=width, height=height)
+                                status = viewer.status()
+                                status["width"], status["height"] = viewer.streamer.output_size(rect[2], rect[3])
+                                await ws.send_json(status)
+
+                        # Optional client acknowledgement: measures capture-to-display
+                        # latency and feeds the adaptive controller
+                        elif command == 'frameAck':
+                            if viewer:
+                                try:
+                                    viewer.ack(parse_frame(data.get('frame')))
+                                except ValueError as e:
+                                    await ws.send_json({"type": "error", "message": str(e)})
+
+                        # This viewer's settings, counters and ack latency
+                        elif command == 'getStreamStatus':
+                            if viewer:
+                                await ws.send_json(viewer.status())
+
+                        # Delta mode: client lost track, send a full keyframe
+                        elif command == 'resync':
+                            if viewer:
+                                viewer.resync()
+
+                    except json.JSONDecodeError:
+                        await ws.send_json({"type": "error", "message": "Invalid JSON"})
+
+                elif msg.type == web.WSMsgType.ERROR:
+                    logger.error(f'❌ Screen WebSocket error: {ws.exception()}')
+
+        except Exception as e:
+            logger.error(f'❌ Screen connection error: {e}')
+        finally:
+            # Cleanup; the stream lingers a moment for a quick reconnect
+            if viewer:
+                self.hub.unsubscribe(viewer, linger=True)
+            self.auth.discard(ws)
+            CLIENTS_CONNECTED.dec(endpoint='screen')
+            logger.info(f'❌ Screen client disconnected: {request.remote}')
+
+        return ws
@@ -8,35 +8,69 @@ import socket
 import json
 import subprocess
 import os
-import io
 import time
-import base64
 import aiohttp
 from pathlib import Path
 from aiohttp import web
 import logging
-import pyautogui
 import segno
 from PIL import Image
-import mss
 from dotenv import load_dotenv
+from streaming import StreamHub, DEFAULT_LINGER
+from stream_worker import streamer_class
+from screen_socket import ScreenSocket, QUALITY
+from encoders import pick_fastest_encoder
+from input_backends import create_backend, InputError
+from dispatch import CommandDispatcher
+from pointer import PointerMover, DEFAULT_RATE
+from volume import VolumeService
+from devtools import DevToolsChannel, BrowserError
+import control_protocol
+from static_assets import StaticAssets
+from sessions import SessionStore, ClientAuth
+from metrics import (CLIENTS_CONNECTED, CLIENTS_AUTHENTICATED, COMMAND_SECONDS,
+                     handle_metrics, monitor_event_loop_lag)
 
 # Load environment variables
 load_dotenv()
 
 PORT = 8080
 REMOTE_PASSWORD = os.getenv('REMOTE_PASSWORD', 'changeme')
+# Signs session tokens (sessions.py); random per run when unset, so a
+# restart asks every client for the password again
+SESSION_SECRET = os.getenv('SESSION_SECRET')
 NGROK_URL = None  # Will be set when ngrok is detected
 
-# Screen streaming settings
-TARGET_FPS = 30
-QUALITY = 60
-MAX_WIDTH = 1280
-MAX_HEIGHT = 720
-
-# Track authenticated sessions and streaming tasks
-authenticated_clients = set()
-streaming_tasks = {}
+# Screen streaming settings (sizes and defaults: screen_socket.py)
+# Capture source: mss (the screen), synthetic[:pattern[:WxH]] or replay:<file>
+CAPTURE_SOURCE = os.getenv('CAPTURE_SOURCE', 'mss')
+# Where frames are captured and encoded: thread (in this process) or process
+# (a worker process per stream, slow to start; see stream_worker.py)
+STREAM_ENGINE = os.getenv('STREAM_ENGINE', 'thread')
+# Seconds a stream keeps running after its last viewer disconnects; 0 stops it at once
+STREAM_LINGER = float(os.getenv('STREAM_LINGER', DEFAULT_LINGER))
+# Input injection: auto, macos, xtest, fake, fake-worker or osascript
+INPUT_BACKEND = os.getenv('INPUT_BACKEND', 'auto')
+# moveMouse events are merged and applied this many times per second
+POINTER_RATE = int(os.getenv('POINTER_RATE', DEFAULT_RATE))
+# Chrome DevTools endpoint (--remote-debugging-port) for episode navigation;
+# empty to always use the console keystroke injection
+CDP_URL = os.getenv('CDP_URL', 'http://127.0.0.1:9222')
+CDP_TAB = os.getenv('CDP_TAB', '')  # only tabs whose URL contains this
+
+# Web app build and video page, indexed once and cached (static_assets.py)
+DIST_DIR = Path('../dist') if Path('../dist').exists() else Path('dist')
+dist_assets = StaticAssets(DIST_DIR)
+public_assets = StaticAssets(Path('../public'))
+
+# Authenticated connections of /ws and /screen; session tokens let a
+# reconnecting client skip the password and resume its stream
+auth = ClientAuth(REMOTE_PASSWORD, SessionStore(SESSION_SECRET))
+CLIENTS_AUTHENTICATED.set_function(lambda: len(auth))
+
+# Commands handled by execute_command (metric labels; anything else is 'other')
+CONTROL_COMMANDS = ('togglePlayPause', 'skipForward', 'skipBackward', 'fullscreen', 'nextEpisode',
+                    'prevEpisode', 'mouseLeftClick', 'mouseRightClick', 'resetMouse')
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__name__)
@@ -44,183 +78,23 @@ logger = logging.getLogger(__name__)
 
 # ============== Screen Streaming ==============
 
-class ScreenStreamer:
-    """Captures screen and streams as MJPEG over WebSocket."""
-
-    def __init__(self, ws, width=1280, height=720, fps=30, quality=60):
-        self.ws = ws
-        self.width = width
-        self.height = height
-        self.fps = fps
-        self.quality = quality
-        self.running = False
-        # with_cursor=True captures the mouse pointer (MSS 8.0+)
-        self.sct = mss.mss(with_cursor=True)
-        self.monitor = self.sct.monitors[1]  # Primary monitor
-        self.frame_count = 0
-        self.start_time = None
-        self.use_binary = True  # Binary frames are faster than base64
-
-    async def start(self):
-        """Start streaming."""
-        self.running = True
-        self.start_time = time.time()
-        frame_interval = 1.0 / self.fps
-
-        logger.info(f"📺 Starting stream: {self.width}x{self.height} @ {self.fps}fps (cursor visible)")
-
-        try:
-            while self.running:
-                frame_start = time.time()
-
-                # Capture screen (with cursor)
-                screenshot = self.sct.grab(self.monitor)
-
-                # Convert to PIL Image
-                img = Image.frombytes('RGB', screenshot.size, screenshot.bgra, 'raw', 'BGRX')
-
-                # Resize if needed - use BILINEAR for speed (LANCZOS is slow)
-                if img.width != self.width or img.height != self.height:
-                    img = img.resize((self.width, self.height), Image.Resampling.BILINEAR)
-
-                # Encode as JPEG (no optimize=True for speed)
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG', quality=self.quality)
-                frame_bytes = buffer.getvalue()
-
-                # Send frame as binary (faster than base64 JSON)
-                try:
-                    if self.use_binary:
-                        await self.ws.send_bytes(frame_bytes)
-                    else:
-                        frame_data = base64.b64encode(frame_bytes).decode('utf-8')
-                        await self.ws.send_json({
-                            "type": "frame",
-                            "data": frame_data,
-                            "timestamp": time.time(),
-                            "frame": self.frame_count
-                        })
-                except Exception as e:
-                    logger.error(f"Failed to send frame: {e}")
-                    break
-
-                self.frame_count += 1
-
-                # Calculate actual FPS every second
-                if self.frame_count % self.fps == 0:
-                    elapsed = time.time() - self.start_time
-                    actual_fps = self.frame_count / elapsed
-                    logger.info(f"📊 Streaming: {actual_fps:.1f} FPS")
-
-                # Rate limiting
-                elapsed = time.time() - frame_start
-                sleep_time = frame_interval - elapsed
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
-
-        except asyncio.CancelledError:
-            logger.info("🛑 Stream cancelled")
-        except Exception as e:
-            logger.error(f"❌ Stream error: {e}")
-        finally:
-            self.running = False
-            logger.info(f"📺 Stream ended after {self.frame_count} frames")
-
-    def stop(self):
-        """Stop streaming."""
-        self.running = False
-
-
-async def screen_websocket_handler(request):
-    """Handle WebSocket connections for screen streaming."""
-    ws = web.WebSocketResponse()
-    await ws.prepare(request)
-
-    client_id = id(ws)
-    streamer = None
-    logger.info(f'🖥️ New screen client: {request.remote}')
-
-    try:
-        async for msg in ws:
-            if msg.type == web.WSMsgType.TEXT:
-                try:
-                    data = json.loads(msg.data)
-                    command = data.get('command')
-
-                    # Authentication
-                    if command == 'auth':
-                        password = data.get('password', '')
-                        if password == REMOTE_PASSWORD:
-                            authenticated_clients.add(client_id)
-                            await ws.send_json({"type": "authSuccess"})
-                            logger.info(f'✅ Screen client authenticated: {request.remote}')
-                        else:
-                            await ws.send_json({"type": "authFailed"})
-                            logger.warning(f'❌ Screen auth failed: {request.remote}')
-                        continue
-
-                    # Check auth
-                    if client_id not in authenticated_clients:
-                        await ws.send_json({"type": "authRequired"})
-                        continue
-
-                    # Start streaming
-                    if command == 'startStream':
-                        if streamer and streamer.running:
-                            streamer.stop()
-
-                        width = min(data.get('width', MAX_WIDTH), MAX_WIDTH)
-                        height = min(data.get('height', MAX_HEIGHT), MAX_HEIGHT)
-                        fps = min(data.get('fps', TARGET_FPS), 60)
-                        quality = data.get('quality', QUALITY)
-
-                        streamer = ScreenStreamer(ws, width, height, fps, quality)
-                        streaming_tasks[client_id] = asyncio.create_task(streamer.start())
-
-                        await ws.send_json({
-                            "type": "streamStarted",
-                            "width": width,
-                            "height": height,
-                            "fps": fps
-                        })
-
-                    # Stop streaming
-                    elif command == 'stopStream':
-                        if streamer:
-                            streamer.stop()
-                        if client_id in streaming_tasks:
-                            streaming_tasks[client_id].cancel()
-                            del streaming_tasks[client_id]
-                        await ws.send_json({"type": "streamStopped"})
-
-                    # Update settings
-                    elif command == 'setQuality':
-                        if streamer:
-                            streamer.quality = data.get('quality', QUALITY)
-
-                    elif command == 'setFps':
-                        if streamer:
-                            streamer.fps = min(data.get('fps', TARGET_FPS), 60)
-
-                except json.JSONDecodeError:
-                    await ws.send_json({"type": "error", "message": "Invalid JSON"})
+# One capture/encode loop per (target, size, quality), shared by all viewers; it
+# runs on a thread, or in a worker process with the process engine (stream_worker.py)
+screen_hub = StreamHub(resample=Image.Resampling.BILINEAR, with_cursor=True,
+                       source=CAPTURE_SOURCE, streamer_class=streamer_class(STREAM_ENGINE),
+                       linger=STREAM_LINGER)
+# The /screen endpoint, shared with screen_server.py (screen_socket.py)
+screen_socket = ScreenSocket(screen_hub, auth)
 
-            elif msg.type == web.WSMsgType.ERROR:
-                logger.error(f'❌ Screen WebSocket error: {ws.exception()}')
 
-    except Exception as e:
-        logger.error(f'❌ Screen connection error: {e}')
-    finally:
-        # Cleanup
-        if streamer:
-            streamer.stop()
-        if client_id in streaming_tasks:
-            streaming_tasks[client_id].cancel()
-            del streaming_tasks[client_id]
-        authenticated_clients.discard(client_id)
-        logger.info(f'❌ Screen client disconnected: {request.remote}')
+# ============== Input ==============
 
-    return ws
+# Keys, mouse and volume go through a persistent backend (input_backends.py)
+input_backend = create_backend(INPUT_BACKEND)
+# moveMouse from every client is summed and applied at POINTER_RATE (pointer.py)
+pointer = PointerMover(input_backend.move_mouse, POINTER_RATE)
+# Episode scripts run over a persistent DevTools connection (devtools.py)
+browser = DevToolsChannel(CDP_URL, CDP_TAB) if CDP_URL else None
 
 
 # ============== Original Functions ==============
@@ -231,74 +105,25 @@ def print_qr_code(url: str):
     qr.terminal(compact=True)
 
 
-def get_current_volume() -> int:
-    """Get current macOS volume (0-100)"""
-    try:
-        script = 'output volume of (get volume settings)'
-        result = subprocess.run(['osascript', '-e', script], check=True, capture_output=True, text=True)
-        volume = int(result.stdout.strip())
-        return volume
-    except Exception as e:
-        logger.error(f'❌ Failed to get volume: {e}')
-        return 50
-
-
 def execute_command(cmd: dict):
     """Execute system commands to control Mac"""
     command = cmd.get('command')
-    value = cmd.get('value')
 
     try:
-        if command == 'setVolume':
-            volume = max(0, min(100, value))
-            script = f'set volume output volume {volume}'
-            subprocess.run(['osascript', '-e', script], check=True, capture_output=True)
-            actual_volume = get_current_volume()
-            logger.info(f'🔊 Volume set to {actual_volume}%')
-            return {"status": "ok", "volume": actual_volume}
-
-        elif command == 'togglePlayPause':
-            script = '''
-            tell application "System Events"
-                tell process (first application process whose frontmost is true)
-                    key code 49
-                end tell
-            end tell
-            '''
-            subprocess.run(['osascript', '-e', script], check=True, capture_output=True)
+        if command == 'togglePlayPause':
+            input_backend.key('togglePlayPause')
             logger.info(f'🎬 Play/Pause toggled')
 
         elif command == 'skipForward':
-            script = '''
-            tell application "System Events"
-                tell process (first application process whose frontmost is true)
-                    key code 124 using shift down
-                end tell
-            end tell
-            '''
-            subprocess.run(['osascript', '-e', script], check=True, capture_output=True)
+            input_backend.key('skipForward')
             logger.info(f'⏩ Skip forward')
 
         elif command == 'skipBackward':
-            script = '''
-            tell application "System Events"
-                tell process (first application process whose frontmost is true)
-                    key code 123 using shift down
-                end tell
-            end tell
-            '''
-            subprocess.run(['osascript', '-e', script], check=True, capture_output=True)
+            input_backend.key('skipBackward')
             logger.info(f'⏪ Skip backward')
 
         elif command == 'fullscreen':
-            script = '''
-            tell application "System Events"
-                tell process (first application process whose frontmost is true)
-                    key code 3
-                end tell
-            end tell
-            '''
-            subprocess.run(['osascript', '-e', script], check=True, capture_output=True)
+            input_backend.key('fullscreen')
             logger.info(f'🖥️ Fullscreen toggled')
 
         elif command == 'nextEpisode':
@@ -309,11 +134,6 @@ def execute_command(cmd: dict):
             execute_episode_script('prev')
             logger.info(f'⬅️ Previous episode triggered')
 
-        elif command == 'moveMouse':
-            dx = int(cmd.get('dx', 0))
-            dy = int(cmd.get('dy', 0))
-            move_mouse(dx, dy)
-
         elif command == 'mouseLeftClick':
             mouse_left_click()
 
@@ -325,7 +145,7 @@ def execute_command(cmd: dict):
 
         return {"status": "ok"}
 
-    except subprocess.CalledProcessError as e:
+    except (InputError, subprocess.CalledProcessError) as e:
         logger.error(f'❌ Command failed: {e}')
         return {"status": "error", "message": str(e)}
     except Exception as e:
@@ -333,6 +153,20 @@ def execute_command(cmd: dict):
         return {"status": "error", "message": str(e)}
 
 
+def run_command(cmd: dict):
+    """execute_command, timed per command (runs on a dispatcher thread)"""
+    command = cmd.get('command')
+    label = command if command in CONTROL_COMMANDS else 'other'
+    with COMMAND_SECONDS.time(command=label):
+        return execute_command(cmd)
+
+
+# Commands run on a thread pool, in order per client (dispatch.py)
+command_dispatcher = CommandDispatcher(run_command)
+# Cached volume, coalesced setVolume, volumeUpdate to every client (volume.py)
+volume_service = VolumeService(input_backend, command_dispatcher.call)
+
+
 def execute_episode_script(direction: str):
     """Execute episode navigation script via JavaScript injection"""
     try:
@@ -373,12 +207,23 @@ def execute_episode_script(direction: str):
   if (req) req.call(el);
 })();"""
 
-        inject_javascript(episode_script + "\n" + fullscreen_script)
+        run_javascript(episode_script + "\n" + fullscreen_script)
 
     except Exception as e:
         logger.error(f'❌ Episode script execution failed: {e}')
 
 
+def run_javascript(js_code: str):
+    """Run JavaScript in the player tab: DevTools protocol, else console injection"""
+    if browser is not None:
+        try:
+            browser.evaluate_threadsafe(js_code)
+            return
+        except BrowserError as e:
+            logger.warning(f'⚠️ DevTools protocol unavailable ({e}), injecting via the console')
+    inject_javascript(js_code)
+
+
 def inject_javascript(js_code: str):
     """Inject JavaScript code into the browser using DevTools console"""
     try:
@@ -415,79 +260,33 @@ def inject_javascript(js_code: str):
         logger.error(f'❌ Failed to inject JavaScript: {e}')
 
 
-def move_mouse(dx: int, dy: int):
-    """Move mouse relative to current position"""
-    try:
-        current_x, current_y = pyautogui.position()
-        pyautogui.moveTo(current_x + dx, current_y + dy, duration=0.05)
-    except Exception as e:
-        logger.error(f'❌ Failed to move mouse: {e}')
-
-
 def mouse_left_click():
     try:
-        pyautogui.click()
+        input_backend.click('left')
     except Exception as e:
         logger.error(f'❌ Failed to perform left click: {e}')
 
 
 def mouse_right_click():
     try:
-        pyautogui.rightClick()
+        input_backend.click('right')
     except Exception as e:
         logger.error(f'❌ Failed to perform right click: {e}')
 
 
 async def handle_index(request):
     """Serve index.html for the web app"""
-    dist_path = Path('..') if Path('../dist').exists() else Path('.')
-    index_file = dist_path / 'dist' / 'index.html'
-
-    if index_file.exists():
-        with open(index_file, 'r') as f:
-            return web.Response(text=f.read(), content_type='text/html')
-    return web.Response(text="404 Not Found", status=404)
+    return dist_assets.response(request, 'index.html')
 
 
 async def handle_video(request):
     """Serve the video player page"""
-    video_file = Path('../public/video.html')
-
-    if video_file.exists():
-        with open(video_file, 'r') as f:
-            return web.Response(text=f.read(), content_type='text/html')
-    return web.Response(text="404 Not Found", status=404)
+    return public_assets.response(request, 'video.html')
 
 
 async def handle_static(request):
     """Serve static files from dist"""
-    path = request.match_info['path']
-    dist_path = Path('..') if Path('../dist').exists() else Path('.')
-    file_path = dist_path / 'dist' / path
-
-    if file_path.exists() and file_path.is_file():
-        content_type = get_content_type(str(file_path))
-        with open(file_path, 'rb') as f:
-            return web.Response(body=f.read(), content_type=content_type)
-    return web.Response(text="404 Not Found", status=404)
-
-
-def get_content_type(file_path: str) -> str:
-    """Get content type based on file extension"""
-    extensions = {
-        '.html': 'text/html',
-        '.css': 'text/css',
-        '.js': 'application/javascript',
-        '.json': 'application/json',
-        '.png': 'image/png',
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.svg': 'image/svg+xml',
-    }
-    for ext, mime in extensions.items():
-        if file_path.endswith(ext):
-            return mime
-    return 'application/octet-stream'
+    return dist_assets.response(request, request.match_info['path'])
 
 
 async def websocket_handler(request):
@@ -495,45 +294,109 @@ async def websocket_handler(request):
     ws = web.WebSocketResponse()
     await ws.prepare(request)
 
-    client_id = id(ws)
+    binary_enabled = False
     logger.info(f'🔌 New WebSocket connection: {request.remote}')
 
-    # Request authentication
-    await ws.send_json({"type": "authRequired"})
+    async def respond(cmd, result):
+        # Echo the command's optional id so clients can match replies that
+        # arrive out of order (clicks run on the dispatcher, moves inline)
+        if 'id' in cmd:
+            result = {**result, "id": cmd['id']}
+        await ws.send_json(result)
+
+    def binary_reply(op, seq):
+        """Reply callback for a binary command; None for fire-and-forget opcodes."""
+        if not op.ack:
+            return None
+
+        async def reply(cmd, result):
+            ok = result.get('status') == 'ok'
+            await ws.send_bytes(control_protocol.encode_ack(op, seq, ok, result.get('volume') or 0))
+        return reply
+
+    commands = command_dispatcher.client(respond)
+
+    async def handle_command(data: dict, reply):
+        """Run one authenticated command; reply(cmd, result) unless reply is None."""
+        command = data.get('command')
+
+        # Relative moves are merged into the next pointer tick
+        if command == 'moveMouse':
+            try:
+                pointer.add(int(data.get('dx', 0)), int(data.get('dy', 0)))
+                result = {"status": "ok"}
+            except (TypeError, ValueError, OverflowError):
+                result = {"status": "error", "message": "Invalid move"}
+        # Volume comes from the cache; sets are coalesced
+        elif command == 'setVolume':
+            value = data.get('value')
+            if isinstance(value, (int, float)):
+                result = {"status": "ok", "volume": volume_service.set(value)}
+            else:
+                result = {"status": "error", "message": "Invalid volume"}
+        elif command == 'getVolume':
+            await volume_service.refresh()
+            result = {"type": "volumeUpdate", "status": "ok", "volume": await volume_service.get()}
+        else:
+            if command in ('mouseLeftClick', 'mouseRightClick'):
+                await pointer.flush()  # click where the pending moves lead
+            # Execute command (in order, off the event loop)
+            if commands.submit(data, reply or ignore_result):
+                return
+            result = {"status": "error", "message": "Too many pending commands"}
+
+        if reply:
+            await reply(data, result)
+
+    CLIENTS_CONNECTED.inc(endpoint='ws')
 
     try:
+        # Request authentication
+        await ws.send_json({"type": "authRequired"})
+
         async for msg in ws:
-            if msg.type == web.WSMsgType.TEXT:
+            if msg.type == web.WSMsgType.BINARY:
+                if not binary_enabled:
+                    await ws.send_json({"status": "error", "message": "Binary protocol not negotiated"})
+                    continue
+                try:
+                    op, seq, data = control_protocol.decode(msg.data)
+                except control_protocol.ProtocolError as e:
+                    await ws.send_json({"status": "error", "message": str(e)})
+                    continue
+                await handle_command(data, binary_reply(op, seq))
+
+            elif msg.type == web.WSMsgType.TEXT:
                 try:
                     data = json.loads(msg.data)
 
-                    # Handle authentication
+                    # Handle authentication: the password, or a session token
                     if data.get('command') == 'auth':
-                        password = data.get('password', '')
-                        if password == REMOTE_PASSWORD:
-                            authenticated_clients.add(client_id)
-                            await ws.send_json({"type": "authSuccess"})
+                        if await auth.authenticate(ws, data):
                             logger.info(f'✅ Client authenticated: {request.remote}')
 
-                            # Send current volume after auth
-                            current_volume = get_current_volume()
+                            # Send current volume after auth, then later changes; subscribing
+                            # first would also send get()'s first read as a broadcast
+                            current_volume = await volume_service.get()
                             await ws.send_json({"type": "volumeUpdate", "volume": current_volume})
+                            volume_service.subscribe(ws)
                         else:
-                            await ws.send_json({"type": "authFailed", "message": "Invalid password"})
                             logger.warning(f'❌ Auth failed for: {request.remote}')
                         continue
 
                     # Check if authenticated
-                    if client_id not in authenticated_clients:
+                    if ws not in auth:
                         await ws.send_json({"type": "authRequired"})
                         continue
 
-                    # Execute command
-                    result = execute_command(data)
-                    await ws.send_json(result)
+                    # Opt in to binary command frames (control_protocol.py)
+                    if data.get('command') == 'binaryProtocol':
+                        binary_enabled = True
+                        await ws.send_json(control_protocol.describe())
+                        logger.info(f'📦 Binary control protocol enabled: {request.remote}')
+                        continue
 
-                    if result.get('volume') is not None:
-                        await ws.send_json({"type": "volumeUpdate", "volume": result['volume']})
+                    await handle_command(data, respond)
 
                 except json.JSONDecodeError:
                     await ws.send_json({"status": "error", "message": "Invalid JSON"})
@@ -544,12 +407,19 @@ async def websocket_handler(request):
     except Exception as e:
         logger.error(f'❌ Connection error: {e}')
     finally:
-        authenticated_clients.discard(client_id)
+        commands.close()
+        volume_service.unsubscribe(ws)
+        auth.discard(ws)
+        CLIENTS_CONNECTED.dec(endpoint='ws')
         logger.info(f'❌ WebSocket client disconnected: {request.remote}')
 
     return ws
 
 
+async def ignore_result(cmd, result):
+    """Reply callback for fire-and-forget commands."""
+
+
 def get_local_ip() -> str:
     """Get local IP address"""
     try:
@@ -603,17 +473,32 @@ async def main():
     # Routes - order matters! More specific routes first
     app.router.add_get('/', handle_index)
     app.router.add_get('/ws', websocket_handler)
-    app.router.add_get('/screen', screen_websocket_handler)  # Screen streaming endpoint
+    app.router.add_get('/screen', screen_socket.handle)  # Screen streaming endpoint
     app.router.add_get('/video', handle_video)
+    app.router.add_get('/metrics', auth.require(handle_metrics))  # Prometheus scrape endpoint
     app.router.add_get('/{path:.*}', handle_static)
 
+    dist_assets.scan()
+    public_assets.scan()
+
     ip = get_local_ip()
     local_url = f'http://{ip}:{PORT}'
 
+    # Pick the fastest frame encoder on this machine
+    screen_hub.default_encoder = pick_fastest_encoder(QUALITY)
+    # Start the input worker now so the first keypress doesn't pay for it
+    input_backend.start()
+    if browser is not None:
+        await browser.start()
+
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', PORT)
     await site.start()
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    volume_refresh = asyncio.create_task(volume_service.run())
+    # Pick up rebuilds of the web app without a restart
+    asset_watchers = [asyncio.create_task(assets.watch()) for assets in (dist_assets, public_assets)]
 
     print(f"""
 ╔════════════════════════════════════════════════════════════╗
@@ -626,6 +511,7 @@ async def main():
 ✅ Local: {local_url}
 🔌 Control WebSocket: ws://{ip}:{PORT}/ws
 🖥️  Screen WebSocket: ws://{ip}:{PORT}/screen
+📈 Metrics: {local_url}/metrics (Authorization: Bearer <password>)
 """)
 
     # Try to detect ngrok
@@ -667,8 +553,16 @@ Press Ctrl+C to stop the server
         print("\n\n✋ Server stopped")
     finally:
         # Cleanup streaming tasks
-        for task in streaming_tasks.values():
-            task.cancel()
+        lag_monitor.cancel()
+        volume_refresh.cancel()
+        for watcher in asset_watchers:
+            watcher.cancel()
+        screen_hub.stop_all()
+        pointer.stop()
+        command_dispatcher.shutdown()
+        input_backend.close()
+        if browser is not None:
+            await browser.close()
         await runner.cleanup()
 
 
@@ -0,0 +1,201 @@
+"""
+Resumable client sessions: reconnect without the password or a new startStream.
+
+A successful password auth now also returns a session token:
+
+    {"type": "authSuccess", "session": "<token>", "sessionExpires": 1760000000, "resumed": false}
+
+On reconnect (phone asleep, WiFi handoff, page reload) the client sends
+
+    {"command": "auth", "session": "<token>"}
+
+instead of the password. A valid token authenticates at once ("resumed":
+true) and, on /screen, restarts the session's last stream settings in the
+same step, so the client needs neither the password nor a startStream.
+What makes that first frame fast is the stream still lingering from the
+dropped connection (StreamHub.linger), not the token: see bench_reconnect.py.
+An expired or unknown token gets authFailed with "reason": "session", and
+the client falls back to the password.
+
+Tokens are "<session id>.<expiry>.<signature>", signed with HMAC-SHA256
+under SESSION_SECRET. Without a secret a random one is made per run, so a
+restart signs everyone out; with one, tokens outlive restarts (the stream
+settings, kept in memory, do not). Every resume extends the session by
+SESSION_TTL and returns a fresh token.
+
+ClientAuth answers auth messages for every endpoint of a server (/ws,
+/screen) and keeps the set of authenticated sockets. Its require() guards
+plain HTTP handlers (/metrics) the same way: the password or a session
+token, sent as "Authorization: Bearer <password or token>".
+"""
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from aiohttp import web
+from metrics import SESSION_AUTH
+
+SESSION_TTL = 12 * 3600  # seconds after the last use
+MAX_SESSIONS = 1000      # the least recently used are forgotten beyond this
+
+
+class Session:
+    """One client's session and the stream it was watching."""
+
+    __slots__ = ('id', 'expires', 'stream', 'target')
+
+    def __init__(self, session_id: str, expires: int):
+        self.id = session_id
+        self.expires = expires
+        self.stream = None  # the last startStream message, updated by later changes
+        self.target = None  # its CaptureTarget, after any setRegion
+
+    def remember(self, stream: dict, target=None):
+        """Record the stream settings to restart on resume."""
+        self.stream = dict(stream)
+        self.target = target
+
+    def update(self, target=None, **settings):
+        """Apply a live change (setQuality, setFps, setRegion) to the remembered stream."""
+        if self.stream is None:
+            return
+        self.stream.update(settings)
+        if target is not None:
+            self.target = target
+
+    def forget(self):
+        """The client stopped its stream; don't restart it."""
+        self.stream = None
+        self.target = None
+
+
+class SessionStore:
+    """Issues and checks session tokens; sessions live in memory."""
+
+    def __init__(self, secret: str | None = None, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS):
+        self.secret = secret.encode() if secret else secrets.token_bytes(32)
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions = {}  # id -> Session, least recently used first
+
+    def create(self) -> Session:
+        """A new session, after a password auth."""
+        session = Session(secrets.token_urlsafe(16), self._expiry())
+        self._store(session)
+        return session
+
+    def resume(self, token) -> Session | None:
+        """The token's session with its expiry extended, or None if invalid."""
+        now = time.time()
+        session_id, expires = self._verify(token)
+        if session_id is None:
+            SESSION_AUTH.inc(result='invalid')
+            return None
+        if expires < now:
+            self.sessions.pop(session_id, None)
+            SESSION_AUTH.inc(result='expired')
+            return None
+
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            # Signed by us before a restart: the login holds, the stream settings are gone
+            session = Session(session_id, 0)
+        session.expires = self._expiry()
+        self._store(session)
+        SESSION_AUTH.inc(result='resumed')
+        return session
+
+    def valid(self, token) -> bool:
+        """True for a signed, unexpired token; unlike resume(), changes nothing."""
+        session_id, expires = self._verify(token)
+        return session_id is not None and expires >= time.time()
+
+    def token(self, session: Session) -> str:
+        payload = f"{session.id}.{session.expires}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def _verify(self, token) -> tuple:
+        if not isinstance(token, str) or not token.isascii() or token.count('.') != 2:
+            return None, 0
+        payload, _, signature = token.rpartition('.')
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None, 0
+        session_id, _, expires = payload.partition('.')
+        try:
+            return session_id, int(expires)
+        except ValueError:
+            return None, 0
+
+    def _sign(self, payload: str) -> str:
+        digest = hmac.new(self.secret, payload.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def _expiry(self) -> int:
+        return int(time.time() + self.ttl)
+
+    def _store(self, session: Session):
+        self.sessions[session.id] = session
+        now = time.time()
+        while len(self.sessions) > self.max_sessions:
+            oldest = next(iter(self.sessions))
+            del self.sessions[oldest]
+        # Drop expired sessions from the old end while we are here
+        for session_id in list(self.sessions):
+            if self.sessions[session_id].expires >= now:
+                break
+            del self.sessions[session_id]
+
+
+class ClientAuth:
+    """Password or session-token auth for a server's WebSocket clients."""
+
+    def __init__(self, password: str, store: SessionStore):
+        self.password = password
+        self.sessions = store
+        self.clients = set()  # the sockets themselves: id() values get reused
+
+    async def authenticate(self, ws, data: dict) -> Session | None:
+        """Answer an auth message: the password, or a session token from an earlier auth."""
+        token = data.get('session')
+        if token is not None:
+            session = self.sessions.resume(token)
+        elif data.get('password', '') == self.password:
+            session = self.sessions.create()
+        else:
+            session = None
+
+        if session is None:
+            if token is not None:
+                await ws.send_json({"type": "authFailed", "reason": "session", "message": "Session expired"})
+            else:
+                await ws.send_json({"type": "authFailed", "reason": "password", "message": "Invalid password"})
+            return None
+        self.clients.add(ws)
+        await ws.send_json({"type": "authSuccess", "session": self.sessions.token(session),
+                            "sessionExpires": session.expires, "resumed": token is not None})
+        return session
+
+    def require(self, handler):
+        """Wrap an HTTP handler to answer 401 without the password or a session token."""
+        async def guarded(request):
+            scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+            if scheme.lower() != 'bearer' or not (
+                    hmac.compare_digest(credentials.encode(), self.password.encode())
+                    or self.sessions.valid(credentials)):
+                return web.Response(status=401, text='Unauthorized',
+                                    headers={'WWW-Authenticate': 'Bearer'})
+            return await handler(request)
+        return guarded
+
+    def discard(self, ws):
+        self.clients.discard(ws)
+
+    def __contains__(self, ws):
+        return ws in self.clients
+
+    def __len__(self):
+        return len(self.clients)
@@ -0,0 +1,212 @@
+"""
+Indexed, cached static file serving for the web app (dist/) and video.html.
+
+The directory is walked once at startup, and again whenever watch() sees
+a file change (e.g. `npm run build` while the server runs). For every file
+the index keeps the content type, an ETag and, for files up to
+MEMORY_LIMIT, the bytes themselves plus gzip (and brotli, if installed)
+variants of compressible types. Variants shipped next to a file
+(app.js.gz, app.js.br) are used as they are.
+
+Responses carry:
+- ETag, answered with 304 Not Modified on If-None-Match
+- Cache-Control: a year and immutable for Vite's hashed assets/ files,
+  no-cache (revalidate every time) for the rest, like index.html
+- Content-Encoding br/gzip when the client accepts it
+Larger files are sent from disk with FileResponse (sendfile).
+"""
+import asyncio
+import gzip
+import logging
+import mimetypes
+import os
+from pathlib import Path
+from aiohttp import web
+from metrics import STATIC_RESPONSES, STATIC_BYTES_SENT
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MEMORY_LIMIT = 1024 * 1024  # bigger files are streamed from disk
+COMPRESS_MIN_SIZE = 1024    # smaller files gain nothing from compression
+WATCH_INTERVAL = 2.0        # seconds between checks for changed files
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+CONTENT_TYPES = {
+    '.html': 'text/html',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.mjs': 'application/javascript',
+    '.json': 'application/json',
+    '.map': 'application/json',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon',
+    '.webp': 'image/webp',
+    '.woff2': 'font/woff2',
+    '.txt': 'text/plain',
+    '.webmanifest': 'application/manifest+json',
+}
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                'application/manifest+json')
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def get_content_type(path: str) -> str:
+    suffix = os.path.splitext(path)[1].lower()
+    return CONTENT_TYPES.get(suffix) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+class Asset:
+    """One indexed file."""
+
+    __slots__ = ('path', 'size', 'content_type', 'etags', 'cache_control', 'body', 'variants')
+
+    def __init__(self, path: Path, stat: os.stat_result, cache_control: str):
+        self.path = path
+        self.size = stat.st_size
+        self.content_type = get_content_type(path.name)
+        self.etags = {None: _file_etag(stat)}  # per encoding, None = identity
+        self.cache_control = cache_control
+        self.body = None
+        self.variants = {}  # encoding -> bytes (in memory) or Path (on disk)
+
+    @property
+    def compressible(self) -> bool:
+        return self.content_type.startswith(COMPRESSIBLE)
+
+    def load(self):
+        """Read small files into memory and prepare compressed variants."""
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            shipped = self.path.with_name(self.path.name + suffix)
+            if shipped.is_file():
+                stat = shipped.stat()
+                self.variants[encoding] = shipped.read_bytes() if stat.st_size <= MEMORY_LIMIT else shipped
+                self.etags[encoding] = _file_etag(stat)
+        if self.size > MEMORY_LIMIT:
+            return
+
+        self.body = self.path.read_bytes()
+        if not self.compressible or self.size < COMPRESS_MIN_SIZE:
+            return
+        if 'gzip' not in self.variants:
+            self._add_variant('gzip', gzip.compress(self.body, compresslevel=9, mtime=0))
+        if 'br' not in self.variants and brotli is not None:
+            self._add_variant('br', brotli.compress(self.body))
+
+    def _add_variant(self, encoding: str, data: bytes):
+        if len(data) < self.size:  # only if it actually helps
+            self.variants[encoding] = data
+            self.etags[encoding] = f'{self.etags[None]}-{encoding}'
+
+
+class StaticAssets:
+    """An in-memory index of a directory, served with caching headers."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.assets = {}
+        self._signature = None
+
+    def scan(self):
+        """(Re)build the index from disk."""
+        assets = {}
+        if self.root.is_dir():
+            for path in sorted(self.root.rglob('*')):
+                if not path.is_file() or path.suffix in ('.gz', '.br'):
+                    continue
+                relative = path.relative_to(self.root).as_posix()
+                # Vite puts content-hashed bundles in assets/
+                cache_control = IMMUTABLE if relative.startswith('assets/') else REVALIDATE
+                asset = Asset(path, path.stat(), cache_control)
+                asset.load()
+                assets[relative] = asset
+        self.assets = assets
+        self._signature = self._current_signature()
+        total = sum(asset.size for asset in assets.values())
+        logger.info(f"📁 Indexed {len(assets)} static files from {self.root} ({total / 1024:.0f} KB)")
+
+    async def watch(self, interval=WATCH_INTERVAL):
+        """Background task: re-index when files under root change."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                signature = await asyncio.to_thread(self._current_signature)
+                if signature != self._signature:
+                    await asyncio.to_thread(self.scan)
+            except OSError as e:
+                logger.warning(f"⚠️ Static files changed while indexing, retrying: {e}")
+
+    def response(self, request: web.Request, name: str) -> web.StreamResponse:
+        """The response for one indexed file (404 if not indexed)."""
+        asset = self.assets.get(name)
+        if asset is None:
+            STATIC_RESPONSES.inc(code='404')
+            return web.Response(text="404 Not Found", status=404)
+
+        encoding = self._pick_encoding(request, asset)
+        etag = asset.etags[encoding]
+        headers = {'Cache-Control': asset.cache_control}
+        if asset.compressible:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if _etag_matches(request.headers.get('If-None-Match', ''), etag):
+            STATIC_RESPONSES.inc(code='304')
+            return web.Response(status=304, headers={**headers, 'ETag': f'"{etag}"'})
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        body = asset.variants[encoding] if encoding else asset.body
+        STATIC_RESPONSES.inc(code='200')
+
+        if isinstance(body, bytes):
+            STATIC_BYTES_SENT.inc(len(body))
+            response = web.Response(body=body, content_type=asset.content_type, headers=headers)
+            response.headers['ETag'] = f'"{etag}"'
+            return response
+
+        # Large, or a variant shipped on disk: sendfile
+        path = body if body is not None else asset.path
+        STATIC_BYTES_SENT.inc(path.stat().st_size)
+        headers['Content-Type'] = asset.content_type
+        return web.FileResponse(path, headers=headers)
+
+    @staticmethod
+    def _pick_encoding(request: web.Request, asset: Asset) -> str | None:
+        accepted = request.headers.get('Accept-Encoding', '')
+        for encoding in ('br', 'gzip'):
+            if encoding in asset.variants and encoding in accepted:
+                return encoding
+        return None
+
+    def _current_signature(self) -> tuple:
+        if not self.root.is_dir():
+            return ()
+        signature = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                stat = os.stat(os.path.join(directory, name))
+                signature.append((directory, name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(signature))
+
+
+def _file_etag(stat: os.stat_result) -> str:
+    # Same form as aiohttp's FileResponse, so both paths agree
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = (tag.strip().removeprefix('W/').strip('"') for tag in header.split(','))
+    return etag in candidates
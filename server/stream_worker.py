@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Screen capture/encode in worker processes, with frames handed back through
+a shared-memory ring.
+
+With the 'process' engine each ScreenStreamer runs its grab/convert/
+resize/encode loop in a worker process, paced at the stream's fps. The
+worker writes every encoded frame into the next slot of a ring in shared
+memory and announces it on stdout; the server only copies the frame out
+of its slot and writes it to the viewers' sockets. Encoding then uses
+other cores and never holds the server's GIL, so control commands are not
+delayed by it.
+
+    thread   capture loop on a thread of the server process (streaming.py)
+             (default)
+    process  capture loop in a worker process
+
+Chosen with the STREAM_ENGINE environment variable. Every new streamer
+key (another size, quality, region or adaptive step) starts a new worker,
+whose first frame took ~740 ms against ~200 ms on a thread (synthetic
+source, 1280x720), so the process engine is opt-in until workers are
+reused.
+
+Ring slots: header '<QI' (sequence, length), then the frame bytes. The
+worker clears a slot's sequence before writing it and sets it after, so a
+reader that sees the announced sequence before and after copying got the
+whole frame. A slot the worker lapped before the server read it is
+dropped (and a delta stream asks for a keyframe). A frame too big for its
+slot makes the worker move to a new ring with room for it (at least twice
+the old slot size) and name it in that frame's message; the server
+attaches it, unlinks the old one and counts it in "ringGrown".
+
+Worker protocol, one JSON object per line each way:
+    -> {"op": "fps", "fps": 15}
+    -> {"op": "keyframe"}
+    <- {"seq": 12, "time": ..., "slot": 0, "length": 48211, "capture": 0.004, "encode": 0.011}
+    <- {"seq": 13, "time": ..., "idle": true, "capture": 0.004, "encode": 0.0}
+A message also carries the worker's pacing: "tick" (its monotonic frame
+start), "overrun" and "skipped" (see pacing.py) when the frame was late.
+A frame also carries "rect" and "size" (the captured screen rectangle and
+the stream size, for the cursor channel) whenever they change, and
+"ring": {"name", "slots", "slotSize"} when it is in a new, bigger ring.
+The worker exits when its stdin closes.
+
+Run a worker by hand (normally started by ProcessStreamer):
+    python stream_worker.py worker --ring <name> --slots 4 --slot-size 2764800 --settings '{...}'
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import signal
+import struct
+import sys
+import threading
+import time
+from multiprocessing import shared_memory, resource_tracker
+from PIL import Image
+from capture import CaptureTarget
+from delta import TileFrame, pack_tiles, unpack_tiles
+from streaming import ScreenStreamer, DEFAULT_FPS
+from pacing import FramePacer
+from metrics import STREAM_CAPTURE_SECONDS, STREAM_ENCODE_SECONDS, STREAM_FRAMES_DROPPED
+
+logger = logging.getLogger(__name__)
+
+RING_SLOTS = 4
+SLOT_HEADER = struct.Struct('<QI')  # sequence, length
+STOP_TIMEOUT = 2.0  # seconds a worker gets to exit before it is killed
+
+
+class FrameRing:
+    """Fixed-size frame slots in one shared-memory block.
+
+    One writer (the worker) and one reader (the server); the block is
+    created, and finally unlinked, by the reader.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, slot_size: int, owner: bool):
+        self.shm = shm
+        self.slots = slots
+        self.slot_size = slot_size
+        self.owner = owner
+
+    @classmethod
+    def create(cls, slots: int, frame_size: int) -> 'FrameRing':
+        slot_size = SLOT_HEADER.size + frame_size
+        shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        SLOT_HEADER.pack_into(shm.buf, 0, 0, 0)
+        return cls(shm, slots, slot_size, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, slots: int, slot_size: int, owner=False) -> 'FrameRing':
+        shm = shared_memory.SharedMemory(name=name)
+        if not owner:
+            # The reader owns the block; without this the worker's resource
+            # tracker would unlink it when the worker exits
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, slots, slot_size, owner)
+
+    def grow(self, frame_size: int) -> 'FrameRing':
+        """A new ring for the writer with room for frame_size; closes this one.
+
+        The reader attaches the new block as its owner, like one it created.
+        """
+        frame_size = max(frame_size, 2 * (self.slot_size - SLOT_HEADER.size))
+        ring = FrameRing.create(self.slots, frame_size)
+        resource_tracker.unregister(ring.shm._name, 'shared_memory')
+        ring.owner = False
+        self.close()
+        return ring
+
+    def describe(self) -> dict:
+        return {"name": self.name, "slots": self.slots, "slotSize": self.slot_size}
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self, seq: int, data) -> int | None:
+        """Store a frame in slot seq % slots; None if it does not fit."""
+        length = len(data)
+        if length > self.slot_size - SLOT_HEADER.size:
+            return None
+        slot = seq % self.slots
+        offset = slot * self.slot_size
+        start = offset + SLOT_HEADER.size
+        buf = self.shm.buf
+        SLOT_HEADER.pack_into(buf, offset, 0, 0)
+        buf[start:start + length] = data
+        SLOT_HEADER.pack_into(buf, offset, seq, length)
+        return slot
+
+    def read(self, seq: int, slot: int) -> bytes | None:
+        """Copy a frame out of its slot; None if it was overwritten."""
+        offset = slot * self.slot_size
+        start = offset + SLOT_HEADER.size
+        buf = self.shm.buf
+        current, length = SLOT_HEADER.unpack_from(buf, offset)
+        if current != seq:
+            return None
+        data = bytes(buf[start:start + length])
+        if SLOT_HEADER.unpack_from(buf, offset)[0] != seq:
+            return None
+        return data
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class ProcessStreamer(ScreenStreamer):
+    """A ScreenStreamer whose capture loop runs in a worker process.
+
+    Viewers, stats and metrics work as for ScreenStreamer; the worker
+    sends its stage timings with every frame.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._executor.shutdown()  # nothing is captured in this process
+        self.ring = None
+        self.frames_lapped = 0  # frames overwritten in the ring before they were read
+        self.ring_grown = 0  # rings replaced by bigger ones for oversized frames
+        self._process = None
+        self._worker_fps = None
+
+    def settings(self) -> dict:
+        """The worker's ScreenStreamer arguments."""
+        return {
+            "width": self.width,
+            "height": self.height,
+            "quality": self.quality,
+            "target": self.target._asdict(),
+            "resample": int(self.resample),
+            "optimize": self.optimize,
+            "with_cursor": self.with_cursor,
+            "mode": self.mode,
+            "encoder": self.encoder.name,
+            "source": self.source_spec,
+        }
+
+    def request_keyframe(self):
+        self._force_frame = True  # the worker starts with a keyframe anyway
+        self._send({"op": "keyframe"})
+
+    async def start(self):
+        """Run the worker and broadcast its frames until the last viewer leaves."""
+        self._begin()
+
+        try:
+            # A frame never outgrows 3 bytes per pixel of the stream size
+            self.ring = FrameRing.create(RING_SLOTS, self.width * self.height * 3)
+            self._process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), 'worker',
+                '--ring', self.ring.name, '--slots', str(self.ring.slots),
+                '--slot-size', str(self.ring.slot_size), '--settings', json.dumps(self.settings()),
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+            logger.info(f"⚙️ Started stream worker (pid {self._process.pid})")
+
+            while self.running:
+                if self.fps != self._worker_fps:
+                    self._worker_fps = self.fps
+                    self._send({"op": "fps", "fps": self.fps})
+                    self.pacer.set_fps(self.fps)
+
+                line = await self._process.stdout.readline()
+                if not line:
+                    raise RuntimeError(f"stream worker exited ({await self._process.wait()})")
+                message = json.loads(line)
+                self.broadcast(self._receive(message), message['time'])
+
+        except asyncio.CancelledError:
+            logger.info("🛑 Stream cancelled")
+        except Exception as e:
+            logger.error(f"❌ Stream error: {e}")
+            await self._report_error(e)
+        finally:
+            await self._stop_worker()
+            if self.ring:
+                self.ring.close()
+            self._end()
+
+    def _receive(self, message: dict):
+        """The frame a worker announced, or None for an idle capture."""
+        STREAM_CAPTURE_SECONDS.observe(message['capture'], stream=self.label)
+        # The worker paces itself; its frame starts feed this side's stats
+        if message.get('overrun'):
+            self.pacer.overrun(message.get('skipped', 0))
+        self.pacer.started(message['tick'], message.get('skipped', 0) + 1)
+        if 'rect' in message:
+            self.capture_rect, self.frame_size = tuple(message['rect']), tuple(message['size'])
+        if message.get('idle'):
+            return None
+        STREAM_ENCODE_SECONDS.observe(message['encode'], stream=self.label)
+        if 'ring' in message:
+            self._replace_ring(message['ring'])
+
+        data = self.ring.read(message['seq'], message['slot'])
+        if data is None:
+            self.frames_lapped += 1
+            STREAM_FRAMES_DROPPED.inc(stream=self.label)
+            if self.mode == 'delta':
+                self.request_keyframe()  # the viewers' pictures missed these tiles
+            return None
+        return unpack_tiles(data) if self.mode == 'delta' else data
+
+    def _replace_ring(self, ring: dict):
+        """Take over the bigger ring the worker moved to; every frame in the old one was read."""
+        old, self.ring = self.ring, FrameRing.attach(ring['name'], ring['slots'], ring['slotSize'], owner=True)
+        old.close()
+        self.ring_grown += 1
+        logger.warning(f"⚠️ Frame did not fit the ring, grew slots to {self.ring.slot_size} bytes")
+
+    def _send(self, command: dict):
+        if self._process is None or self._process.stdin.is_closing():
+            return
+        self._process.stdin.write(json.dumps(command).encode() + b'\n')
+
+    async def _stop_worker(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        process.stdin.close()
+        try:
+            await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "engine": "process", "framesLapped": self.frames_lapped,
+                "ringGrown": self.ring_grown}
+
+
+ENGINES = {'thread': ScreenStreamer, 'process': ProcessStreamer}
+
+
+def streamer_class(engine: str):
+    """The streamer class for an engine name; unknown names get the default."""
+    cls = ENGINES.get(engine)
+    if cls is None:
+        logger.warning(f"⚠️ Stream engine '{engine}' unknown, using thread")
+        cls = ScreenStreamer
+    return cls
+
+
+# ============== Worker ==============
+
+def serve(streamer: ScreenStreamer, ring: FrameRing, fps: int, stdin, stdout):
+    """Capture, encode and announce frames at fps until stdin closes; closes the ring."""
+    pacer = FramePacer(fps)
+    commands = queue.Queue()
+    threading.Thread(target=_read_commands, args=(stdin, commands), name='commands',
+                     daemon=True).start()
+    seq = 0
+    geometry = None
+
+    try:
+        while True:
+            while not commands.empty():
+                command = commands.get()
+                if command is None:
+                    return
+                if command['op'] == 'fps':
+                    pacer.set_fps(max(1, int(command['fps'])))
+                elif command['op'] == 'keyframe':
+                    streamer.request_keyframe()
+
+            overruns, skipped = pacer.overruns, pacer.skipped
+            pacer.wait_blocking()
+            frame_start = time.time()
+
+            frame = streamer.capture_frame()
+            seq += 1
+            message = {"seq": seq, "time": frame_start, "tick": pacer.last_start,
+                       "capture": streamer.capture_time, "encode": streamer.encode_time}
+            if pacer.overruns != overruns:
+                message.update(overrun=True, skipped=pacer.skipped - skipped)
+            if (streamer.capture_rect, streamer.frame_size) != geometry:
+                geometry = streamer.capture_rect, streamer.frame_size
+                message.update(rect=streamer.capture_rect, size=streamer.frame_size)
+            if frame is None:
+                message["idle"] = True
+            else:
+                if isinstance(frame, TileFrame):
+                    frame = pack_tiles(frame.width, frame.height, frame.tiles, frame.keyframe)
+                slot = ring.write(seq, frame)
+                if slot is None:
+                    # Dropping it instead would loop in delta mode: the keyframe is bigger still
+                    ring = ring.grow(len(frame))
+                    slot = ring.write(seq, frame)
+                    message["ring"] = ring.describe()
+                message.update(slot=slot, length=len(frame))
+            stdout.write(json.dumps(message) + '\n')
+            stdout.flush()
+    except BrokenPipeError:
+        pass  # the server went away
+    finally:
+        streamer.close_capture()
+        ring.close()
+
+
+def _read_commands(stdin, commands: queue.Queue):
+    for line in stdin:
+        try:
+            commands.put(json.loads(line))
+        except json.JSONDecodeError:
+            logger.warning(f"⚠️ Bad stream worker command: {line.strip()}")
+    commands.put(None)  # EOF
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen stream worker process")
+    sub = parser.add_subparsers(dest='action', required=True)
+    worker = sub.add_parser('worker', help='capture and encode into a shared-memory ring')
+    worker.add_argument('--ring', required=True, help='shared memory block name')
+    worker.add_argument('--slots', type=int, default=RING_SLOTS)
+    worker.add_argument('--slot-size', type=int, required=True)
+    worker.add_argument('--settings', required=True, help='ScreenStreamer arguments as JSON')
+    worker.add_argument('--fps', type=int, default=DEFAULT_FPS)
+    args = parser.parse_args()
+
+    # Ctrl+C reaches the whole process group; the server stops us by closing stdin
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
+    # stdout carries the protocol; anything else printed goes to stderr
+    stdout = os.fdopen(os.dup(sys.stdout.fileno()), 'w', buffering=1)
+    sys.stdout = sys.stderr
+
+    settings = json.loads(args.settings)
+    target = settings['target']
+    settings['target'] = CaptureTarget(
+        target['monitor'], tuple(target['region']) if target['region'] else None,
+        target['window'], target['zoom'], tuple(target['center']))
+    settings['resample'] = Image.Resampling(settings['resample'])
+    streamer = ScreenStreamer(**settings)
+    streamer._executor.shutdown()  # captures run on this process's main thread
+
+    serve(streamer, FrameRing.attach(args.ring, args.slots, args.slot_size), args.fps, sys.stdin, stdout)
+
+
+if __name__ == "__main__":
+    main()
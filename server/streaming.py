@@ -0,0 +1,823 @@
+"""
+Shared screen capture/encode hub for the /screen WebSocket endpoints.
+
+One ScreenStreamer runs per (target, size, quality) setting and fans every
+encoded frame out to all the StreamViewers subscribed to it, so adding a
+viewer costs a socket write instead of another grab/resize/encode loop.
+
+Grabbing, converting, resizing and encoding run on a dedicated worker
+thread per streamer; the event loop only awaits the finished JPEG bytes,
+so control commands and other streams keep flowing while a frame encodes.
+stream_worker.py moves that loop into a worker process instead, handing
+frames back through shared memory, so encoding also leaves the GIL alone.
+
+The pointer is either drawn into the frames or, for viewers that ask for
+the cursor channel (see cursor.py), left out of them and sent as small
+position messages, so moving the mouse does not force a new frame.
+
+Each raw capture is fingerprinted before encoding; when the screen did not
+change the frame is neither encoded nor sent, and viewers get a low-rate
+keepalive instead.
+
+Streams run in one of two modes: 'jpeg' sends every frame as a full JPEG,
+'delta' sends only the tiles that changed (see delta.py). Viewers can be
+adaptive (see adaptive.py), in which case their quality, fps and size are
+stepped down and back up to match their link. Frames are encoded by a
+pluggable backend (see encoders.py), chosen per stream, and captured
+from a pluggable source (see capture.py): the real screen, or synthetic
+and replayed frames for headless benchmarking. A stream can capture a
+monitor, a region of it or a single window (a CaptureTarget); such areas are
+encoded at their native size, only scaled down to fit the requested size.
+
+The frame path reuses its buffers: the BGRX capture is converted into one
+RGB image per streamer, Pillow keeps freed image blocks for the next resize,
+and encoded bytes go to the socket as they are. Base64 viewers share one
+encoding of each frame.
+
+Frames are started on a monotonic deadline grid (see pacing.py), which
+keeps the cadence steady, skips slots cleanly when capture falls behind and
+picks up fps changes on the next frame.
+
+Binary viewers that start with frameHeader: true get every frame prefixed
+with a FRAME_HEADER (little endian, 16 bytes):
+
+    version   u8   FRAME_HEADER_VERSION
+    kind      u8   0 full frame, 1 delta tiles
+    length    u16  header length, so clients can skip fields added later
+    frame     u32  the viewer's frame number
+    captured  f64  capture start, Unix seconds
+
+Base64 frames carry the same "frame" and "timestamp" in their JSON. A
+client may answer with {"command": "frameAck", "frame": n} once it has
+shown a frame; the server matches it to the frame's capture time, so each
+viewer gets capture-to-display latency stats, the stream a latency
+histogram and the adaptive controller one more congestion signal.
+
+Per-stream stage latencies, fps, drops and bytes are recorded in metrics.py
+under a 'stream' label such as 1280x720-q60-jpeg-pillow-jpeg.
+"""
+import asyncio
+import time
+import base64
+import logging
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from delta import TileEncoder, TileFrame, PendingTiles
+from adaptive import AdaptiveController
+from encoders import create_encoder
+from capture import open_source, FULL_SCREEN, CaptureTarget
+from cursor import CursorChannel
+from pacing import FramePacer
+from metrics import (STREAM_CAPTURE_SECONDS, STREAM_ENCODE_SECONDS, STREAM_SEND_SECONDS, STREAM_FPS,
+                     STREAM_FRAMES, STREAM_FRAMES_DROPPED, STREAM_BYTES_SENT, STREAM_VIEWERS,
+                     STREAM_FRAME_LATENCY_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FPS = 30
+KEEPALIVE_INTERVAL = 1.0  # seconds between keepalives on an unchanged screen
+WRITE_BUFFER_LIMIT = 256 * 1024  # don't write while this much is still unsent
+STALL_TIMEOUT = 10.0             # close a viewer whose buffer never drains
+# Seconds a stream keeps running after its last viewer disconnects, so a
+# reconnecting phone joins it warm instead of starting capture over
+DEFAULT_LINGER = 5.0
+STREAM_MODES = ('jpeg', 'delta')
+# frame: drawn into the frames, channel: sent apart (cursor.py), none: hidden
+CURSOR_MODES = ('frame', 'channel', 'none')
+# Freed Pillow image blocks kept for reuse, so resizing a frame of the same
+# size every tick recycles memory instead of going back to malloc
+# (PILLOW_BLOCKS_MAX in the environment overrides a lower value)
+PILLOW_BLOCKS_MAX = 8
+# version, kind, header length, frame number, capture time
+FRAME_HEADER = struct.Struct('<BBHId')
+FRAME_HEADER_VERSION = 1
+FRAME_KINDS = {'jpeg': 0, 'delta': 1}
+ACK_HISTORY = 64      # sent frames remembered to match frameAcks against
+LATENCY_WINDOW = 120  # recent ack latencies kept per viewer
+
+Image.core.set_blocks_max(max(Image.core.get_blocks_max(), PILLOW_BLOCKS_MAX))
+
+
+class StreamViewer:
+    """A WebSocket subscribed to a ScreenStreamer.
+
+    The viewer keeps only the latest encoded frame; its own sender task
+    writes that frame to the socket, so a slow client never holds up the
+    capture loop or the other viewers. A frame replaced before it was sent
+    is counted as dropped. The sender also waits while the transport still
+    holds WRITE_BUFFER_LIMIT bytes, so a viewer's memory is capped at
+    that plus one frame.
+    """
+
+    def __init__(self, ws, hub, fps=DEFAULT_FPS, use_binary=True, transport=None):
+        self.ws = ws
+        self.hub = hub
+        self.fps = fps
+        self.use_binary = use_binary  # Binary frames are faster than base64
+        self.frame_header = False     # prefix binary frames with a FRAME_HEADER
+        self.transport = transport    # for the write-buffer backlog
+        self.mode = 'jpeg'
+        self.encoder = None  # backend name, None for the hub's default
+        self.target = FULL_SCREEN
+        self.cursor = None  # a CURSOR_MODES entry, None for the hub's default
+        self.adaptive = None
+        self.streamer = None
+        self.frame_count = 0
+        self.frames_dropped = 0
+        self.frames_acked = 0
+        self._in_flight = deque(maxlen=ACK_HISTORY)  # (frame number, captured at), oldest first
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._latest = None
+        self._pending_tiles = PendingTiles()
+        self._frame_ready = asyncio.Event()
+        self._last_push = 0.0
+        self._captured_at = 0.0
+        self._last_sent = 0.0
+        self._keepalive_due = False
+        self._cursor_state = None
+        self._cursor_shape = None
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the sender task."""
+        if not self.running:
+            self._task = asyncio.create_task(self._send_loop())
+
+    def stop(self):
+        """Stop the sender task."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def configure(self, width: int, height: int, quality: int, fps: int, mode='jpeg',
+                  adaptive: AdaptiveController | None = None, encoder: str | None = None,
+                  target: CaptureTarget = FULL_SCREEN, cursor: str | None = None):
+        """Subscribe with the requested settings.
+
+        With an AdaptiveController the settings are the ceiling and the
+        controller picks the current level.
+        """
+        self.mode = mode
+        self.encoder = encoder
+        self.target = target
+        self.cursor = cursor
+        self.adaptive = adaptive
+        if adaptive:
+            width, height, quality, fps = adaptive.settings
+        self.fps = fps
+        self.hub.subscribe(self, width, height, quality)
+
+    def update(self, quality: int | None = None, fps: int | None = None):
+        """Apply a manual setQuality/setFps."""
+        streamer = self.streamer
+        if streamer is None:
+            return
+        if self.adaptive:
+            width, height, old_quality, old_fps = self.adaptive.levels[0]
+            self.adaptive.rebase(width, height, quality or old_quality, fps or old_fps)
+            self.configure(width, height, quality or old_quality, fps or old_fps,
+                           self.mode, self.adaptive, self.encoder, self.target, self.cursor)
+            return
+        if fps:
+            self.fps = fps
+        if quality:
+            self.hub.subscribe(self, streamer.width, streamer.height, quality)
+
+    def set_target(self, target: CaptureTarget, width: int, height: int):
+        """Apply a live setRegion: capture another area, with a new size ceiling."""
+        streamer = self.streamer
+        self.target = target
+        if streamer is None:
+            return
+        if self.adaptive:
+            _, _, quality, fps = self.adaptive.levels[0]
+            self.adaptive.rebase(width, height, quality, fps)
+            self.configure(width, height, quality, fps, self.mode, self.adaptive, self.encoder,
+                           target, self.cursor)
+            return
+        self.hub.subscribe(self, width, height, streamer.quality)
+
+    def ack(self, frame: int | None = None) -> float | None:
+        """Client acknowledged a frame (frameAck); returns its capture-to-ack latency."""
+        if frame is None:
+            self.frames_acked += 1
+            return None
+        self.frames_acked = max(self.frames_acked, frame + 1)
+
+        # Acks may skip frames; older ones can no longer be matched
+        while self._in_flight and self._in_flight[0][0] < frame:
+            self._in_flight.popleft()
+        if not self._in_flight or self._in_flight[0][0] != frame:
+            return None
+        _, captured_at = self._in_flight.popleft()
+        latency = max(time.time() - captured_at, 0.0)
+        self._latencies.append(latency)
+        if self.streamer:
+            STREAM_FRAME_LATENCY_SECONDS.observe(latency, stream=self.streamer.label)
+        if self.adaptive:
+            self.adaptive.observe_latency(latency)
+        return latency
+
+    def latency(self) -> dict | None:
+        """Capture-to-ack latency over the last LATENCY_WINDOW acks, None without acks."""
+        if not self._latencies:
+            return None
+        latencies = sorted(self._latencies)
+
+        def ms(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        return {"samples": len(latencies), "p50Ms": ms(0.5), "p95Ms": ms(0.95),
+                "maxMs": round(latencies[-1] * 1000, 1)}
+
+    def status(self) -> dict:
+        streamer = self.streamer
+        # The size frames are sent at; regions and windows fit within width x height
+        width, height = (streamer.frame_size or (streamer.width, streamer.height)) if streamer else (None, None)
+        return {
+            "type": "streamStatus",
+            "width": width,
+            "height": height,
+            "quality": streamer.quality if streamer else None,
+            "fps": self.fps,
+            "mode": self.mode,
+            "encoder": streamer.encoder.name if streamer else None,
+            "target": self.target.describe(),
+            "cursor": self.cursor or ('frame' if self.hub.with_cursor else 'none'),
+            "framesSent": self.frame_count,
+            "framesDropped": self.frames_dropped,
+            "latency": self.latency(),
+            "adaptive": self.adaptive.describe() if self.adaptive else None,
+        }
+
+    def push(self, frame, captured_at: float):
+        """Offer a new frame; replaces any frame not yet sent.
+
+        Delta frames are merged into the pending tiles instead, so skipped
+        frames never leave holes in the client's picture.
+        """
+        # Honour this viewer's fps when the streamer runs faster for others
+        interval = 1.0 / self.fps
+        slack = self.streamer.frame_interval / 2 if self.streamer else 0
+        due = captured_at + slack >= self._last_push + interval
+
+        if isinstance(frame, TileFrame):
+            if not self._pending_tiles.merge(frame):
+                return
+        elif due:
+            self._latest = frame
+        if not due:
+            return
+
+        if self._frame_ready.is_set():
+            self.frames_dropped += 1  # the previous frame never left
+            if self.streamer:
+                STREAM_FRAMES_DROPPED.inc(stream=self.streamer.label)
+        self._last_push = captured_at
+        self._captured_at = captured_at
+        self._frame_ready.set()
+
+    def keepalive(self, now: float):
+        """Called instead of push() when the screen did not change."""
+        if now - self._last_sent >= KEEPALIVE_INTERVAL:
+            self._keepalive_due = True
+            self._frame_ready.set()
+
+    async def send_error(self, message: str):
+        """Tell the client its stream failed."""
+        try:
+            await self.ws.send_json({"type": "error", "message": message})
+        except Exception as e:
+            logger.error(f"Failed to send stream error: {e}")
+
+    async def send_cursor(self, position: tuple, shape):
+        """Send the pointer, mapped into this viewer's frames, if it moved."""
+        streamer = self.streamer
+        if streamer is None or streamer.capture_rect is None or self.ws.closed:
+            return
+        if self._backlog() > WRITE_BUFFER_LIMIT:
+            return  # the next sample will be newer anyway
+
+        left, top, width, height = streamer.capture_rect
+        frame_width, frame_height = streamer.frame_size
+        scale = frame_width / width
+        x = round((position[0] - left) * scale)
+        y = round((position[1] - top) * frame_height / height)
+        visible = 0 <= x < frame_width and 0 <= y < frame_height
+        state = (x, y, scale) if visible else None
+        try:
+            if shape is not None and shape.key != self._cursor_shape:
+                self._cursor_shape = shape.key
+                await self.ws.send_json(shape.message())
+            if state != self._cursor_state:
+                self._cursor_state = state
+                await self.ws.send_json({"type": "cursor", "x": x, "y": y,
+                                         "visible": visible, "scale": round(scale, 4)})
+        except Exception as e:
+            logger.error(f"Failed to send cursor: {e}")
+
+    def resync(self):
+        """Discard pending tiles and ask for a full frame."""
+        self._pending_tiles.reset()
+        if self.streamer:
+            self.streamer.request_keyframe()
+
+    def _take_frame(self) -> bytes | None:
+        if self.streamer and self.streamer.mode == 'delta':
+            return self._pending_tiles.take()
+        frame, self._latest = self._latest, None
+        return frame
+
+    async def _send_loop(self):
+        try:
+            while True:
+                await self._frame_ready.wait()
+                # Newer frames keep replacing the slot while we wait here
+                if not await self._wait_writable():
+                    break
+                self._frame_ready.clear()
+                frame_bytes = self._take_frame()
+                if frame_bytes is None:
+                    if self._keepalive_due and not await self._send_keepalive():
+                        break
+                    continue
+
+                send_start = time.monotonic()
+                try:
+                    if self.use_binary:
+                        if self.frame_header:
+                            header = FRAME_HEADER.pack(
+                                FRAME_HEADER_VERSION, FRAME_KINDS[self.streamer.mode], FRAME_HEADER.size,
+                                self.frame_count & 0xFFFFFFFF, self._captured_at)
+                            await self.ws.send_bytes(header + frame_bytes)
+                        else:
+                            await self.ws.send_bytes(frame_bytes)
+                    else:
+                        # Built by hand: json.dumps would rescan the base64 payload
+                        kind = "delta" if self.streamer.mode == 'delta' else "frame"
+                        frame_data = self.streamer.as_base64(frame_bytes)
+                        await self.ws.send_str(
+                            f'{{"type": "{kind}", "data": "{frame_data}", '
+                            f'"timestamp": {self._captured_at!r}, "frame": {self.frame_count}}}')
+                except Exception as e:
+                    logger.error(f"Failed to send frame: {e}")
+                    break
+
+                send_time = time.monotonic() - send_start
+                self._in_flight.append((self.frame_count, self._captured_at))
+                self.frame_count += 1
+                self._last_sent = time.time()
+                if self.streamer:
+                    STREAM_SEND_SECONDS.observe(send_time, stream=self.streamer.label)
+                    STREAM_BYTES_SENT.inc(len(frame_bytes), stream=self.streamer.label)
+
+                if self.adaptive:
+                    self.adaptive.observe(send_time, self._backlog(), self._unacked())
+                    reason = self.adaptive.evaluate()
+                    if reason and not await self._adapt(reason):
+                        break
+        except asyncio.CancelledError:
+            pass
+
+    async def _wait_writable(self) -> bool:
+        """Wait until the write buffer is under the limit; False if stalled."""
+        deadline = time.monotonic() + STALL_TIMEOUT
+        while self._backlog() > WRITE_BUFFER_LIMIT:
+            if time.monotonic() > deadline:
+                logger.warning(f"⚠️ Viewer stalled for {STALL_TIMEOUT:.0f}s, closing")
+                await self.ws.close()
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    def _backlog(self) -> int:
+        if self.transport is None or self.transport.is_closing():
+            return 0
+        return self.transport.get_write_buffer_size()
+
+    def _unacked(self) -> int | None:
+        # Acks are optional: only count them once the client has sent one
+        if not self.frames_acked:
+            return None
+        return self.frame_count - self.frames_acked
+
+    async def _adapt(self, reason: str) -> bool:
+        """Move to the controller's new level and tell the client."""
+        width, height, quality, fps = self.adaptive.settings
+        self.fps = fps
+        self.hub.subscribe(self, width, height, quality)
+        logger.info(f"🎚️ Adapted viewer to {width}x{height} q{quality} @ {fps}fps ({reason})")
+        try:
+            await self.ws.send_json(self.status())
+        except Exception as e:
+            logger.error(f"Failed to send stream status: {e}")
+            return False
+        return True
+
+    async def _send_keepalive(self) -> bool:
+        self._keepalive_due = False
+        streamer = self.streamer
+        try:
+            await self.ws.send_json({
+                "type": "keepalive",
+                "activeFrames": streamer.active_frames if streamer else 0,
+                "idleFrames": streamer.idle_frames if streamer else 0,
+                "framesDropped": self.frames_dropped
+            })
+        except Exception as e:
+            logger.error(f"Failed to send keepalive: {e}")
+            return False
+        self._last_sent = time.time()
+        return True
+
+
+class ScreenStreamer:
+    """Captures one area at one size/quality and fans frames out to viewers.
+
+    The full monitor is scaled to width x height; a region or window is
+    kept at its native size and only scaled down, keeping its aspect
+    ratio, to fit within width x height.
+    """
+
+    def __init__(self, width=1280, height=720, quality=60, target=FULL_SCREEN,
+                 resample=Image.Resampling.BILINEAR, optimize=False, with_cursor=False,
+                 mode='jpeg', encoder='pillow-jpeg', source='mss'):
+        self.width = width
+        self.height = height
+        self.quality = quality
+        self.mode = mode
+        self.encoder = create_encoder(encoder, optimize)
+        self.tile_encoder = TileEncoder(self.encoder) if mode == 'delta' else None
+        self.label = f"{width}x{height}-q{quality}-{mode}-{self.encoder.name}"  # metrics label
+        if not target.full:
+            self.label += f"-{target.label}"
+        self.resample = resample
+        self.optimize = optimize
+        self.with_cursor = with_cursor
+        self.target = target
+        self.viewers = set()
+        self.running = False
+        # mss handles are bound to the thread that created them, so the
+        # capture source is opened lazily on the worker thread
+        self.source_spec = source
+        self.source = None
+        # One worker per streamer: at most one frame is in flight between
+        # the worker and the loop, which bounds the handoff to a single frame
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='capture')
+        self.frame_count = 0
+        self.active_frames = 0  # captures that changed and were encoded
+        self.idle_frames = 0    # identical captures, skipped
+        self._fingerprint = None
+        self._force_frame = True
+        self.capture_time = 0.0  # stage times of the last capture_frame()
+        self.encode_time = 0.0
+        self.capture_rect = None  # screen rectangle and stream size of the last
+        self.frame_size = None    # capture, to map the pointer into frames
+        self._rgb = None             # RGB image reused by every convert (worker thread)
+        self._base64 = (None, '')    # last frame sent as base64, and its text (event loop)
+        self.start_time = None
+        self.pacer = FramePacer(DEFAULT_FPS, self.label)
+        self._window_start, self._window_frames = 0.0, 0
+        self.task = None
+
+    @property
+    def fps(self) -> int:
+        """Capture rate: the fastest rate any viewer asked for."""
+        return max((v.fps for v in self.viewers), default=DEFAULT_FPS)
+
+    @property
+    def frame_interval(self) -> float:
+        return 1.0 / self.fps
+
+    def grab(self):
+        """Grab one screenshot (worker thread)."""
+        if self.source is None:
+            self.source = open_source(self.source_spec, self.target, self.with_cursor)
+        return self.source.grab()
+
+    def capture_frame(self):
+        """Grab and encode one frame (worker thread).
+
+        Returns None when the capture is identical to the previous one.
+        """
+        start = time.perf_counter()
+        screenshot = self.grab()
+        self.capture_time = time.perf_counter() - start
+        STREAM_CAPTURE_SECONDS.observe(self.capture_time, stream=self.label)
+        self.encode_time = 0.0
+        self.capture_rect = self.source.bounds
+        self.frame_size = self.output_size(*screenshot.size)
+
+        # crc32 over the raw BGRA costs a few ms, far less than an encode
+        fingerprint = zlib.crc32(screenshot.raw)
+        if fingerprint == self._fingerprint and not self._force_frame:
+            return None
+        self._fingerprint = fingerprint
+        self._force_frame = False
+
+        start = time.perf_counter()
+        if self.tile_encoder:
+            frame = self.tile_encoder.encode(self.prepare(screenshot), self.quality)
+        else:
+            frame = self.encode(screenshot)
+        self.encode_time = time.perf_counter() - start
+        STREAM_ENCODE_SECONDS.observe(self.encode_time, stream=self.label)
+        return frame
+
+    def request_keyframe(self):
+        """Send the next frame in full, even if the screen did not change."""
+        self._force_frame = True
+        if self.tile_encoder:
+            self.tile_encoder.request_keyframe()
+
+    def close_capture(self):
+        """Release the capture source (worker thread)."""
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+
+    # The encode path is split into stages so bench_pipeline.py can time
+    # each one: convert -> resize -> encode_frame
+
+    def convert(self, screenshot):
+        """The capture as an RGB image, or as a BGRX array view for
+        encoders that take BGRA directly (no copy).
+
+        The RGB image is reused for the next frame, so it is only valid
+        until the next convert().
+        """
+        if self.encoder.accepts_bgra:
+            width, height = screenshot.size
+            return np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(height, width, 4)
+        return self._to_rgb(screenshot)
+
+    def output_size(self, width: int, height: int) -> tuple:
+        """Stream size for a capture of width x height."""
+        if self.target.full:
+            return self.width, self.height
+        scale = min(self.width / width, self.height / height, 1.0)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def resize(self, frame):
+        """Scale a converted frame to the stream size."""
+        if isinstance(frame, np.ndarray):
+            height, width = frame.shape[:2]
+            size = self.output_size(width, height)
+            if (width, height) == size:
+                return frame
+            # Resampling is per channel, so BGRX can be resized as if it were RGBX
+            img = Image.frombuffer('RGBX', (width, height), frame, 'raw', 'RGBX', 0, 1)
+            return np.asarray(img.resize(size, self.resample))
+
+        size = self.output_size(frame.width, frame.height)
+        if frame.size != size:
+            frame = frame.resize(size, self.resample)
+        return frame
+
+    def encode_frame(self, frame) -> bytes:
+        """Encode a converted, resized frame."""
+        if isinstance(frame, np.ndarray):
+            return self.encoder.encode_bgra(frame, self.quality)
+        return self.encoder.encode(frame, self.quality)
+
+    def encode(self, screenshot) -> bytes:
+        """Convert, resize and encode one screenshot."""
+        return self.encode_frame(self.resize(self.convert(screenshot)))
+
+    def prepare(self, screenshot) -> Image.Image:
+        """The screenshot as RGB at the stream size (delta mode)."""
+        return self.resize(self._to_rgb(screenshot))
+
+    def _to_rgb(self, screenshot) -> Image.Image:
+        # Decoding into the existing image skips a full-frame allocation;
+        # a new one is made only when the capture size changes
+        if self._rgb is None or self._rgb.size != tuple(screenshot.size):
+            self._rgb = Image.new('RGB', tuple(screenshot.size))
+        self._rgb.frombytes(screenshot.raw, 'raw', 'BGRX')
+        return self._rgb
+
+    def as_base64(self, frame: bytes) -> str:
+        """A frame as base64 text, encoded once however many viewers send it."""
+        cached, text = self._base64
+        if cached is not frame:
+            text = base64.b64encode(frame).decode('ascii')
+            self._base64 = (frame, text)
+        return text
+
+    async def start(self):
+        """Capture and broadcast until the last viewer leaves."""
+        self._begin()
+        loop = asyncio.get_running_loop()
+
+        try:
+            # The hub stops the loop once the last viewer is gone (see StreamHub.linger)
+            while self.running:
+                # Viewers joining, leaving or calling setFps change the rate live
+                if self.pacer.fps != self.fps:
+                    self.pacer.set_fps(self.fps)
+                await self.pacer.wait()
+                frame_start = time.time()
+
+                frame = await loop.run_in_executor(self._executor, self.capture_frame)
+                self.broadcast(frame, frame_start)
+
+        except asyncio.CancelledError:
+            logger.info("🛑 Stream cancelled")
+        except Exception as e:
+            logger.error(f"❌ Stream error: {e}")
+            await self._report_error(e)
+        finally:
+            self._executor.submit(self.close_capture)
+            self._executor.shutdown(wait=False)
+            self._end()
+
+    def broadcast(self, frame, captured_at: float):
+        """Hand one capture to every viewer; None means the screen did not change."""
+        if frame is None:
+            self.idle_frames += 1
+            STREAM_FRAMES.inc(stream=self.label, result='idle')
+            for viewer in list(self.viewers):
+                viewer.keepalive(captured_at)
+        else:
+            self.active_frames += 1
+            STREAM_FRAMES.inc(stream=self.label, result='active')
+            for viewer in list(self.viewers):
+                viewer.push(frame, captured_at)
+
+        self.frame_count += 1
+        self._window_frames += 1
+
+        # Calculate actual FPS every second
+        if self.frame_count % self.fps == 0:
+            now = time.time()
+            STREAM_FPS.set(self._window_frames / (now - self._window_start), stream=self.label)
+            self._window_start, self._window_frames = now, 0
+            actual_fps = self.frame_count / (now - self.start_time)
+            logger.info(f"📊 Streaming: {actual_fps:.1f} FPS "
+                        f"({self.active_frames} active / {self.idle_frames} idle) "
+                        f"to {len(self.viewers)} viewer(s)")
+
+    async def _report_error(self, error: Exception):
+        """Pass a capture loop failure on to the viewers, whose stream it ends."""
+        for viewer in list(self.viewers):
+            await viewer.send_error(f"Stream stopped: {error}")
+
+    def _begin(self):
+        self.running = True
+        self.start_time = time.time()
+        self._window_start, self._window_frames = self.start_time, 0
+
+        cursor = " (cursor visible)" if self.with_cursor else ""
+        logger.info(f"📺 Starting {self.mode} stream ({self.encoder.name}) of {self.target.label}: "
+                    f"{self.width}x{self.height} q{self.quality} @ {self.fps}fps{cursor}")
+
+    def _end(self):
+        self.running = False
+        for viewer in list(self.viewers):
+            viewer.stop()
+        STREAM_FPS.remove(stream=self.label)
+        STREAM_VIEWERS.remove(stream=self.label)
+        logger.info(f"📺 Stream ended after {self.frame_count} frames "
+                    f"({self.active_frames} active / {self.idle_frames} idle)")
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "encoder": self.encoder.name,
+            "target": self.target.describe(),
+            "width": self.width,
+            "height": self.height,
+            "quality": self.quality,
+            "fps": self.fps,
+            "viewers": len(self.viewers),
+            "frames": self.frame_count,
+            "activeFrames": self.active_frames,
+            "idleFrames": self.idle_frames,
+            "pacing": self.pacer.stats(),
+            "viewerLatency": [latency for latency in (v.latency() for v in self.viewers) if latency],
+        }
+
+    def launch(self):
+        """Start the capture loop as a background task."""
+        self.running = True
+        self.task = asyncio.create_task(self.start())
+
+    def stop(self):
+        """Stop streaming."""
+        self.running = False
+
+
+class StreamHub:
+    """Runs at most one ScreenStreamer per (target, size, quality, mode, encoder, cursor) setting."""
+
+    def __init__(self, resample=Image.Resampling.BILINEAR,
+                 optimize=False, with_cursor=False, default_encoder='pillow-jpeg',
+                 source='mss', streamer_class=None, pointer='auto', linger=DEFAULT_LINGER):
+        self.source = source
+        # ScreenStreamer, or stream_worker.ProcessStreamer to encode in worker processes
+        self.streamer_class = streamer_class or ScreenStreamer
+        self.resample = resample
+        self.optimize = optimize
+        self.with_cursor = with_cursor
+        self.default_encoder = default_encoder
+        self.cursor_channel = CursorChannel(pointer)
+        self.linger = linger
+        self.streamers = {}
+
+    def subscribe(self, viewer: StreamViewer, width: int, height: int, quality: int) -> ScreenStreamer:
+        """Attach a viewer to the matching streamer, starting one if needed.
+
+        Mode, encoder, capture target and cursor mode come from the viewer.
+        A viewer already attached elsewhere is moved, which is how quality,
+        size and region changes are applied.
+        """
+        mode = viewer.mode
+        encoder = viewer.encoder or self.default_encoder
+        with_cursor = self.with_cursor if viewer.cursor is None else viewer.cursor == 'frame'
+        if viewer.cursor == 'channel':
+            self.cursor_channel.subscribe(viewer)
+        else:
+            self.cursor_channel.unsubscribe(viewer)
+        key = (viewer.target, width, height, quality, mode, encoder, with_cursor)
+        streamer = self.streamers.get(key)
+        if streamer is viewer.streamer and streamer is not None:
+            return streamer
+
+        self._detach(viewer)
+
+        if streamer is None or not streamer.running:
+            streamer = self.streamer_class(width, height, quality, viewer.target,
+                                           self.resample, self.optimize, with_cursor, mode,
+                                           encoder, self.source)
+            self.streamers[key] = streamer
+            streamer.viewers.add(viewer)
+            streamer.launch()
+            streamer.task.add_done_callback(lambda _: self._forget(key, streamer))
+        else:
+            streamer.viewers.add(viewer)
+            logger.info(f"👥 Viewer joined existing stream ({len(streamer.viewers)} viewers)")
+        STREAM_VIEWERS.set(len(streamer.viewers), stream=streamer.label)
+
+        viewer.streamer = streamer
+        # A delta viewer can only start drawing from a keyframe
+        viewer.resync()
+        viewer.start()
+        return streamer
+
+    def unsubscribe(self, viewer: StreamViewer, linger=False):
+        """Detach a viewer; its streamer stops once nobody is watching.
+
+        With linger (the client disconnected rather than stopped), an
+        unwatched streamer keeps running for self.linger seconds first.
+        """
+        if viewer.running:
+            logger.info(f"📤 Viewer sent {viewer.frame_count} frames, dropped {viewer.frames_dropped}")
+        viewer.stop()
+        self.cursor_channel.unsubscribe(viewer)
+        self._detach(viewer, linger)
+
+    def _detach(self, viewer: StreamViewer, linger=False):
+        streamer = viewer.streamer
+        viewer.streamer = None
+        if streamer is None:
+            return
+        streamer.viewers.discard(viewer)
+        STREAM_VIEWERS.set(len(streamer.viewers), stream=streamer.label)
+        if streamer.viewers:
+            return
+        if linger and self.linger > 0:
+            asyncio.get_running_loop().call_later(self.linger, self._stop_unwatched, streamer)
+        else:
+            streamer.stop()
+
+    def _stop_unwatched(self, streamer: ScreenStreamer):
+        if not streamer.viewers:
+            streamer.stop()
+
+    def _forget(self, key, streamer: ScreenStreamer):
+        if self.streamers.get(key) is streamer:
+            del self.streamers[key]
+
+    @property
+    def viewer_count(self) -> int:
+        return sum(len(s.viewers) for s in self.streamers.values())
+
+    def stats(self) -> list:
+        return [streamer.stats() for streamer in self.streamers.values()]
+
+    def stop_all(self):
+        """Stop every streamer (server shutdown)."""
+        self.cursor_channel.stop()
+        for streamer in list(self.streamers.values()):
+            streamer.stop()
+            if streamer.task:
+                streamer.task.cancel()
+        self.streamers.clear()
@@ -0,0 +1,70 @@
+"""
+Binary control frames: round trips, acks, and untrusted input.
+
+    python -m pytest test_control_protocol.py     (or python -m unittest test_control_protocol)
+"""
+import random
+import unittest
+import control_protocol
+from control_protocol import ACK, FLAG_ERROR, FRAME, OPCODES, ProtocolError, decode, encode, encode_ack
+
+
+class ControlProtocolTest(unittest.TestCase):
+
+    def test_every_opcode_round_trips(self):
+        for op in OPCODES.values():
+            frame = encode(op.command, seq=513, a=-7, b=32767)
+            self.assertEqual(len(frame), FRAME.size)
+            decoded, seq, cmd = decode(frame)
+            self.assertIs(decoded, op)
+            self.assertEqual(seq, 513)
+            self.assertEqual(cmd, {"command": op.command, **dict(zip(op.fields, (-7, 32767)))})
+
+    def test_move_and_volume_fields(self):
+        self.assertEqual(decode(encode('moveMouse', a=-32768, b=12))[2],
+                         {"command": "moveMouse", "dx": -32768, "dy": 12})
+        self.assertEqual(decode(encode('setVolume', a=80, b=5))[2], {"command": "setVolume", "value": 80})
+
+    def test_seq_wraps_at_16_bits(self):
+        self.assertEqual(decode(encode('togglePlayPause', seq=65537))[1], 1)
+
+    def test_ack_frames(self):
+        op = control_protocol.BY_COMMAND['getVolume']
+        code, flags, seq, a, b = FRAME.unpack(encode_ack(op, 42, value=65))
+        self.assertEqual((code, flags, seq, a, b), (ACK | op.code, 0, 42, 65, 0))
+        code, flags, *_ = FRAME.unpack(encode_ack(op, 42, ok=False))
+        self.assertEqual(flags, FLAG_ERROR)
+
+    def test_truncated_and_oversized_frames_are_refused(self):
+        frame = encode('mouseLeftClick', seq=1)
+        for data in (b'', frame[:1], frame[:-1], frame + b'\x00', frame * 2):
+            with self.assertRaises(ProtocolError):
+                decode(data)
+
+    def test_unknown_opcodes_are_refused(self):
+        known = set(OPCODES)
+        for code in [0x00, 0x0D, 0x7F, 0xFF] + [ACK | c for c in known]:
+            with self.assertRaises(ProtocolError) as raised:
+                decode(FRAME.pack(code, 0, 1, 0, 0))
+            self.assertIn(f"0x{code:02x}", str(raised.exception))
+
+    def test_random_bytes_decode_or_raise_protocol_error(self):
+        rng = random.Random(15)
+        for _ in range(2000):
+            data = bytes(rng.randrange(256) for _ in range(rng.choice((FRAME.size, rng.randrange(16)))))
+            try:
+                op, seq, cmd = decode(data)
+            except ProtocolError:
+                continue
+            self.assertIn(op.code, OPCODES)
+            self.assertEqual(cmd["command"], op.command)
+
+    def test_describe_matches_the_table(self):
+        description = control_protocol.describe()
+        self.assertEqual(description["frame"], FRAME.format)
+        self.assertEqual(set(description["opcodes"].values()), set(OPCODES))
+        self.assertEqual(set(description["fireAndForget"]), {"moveMouse", "setVolume"})
+
+
+if __name__ == "__main__":
+    unittest.main()
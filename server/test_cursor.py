@@ -0,0 +1,147 @@
+"""
+The cursor channel: pointer samples mapped into each viewer's frames.
+
+    python -m pytest test_cursor.py     (or python -m unittest test_cursor)
+"""
+import asyncio
+import base64
+import unittest
+from unittest import mock
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+import cursor
+from cursor import CursorChannel, CursorShape, PointerSource
+from screen_socket import ScreenSocket
+from sessions import ClientAuth, SessionStore
+from streaming import StreamHub, StreamViewer
+
+PASSWORD = 'test-password'
+ARROW = CursorShape('arrow', 32, 32, 4, 6, b'\x89PNG arrow')
+
+
+class FakePointer(PointerSource):
+    """A pointer parked at one spot, with an arrow shape."""
+
+    name = 'fake'
+    closed = 0
+
+    def position(self):
+        return 260, 140
+
+    def shape(self):
+        return ARROW
+
+    def close(self):
+        FakePointer.closed += 1
+
+
+class FakeSocket:
+    closed = False
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+class FakeStreamer:
+    capture_rect = (100, 50, 800, 400)  # screen area
+    frame_size = (400, 200)             # sent at half size
+
+
+class SendCursorTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.ws = FakeSocket()
+        self.viewer = StreamViewer(self.ws, hub=None)
+        self.viewer.streamer = FakeStreamer()
+
+    async def test_position_is_mapped_into_the_frame(self):
+        await self.viewer.send_cursor((500, 250), None)
+        self.assertEqual(self.ws.sent, [{"type": "cursor", "x": 200, "y": 100, "visible": True, "scale": 0.5}])
+
+        await self.viewer.send_cursor((500, 250), None)
+        self.assertEqual(len(self.ws.sent), 1)  # not moved: nothing sent
+
+        await self.viewer.send_cursor((90, 250), None)
+        await self.viewer.send_cursor((950, 460), None)  # still outside, still hidden
+        self.assertEqual(self.ws.sent[1:], [{"type": "cursor", "x": -5, "y": 100, "visible": False, "scale": 0.5}])
+
+    async def test_shape_is_sent_once_before_the_position(self):
+        await self.viewer.send_cursor((100, 50), ARROW)
+        await self.viewer.send_cursor((102, 52), ARROW)
+        shape, first, second = self.ws.sent
+        self.assertEqual(shape, {"type": "cursorShape", "width": 32, "height": 32, "hotX": 4, "hotY": 6,
+                                 "data": base64.b64encode(b'\x89PNG arrow').decode()})
+        self.assertEqual((first["x"], first["y"], second["x"], second["y"]), (0, 0, 1, 1))
+
+    async def test_nothing_is_sent_before_the_first_capture(self):
+        self.viewer.streamer.capture_rect = None
+        await self.viewer.send_cursor((500, 250), ARROW)
+        self.assertEqual(self.ws.sent, [])
+
+
+class CursorChannelTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_samples_reach_subscribers_until_the_last_leaves(self):
+        channel = CursorChannel('fake', rate=200)
+        received = asyncio.Queue()
+
+        class Viewer:
+            async def send_cursor(self, position, shape):
+                received.put_nowait((position, shape))
+
+        viewer = Viewer()
+        closed = FakePointer.closed
+        with mock.patch.dict(cursor.POINTERS, {'fake': FakePointer}):
+            channel.subscribe(viewer)
+            self.assertEqual(await asyncio.wait_for(received.get(), 1), ((260, 140), ARROW))
+            channel.unsubscribe(viewer)
+            await asyncio.wait_for(channel.task, 1)
+        # The pointer is closed on the channel's one worker thread
+        await asyncio.get_running_loop().run_in_executor(channel._executor, lambda: None)
+        self.assertEqual(FakePointer.closed, closed + 1)
+
+
+class CursorStreamTest(unittest.IsolatedAsyncioTestCase):
+    """cursor: 'channel' over the screen socket, with a region stream."""
+
+    async def asyncSetUp(self):
+        self.patch = mock.patch.dict(cursor.POINTERS, {'fake': FakePointer})
+        self.patch.start()
+        self.hub = StreamHub(source='synthetic:video:640x360', pointer='fake', linger=0)
+        app = web.Application()
+        app.router.add_get('/screen', ScreenSocket(self.hub, ClientAuth(PASSWORD, SessionStore())).handle)
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+        self.ws = await self.client.ws_connect('/screen')
+        await self.ws.send_json({"command": "auth", "password": PASSWORD})
+        await self.ws.receive_json()
+
+    async def asyncTearDown(self):
+        await self.ws.close()
+        self.hub.stop_all()
+        await self.client.close()
+        self.patch.stop()
+
+    async def receive_message(self, kind: str) -> dict:
+        while True:
+            msg = await self.ws.receive(timeout=5)
+            self.assertNotIn(msg.type, (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED))
+            if msg.type == aiohttp.WSMsgType.TEXT and msg.json()["type"] == kind:
+                return msg.json()
+
+    async def test_cursor_messages_follow_the_region(self):
+        await self.ws.send_json({"command": "startStream", "cursor": "channel",
+                                 "region": {"x": 100, "y": 50, "width": 320, "height": 180}})
+        self.assertEqual((await self.receive_message("streamStarted"))["cursor"], "channel")
+        shape = await self.receive_message("cursorShape")
+        self.assertEqual((shape["hotX"], shape["hotY"]), (4, 6))
+        self.assertEqual(await self.receive_message("cursor"),
+                         {"type": "cursor", "x": 160, "y": 90, "visible": True, "scale": 1.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
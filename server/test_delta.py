@@ -0,0 +1,112 @@
+"""
+Delta mode: the tile message format, and tiles that rebuild the captured frame.
+
+    python -m pytest test_delta.py     (or python -m unittest test_delta)
+"""
+import io
+import unittest
+from PIL import Image
+from delta import HEADER, TILE_HEADER, PendingTiles, TileEncoder, TileFrame, pack_tiles, unpack_tiles
+
+
+class PngEncoder:
+    """Lossless, so rebuilt frames can be compared pixel for pixel."""
+
+    def encode(self, img, quality):
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+
+def apply(picture: Image.Image, message: bytes) -> Image.Image:
+    """Draw a delta message's tiles in order, as clients do."""
+    frame = unpack_tiles(message)
+    if frame.keyframe:
+        picture = Image.new('RGB', (frame.width, frame.height))
+    for (x, y, w, h), data in frame.tiles.items():
+        tile = Image.open(io.BytesIO(data))
+        picture.paste(tile.convert('RGB'), (x, y))
+        assert tile.size == (w, h)
+    return picture
+
+
+class TileFormatTest(unittest.TestCase):
+
+    def test_pack_unpack_round_trip(self):
+        tiles = {(0, 0, 64, 64): b'first', (640, 64, 128, 64): b'', (0, 0, 32, 32): b'\xff' * 70000}
+        for keyframe in (True, False):
+            frame = unpack_tiles(pack_tiles(1280, 720, tiles, keyframe))
+            self.assertEqual((frame.width, frame.height, frame.keyframe), (1280, 720, keyframe))
+            self.assertEqual(list(frame.tiles.items()), list(tiles.items()))  # drawing order kept
+
+        empty = unpack_tiles(pack_tiles(2, 2, {}, False))
+        self.assertEqual(empty.tiles, {})
+
+    def test_message_layout(self):
+        message = pack_tiles(640, 360, {(64, 128, 192, 64): b'abc'}, True)
+        self.assertEqual(HEADER.unpack_from(message), (b'DT', 1, 0, 640, 360, 1))
+        self.assertEqual(TILE_HEADER.unpack_from(message, HEADER.size), (64, 128, 192, 64, 3))
+        self.assertEqual(message[HEADER.size + TILE_HEADER.size:], b'abc')
+
+    def test_not_a_delta_message(self):
+        message = pack_tiles(640, 360, {(0, 0, 8, 8): b'abcdef'}, False)
+        bad = (b'', message[:HEADER.size - 1], b'\xff\xd8' + message[2:],
+               message[:HEADER.size + 4], message[:-1])
+        for data in bad:
+            with self.assertRaises(ValueError):
+                unpack_tiles(data)
+
+
+class TileEncoderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = TileEncoder(PngEncoder(), tile_size=16, keyframe_interval=60)
+        self.first = Image.new('RGB', (100, 50), (40, 40, 40))
+
+    def encode(self, img: Image.Image) -> bytes:
+        frame = self.encoder.encode(img, 60)
+        return pack_tiles(frame.width, frame.height, frame.tiles, frame.keyframe)
+
+    def test_changed_tiles_rebuild_the_frame(self):
+        message = self.encode(self.first)
+        self.assertTrue(unpack_tiles(message).keyframe)
+        picture = apply(None, message)
+        self.assertEqual(picture.tobytes(), self.first.tobytes())
+
+        second = self.first.copy()
+        second.paste((200, 0, 0), (20, 2, 60, 10))   # three tiles on row 0: one strip
+        second.paste((0, 200, 0), (96, 40, 100, 50))  # two clipped corner tiles
+        frame = unpack_tiles(self.encode(second))
+        self.assertFalse(frame.keyframe)
+        self.assertEqual(list(frame.tiles), [(16, 0, 48, 16), (96, 32, 4, 16), (96, 48, 4, 2)])
+
+        picture = apply(picture, pack_tiles(frame.width, frame.height, frame.tiles, False))
+        self.assertEqual(picture.tobytes(), second.tobytes())
+
+    def test_unchanged_frame_has_no_tiles_and_big_changes_are_keyframes(self):
+        self.encode(self.first)
+        self.assertEqual(unpack_tiles(self.encode(self.first)).tiles, {})
+        self.assertTrue(unpack_tiles(self.encode(Image.new('RGB', (100, 50), 'white'))).keyframe)
+        # A new size always starts over
+        self.assertTrue(unpack_tiles(self.encode(Image.new('RGB', (60, 50), 'white'))).keyframe)
+
+
+class PendingTilesTest(unittest.TestCase):
+
+    def test_skipped_frames_are_merged_in_drawing_order(self):
+        pending = PendingTiles()
+        self.assertFalse(pending.merge(TileFrame(100, 50, {(0, 0, 16, 16): b'a'}, keyframe=False)))
+        self.assertIsNone(pending.take())  # nothing to draw on before a keyframe
+
+        pending.merge(TileFrame(100, 50, {(0, 0, 100, 50): b'key'}, keyframe=True))
+        pending.merge(TileFrame(100, 50, {(0, 0, 16, 16): b'old', (16, 0, 16, 16): b'b'}, keyframe=False))
+        pending.merge(TileFrame(100, 50, {(0, 0, 16, 16): b'new'}, keyframe=False))
+        frame = unpack_tiles(pending.take())
+        self.assertTrue(frame.keyframe)
+        self.assertEqual(list(frame.tiles.items()),
+                         [((0, 0, 100, 50), b'key'), ((16, 0, 16, 16), b'b'), ((0, 0, 16, 16), b'new')])
+        self.assertIsNone(pending.take())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+DevToolsChannel against the stand-in browser: evaluate, errors, timeouts, reconnects.
+
+    python -m pytest test_devtools.py     (or python -m unittest test_devtools)
+"""
+import asyncio
+import unittest
+from unittest import mock
+from aiohttp.test_utils import TestServer
+import devtools
+from devtools import PLAYER_PROBE, BrowserError, DevToolsChannel, StandInBrowser
+
+NEXT_EPISODE = "window.changeEpisode('next')"
+
+
+class DevToolsChannelTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.browser = StandInBrowser()
+        self.server = TestServer(self.browser.app())
+        await self.server.start_server()
+        self.channel = DevToolsChannel(str(self.server.make_url('/')))
+        await self.channel.start()
+
+    async def asyncTearDown(self):
+        await self.channel.close()
+        await self.server.close()
+
+    async def test_evaluate_runs_in_the_player_tab(self):
+        self.assertTrue(self.channel.connected)
+        self.assertEqual(self.channel.tab_url, 'http://localhost:8080/video')
+        self.assertIs(await self.channel.evaluate(PLAYER_PROBE), True)
+        self.assertIsNone(await self.channel.evaluate(NEXT_EPISODE))
+        self.assertEqual(self.browser.episode, 2)
+        self.assertEqual(self.browser.connections, 1)  # one socket for every call
+
+    async def test_script_and_protocol_errors_raise_browser_error(self):
+        with self.assertRaisesRegex(BrowserError, "Script failed: ReferenceError: player"):
+            await self.channel.evaluate("throw ReferenceError: player")
+        with self.assertRaisesRegex(BrowserError, "'Page.navigate' wasn't found"):
+            await self.channel.send('Page.navigate')
+        # The channel is still usable
+        await self.channel.evaluate(NEXT_EPISODE)
+        self.assertEqual(self.browser.episode, 2)
+
+    async def test_slow_evaluate_times_out(self):
+        self.browser.latency = 0.5
+        with self.assertRaisesRegex(BrowserError, "Runtime.evaluate timed out"):
+            await self.channel.evaluate(NEXT_EPISODE, timeout=0.05)
+        self.assertEqual(self.channel._pending, {})
+
+    async def test_evaluate_threadsafe_from_a_worker_thread(self):
+        await asyncio.to_thread(self.channel.evaluate_threadsafe, NEXT_EPISODE)
+        self.assertEqual(self.browser.episode, 2)
+
+        with self.assertRaisesRegex(BrowserError, "Script failed"):
+            await asyncio.to_thread(self.channel.evaluate_threadsafe, "throw Error: boom")
+
+    async def test_stalled_evaluate_threadsafe_raises_browser_error(self):
+        cancelled = asyncio.Event()
+
+        async def stalled(expression, timeout):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with mock.patch.object(devtools, 'CONNECT_TIMEOUT', 0.05), \
+                mock.patch.object(self.channel, 'evaluate', stalled):
+            with self.assertRaisesRegex(BrowserError, "DevTools evaluation timed out"):
+                await asyncio.to_thread(self.channel.evaluate_threadsafe, NEXT_EPISODE, 0.05)
+        # The coroutine left behind on the loop is cancelled, not leaked
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+    async def test_reconnects_after_the_browser_drops_the_tab(self):
+        await self.channel.evaluate(NEXT_EPISODE)
+        await self.browser.drop()
+        await self.channel.evaluate(NEXT_EPISODE)
+        self.assertEqual(self.browser.episode, 3)
+        self.assertEqual(self.browser.connections, 2)
+        self.assertTrue(self.channel.connected)
+
+    async def test_browser_gone_raises_browser_error(self):
+        await self.browser.drop()
+        await self.server.close()
+        with self.assertRaisesRegex(BrowserError, "no DevTools endpoint"):
+            await self.channel.evaluate(NEXT_EPISODE)
+        self.assertFalse(self.channel.connected)
+
+    async def test_not_started_channel_refuses_threadsafe_calls(self):
+        with self.assertRaisesRegex(BrowserError, "not started"):
+            DevToolsChannel('http://127.0.0.1:1').evaluate_threadsafe('1')
+
+
+if __name__ == "__main__":
+    unittest.main()
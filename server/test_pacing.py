@@ -0,0 +1,68 @@
+"""
+FramePacer on a fake clock: every call gets its time passed in.
+
+    python -m pytest test_pacing.py     (or python -m unittest test_pacing)
+"""
+import unittest
+from pacing import FramePacer
+
+
+class FramePacerTest(unittest.TestCase):
+
+    def start(self, pacer: FramePacer, now: float) -> float:
+        """schedule() at now, then start the frame when it says; the start time."""
+        start = now + pacer.schedule(now)
+        pacer.started(start)
+        return start
+
+    def test_steady_frames_start_on_the_grid(self):
+        pacer = FramePacer(10)
+        self.assertEqual(self.start(pacer, 5.0), 5.0)
+        for n in range(1, 6):
+            # Each frame took 30 ms; the next still starts on the 100 ms grid
+            start = self.start(pacer, pacer.last_start + 0.03)
+            self.assertAlmostEqual(start, 5.0 + n * 0.1)
+
+        stats = pacer.stats()
+        self.assertEqual((stats["frames"], stats["overruns"], stats["skipped"]), (6, 0, 0))
+        self.assertAlmostEqual(stats["actualFps"], 10.0)
+        self.assertAlmostEqual(stats["jitterMaxMs"], 0.0)
+
+    def test_overrun_skips_missed_slots_and_rejoins_the_grid(self):
+        pacer = FramePacer(10)
+        self.start(pacer, 0.0)
+        # The first frame took 250 ms: slot 0.1 is missed and 0.2 is late
+        self.assertEqual(pacer.schedule(0.25), 0.0)
+        self.assertEqual((pacer.overruns, pacer.skipped), (1, 1))
+        jitter = pacer.started(0.25)
+        self.assertAlmostEqual(jitter, 0.05)  # 250 ms against two 100 ms slots
+
+        # Back on time: the next start is the grid's 0.3, not 0.35
+        self.assertAlmostEqual(self.start(pacer, 0.26), 0.3)
+        self.assertEqual((pacer.overruns, pacer.skipped), (1, 1))
+
+    def test_late_frame_within_a_slot_starts_at_once(self):
+        pacer = FramePacer(10)
+        self.start(pacer, 0.0)
+        self.assertEqual(pacer.schedule(0.13), 0.0)
+        self.assertEqual((pacer.overruns, pacer.skipped), (1, 0))
+        pacer.started(0.13)
+        self.assertAlmostEqual(self.start(pacer, 0.14), 0.2)
+
+    def test_set_fps_reanchors_on_the_last_start(self):
+        pacer = FramePacer(10)
+        self.start(pacer, 0.0)
+        self.start(pacer, 0.13)  # late for its 0.1 deadline
+        pacer.set_fps(20)
+        self.assertEqual(pacer.interval, 0.05)
+        # One new interval after the last start, not after the old 0.1 deadline
+        self.assertAlmostEqual(self.start(pacer, 0.14), 0.18)
+        self.assertAlmostEqual(self.start(pacer, 0.19), 0.23)
+
+        pacer.set_fps(5)
+        self.assertAlmostEqual(self.start(pacer, 0.24), 0.43)
+        self.assertEqual(pacer.overruns, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
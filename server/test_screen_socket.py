@@ -0,0 +1,115 @@
+"""
+The screen WebSocket endpoint against a synthetic source, over a real socket.
+
+    python -m pytest test_screen_socket.py     (or python -m unittest test_screen_socket)
+"""
+import unittest
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from screen_socket import ScreenSocket
+from sessions import ClientAuth, SessionStore
+from streaming import StreamHub
+
+PASSWORD = 'test-password'
+SOURCE = 'synthetic:video:640x360'
+
+
+class ScreenSocketTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.hub = StreamHub(source=SOURCE, pointer='none', linger=0)
+        app = web.Application()
+        app.router.add_get('/screen', ScreenSocket(self.hub, ClientAuth(PASSWORD, SessionStore())).handle)
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+        self.ws = await self.client.ws_connect('/screen')
+        await self.ws.send_json({"command": "auth", "password": PASSWORD})
+        self.assertEqual((await self.ws.receive_json())["type"], "authSuccess")
+
+    async def asyncTearDown(self):
+        await self.ws.close()
+        self.hub.stop_all()
+        await self.client.close()
+
+    async def receive_message(self, kind: str) -> dict:
+        """The next JSON message of a type, skipping frames and keepalives."""
+        while True:
+            msg = await self.ws.receive(timeout=5)
+            self.assertNotIn(msg.type, (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED))
+            if msg.type == aiohttp.WSMsgType.TEXT and msg.json()["type"] == kind:
+                return msg.json()
+
+    async def receive_frame(self) -> bytes:
+        while True:
+            msg = await self.ws.receive(timeout=5)
+            self.assertNotIn(msg.type, (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED))
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                return msg.data
+
+    async def start(self, **settings) -> dict:
+        await self.ws.send_json({"command": "startStream", "fps": 30, **settings})
+        return await self.receive_message("streamStarted")
+
+    async def test_bad_frame_ack_is_answered_and_the_stream_keeps_running(self):
+        await self.start()
+        await self.receive_frame()
+        await self.ws.send_json({"command": "frameAck", "frame": "three"})
+        self.assertEqual((await self.receive_message("error"))["message"], "Invalid frame: 'three'")
+        await self.ws.send_json({"command": "frameAck", "frame": [1]})
+        await self.receive_message("error")
+        await self.receive_frame()
+
+        # A numeric string is still a frame number, and its latency is measured
+        await self.ws.send_json({"command": "frameAck", "frame": "0"})
+        await self.ws.send_json({"command": "getStreamStatus"})
+        status = await self.receive_message("streamStatus")
+        self.assertEqual(status["latency"]["samples"], 1)
+
+    async def test_bad_quality_is_answered_and_the_stream_keeps_running(self):
+        await self.ws.send_json({"command": "startStream", "quality": "high"})
+        self.assertEqual((await self.receive_message("error"))["message"], "Invalid quality: 'high'")
+        await self.ws.send_json({"command": "startStream", "minQuality": "low"})
+        self.assertEqual((await self.receive_message("error"))["message"], "Invalid quality: 'low'")
+
+        await self.start(quality=500, adaptive=False)
+        await self.ws.send_json({"command": "setQuality", "quality": "x"})
+        await self.receive_message("error")
+        await self.receive_frame()
+        await self.ws.send_json({"command": "getStreamStatus"})
+        self.assertEqual((await self.receive_message("streamStatus"))["quality"], 100)
+
+        await self.ws.send_json({"command": "setQuality", "quality": 0})
+        await self.ws.send_json({"command": "getStreamStatus"})
+        self.assertEqual((await self.receive_message("streamStatus"))["quality"], 1)
+
+    async def test_regions_report_the_size_frames_are_sent_at(self):
+        started = await self.start(region={"x": 0, "y": 0, "width": 100, "height": 100})
+        self.assertEqual((started["width"], started["height"]), (100, 100))
+        started = await self.start(region={"x": 0, "y": 0, "width": 400, "height": 200}, width=200)
+        self.assertEqual((started["width"], started["height"]), (200, 100))
+        # Clipped to the 640x360 source
+        started = await self.start(region={"x": 600, "y": 0, "width": 100, "height": 50})
+        self.assertEqual((started["width"], started["height"]), (40, 50))
+
+        await self.ws.send_json({"command": "setRegion", "region": {"x": 10, "y": 10, "width": 320, "height": 90}})
+        status = await self.receive_message("streamStatus")
+        self.assertEqual((status["width"], status["height"]), (320, 90))
+
+        # The full screen is scaled to the requested size
+        started = await self.start(width=320, height=180)
+        self.assertEqual((started["width"], started["height"]), (320, 180))
+        await self.receive_frame()
+        await self.ws.send_json({"command": "getStreamStatus"})
+        status = await self.receive_message("streamStatus")
+        self.assertEqual((status["width"], status["height"]), (320, 180))
+
+    async def test_off_screen_region_is_refused_before_streaming(self):
+        await self.ws.send_json({"command": "startStream",
+                                 "region": {"x": 5000, "y": 0, "width": 100, "height": 100}})
+        self.assertIn("off screen", (await self.receive_message("error"))["message"])
+        self.assertEqual(self.hub.streamers, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
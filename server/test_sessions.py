@@ -0,0 +1,104 @@
+"""
+Session tokens and ClientAuth: signing, expiry, resume and bearer auth.
+
+    python -m pytest test_sessions.py     (or python -m unittest test_sessions)
+"""
+import unittest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from sessions import ClientAuth, SessionStore
+
+SECRET = 'test-secret'
+PASSWORD = 'test-password'
+
+
+class SessionStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = SessionStore(SECRET)
+
+    def test_valid_token_resumes_its_session(self):
+        session = self.store.create()
+        session.remember({"command": "startStream", "fps": 15})
+        token = self.store.token(session)
+
+        self.assertTrue(self.store.valid(token))
+        resumed = self.store.resume(token)
+        self.assertIs(resumed, session)
+        self.assertEqual(resumed.stream["fps"], 15)
+
+    def test_token_outlives_a_restart_with_the_same_secret(self):
+        token = self.store.token(self.store.create())
+        restarted = SessionStore(SECRET)
+        session = restarted.resume(token)
+        self.assertIsNotNone(session)
+        self.assertIsNone(session.stream)  # settings were only in memory
+        self.assertIsNone(SessionStore('another-secret').resume(token))
+
+    def test_tampered_token_is_refused(self):
+        token = self.store.token(self.store.create())
+        session_id, expires, signature = token.split('.')
+        flipped = ('A' if signature[0] != 'A' else 'B') + signature[1:]
+        for bad in (f"{session_id}.{expires}.{flipped}",
+                    f"{session_id}.{int(expires) + 3600}.{signature}",
+                    f"other.{expires}.{signature}"):
+            self.assertFalse(self.store.valid(bad), bad)
+            self.assertIsNone(self.store.resume(bad), bad)
+
+    def test_expired_token_is_refused_and_forgotten(self):
+        store = SessionStore(SECRET, ttl=-10)
+        session = store.create()
+        token = store.token(session)
+        self.assertFalse(store.valid(token))
+        self.assertIsNone(store.resume(token))
+        self.assertNotIn(session.id, store.sessions)
+
+    def test_malformed_tokens_are_refused(self):
+        session = self.store.create()
+        for bad in (f"{session.id}.{session.expires}", "", "...", "a.b.c", "é.1.x", None, 42, ["a", "b"]):
+            self.assertFalse(self.store.valid(bad), bad)
+            self.assertIsNone(self.store.resume(bad), bad)
+
+    def test_least_recently_used_sessions_are_dropped(self):
+        store = SessionStore(SECRET, max_sessions=2)
+        first, _ = store.create(), store.create()
+        store.resume(store.token(first))  # now the most recently used
+        third = store.create()
+        self.assertEqual(set(store.sessions), {first.id, third.id})
+
+
+class RequireTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.auth = ClientAuth(PASSWORD, SessionStore(SECRET))
+
+        async def handler(request):
+            return web.Response(text='metrics')
+
+        app = web.Application()
+        app.router.add_get('/metrics', self.auth.require(handler))
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def status(self, authorization: str | None) -> int:
+        headers = {'Authorization': authorization} if authorization is not None else {}
+        async with self.client.get('/metrics', headers=headers) as resp:
+            return resp.status
+
+    async def test_bearer_password_or_session_token(self):
+        token = self.auth.sessions.token(self.auth.sessions.create())
+        self.assertEqual(await self.status(f'Bearer {PASSWORD}'), 200)
+        self.assertEqual(await self.status(f'bearer {token}'), 200)
+
+    async def test_anything_else_is_unauthorized(self):
+        expired = SessionStore(SECRET, ttl=-10)
+        for authorization in (None, '', 'Bearer', 'Bearer nope', f'Basic {PASSWORD}', PASSWORD,
+                              f'Bearer {PASSWORD}x', f'Bearer {expired.token(expired.create())}'):
+            self.assertEqual(await self.status(authorization), 401, authorization)
+
+
+if __name__ == "__main__":
+    unittest.main()
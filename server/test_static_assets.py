@@ -0,0 +1,130 @@
+"""
+StaticAssets over HTTP: ETags and 304s, Cache-Control, and br/gzip negotiation.
+
+    python -m pytest test_static_assets.py     (or python -m unittest test_static_assets)
+"""
+import gzip
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+import static_assets
+from static_assets import IMMUTABLE, REVALIDATE, StaticAssets
+
+SCRIPT = b'export const hello = "world";\n' * 100  # compressible, over COMPRESS_MIN_SIZE
+STYLE = b'body { margin: 0; }\n' * 100
+IMAGE = b'\x89PNG' + bytes(range(256)) * 8
+
+
+class StaticAssetsTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        (root / 'assets').mkdir()
+        (root / 'index.html').write_bytes(b'<!doctype html>' + b'<p>hi</p>' * 200)
+        (root / 'assets' / 'app-1a2b3c.js').write_bytes(SCRIPT)
+        (root / 'logo.png').write_bytes(IMAGE)
+        # Variants shipped by the build are served as they are
+        (root / 'style.css').write_bytes(STYLE)
+        (root / 'style.css.br').write_bytes(b'shipped brotli')
+        (root / 'style.css.gz').write_bytes(gzip.compress(STYLE))
+
+        self.assets = StaticAssets(root)
+        self.assets.scan()
+
+        async def handler(request):
+            return self.assets.response(request, request.match_info['path'])
+
+        app = web.Application()
+        app.router.add_get('/{path:.*}', handler)
+        # Keep bodies as sent, to check which variant was picked
+        self.client = TestClient(TestServer(app), auto_decompress=False)
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        self.tmp.cleanup()
+
+    async def get(self, path: str, **headers) -> tuple:
+        """(status, headers, body) for one request; uncompressed unless asked."""
+        headers.setdefault('Accept-Encoding', 'identity')
+        async with self.client.get(path, headers=headers) as resp:
+            return resp.status, resp.headers, await resp.read()
+
+    async def test_etag_is_answered_with_304(self):
+        status, headers, body = await self.get('/index.html')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Cache-Control'], REVALIDATE)
+        etag = headers['ETag']
+
+        for if_none_match in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            status, headers, body = await self.get('/index.html', **{'If-None-Match': if_none_match})
+            self.assertEqual(status, 304, if_none_match)
+            self.assertEqual(headers['ETag'], etag)
+            self.assertEqual(body, b'')
+
+        status, _, body = await self.get('/index.html', **{'If-None-Match': '"stale"'})
+        self.assertEqual(status, 200)
+        self.assertTrue(body.startswith(b'<!doctype html>'))
+
+    async def test_each_encoding_has_its_own_etag(self):
+        _, plain, _ = await self.get('/assets/app-1a2b3c.js')
+        _, gzipped, _ = await self.get('/assets/app-1a2b3c.js', **{'Accept-Encoding': 'gzip'})
+        self.assertNotEqual(plain['ETag'], gzipped['ETag'])
+        self.assertEqual(plain['Cache-Control'], IMMUTABLE)
+
+        # A cached identity body does not satisfy a gzip request, and vice versa
+        status, headers, _ = await self.get('/assets/app-1a2b3c.js', **{
+            'Accept-Encoding': 'gzip', 'If-None-Match': plain['ETag']})
+        self.assertEqual((status, headers['Content-Encoding']), (200, 'gzip'))
+        status, _, _ = await self.get('/assets/app-1a2b3c.js', **{
+            'Accept-Encoding': 'gzip', 'If-None-Match': gzipped['ETag']})
+        self.assertEqual(status, 304)
+
+    async def test_gzip_is_built_for_compressible_files(self):
+        status, headers, body = await self.get('/assets/app-1a2b3c.js', **{'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(body), SCRIPT)
+
+        _, headers, body = await self.get('/assets/app-1a2b3c.js')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, SCRIPT)
+
+    async def test_shipped_brotli_is_preferred_over_gzip(self):
+        _, headers, body = await self.get('/style.css', **{'Accept-Encoding': 'gzip, deflate, br'})
+        self.assertEqual((headers['Content-Encoding'], body), ('br', b'shipped brotli'))
+
+        _, headers, body = await self.get('/style.css', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), STYLE)
+
+    async def test_images_are_not_compressed(self):
+        _, headers, body = await self.get('/logo.png', **{'Accept-Encoding': 'gzip, br'})
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertNotIn('Vary', headers)
+        self.assertEqual(body, IMAGE)
+
+    async def test_large_files_are_sent_from_disk_with_the_same_etag(self):
+        _, in_memory, _ = await self.get('/logo.png')
+        with mock.patch.object(static_assets, 'MEMORY_LIMIT', 1024):
+            self.assets.scan()
+        self.assertIsNone(self.assets.assets['logo.png'].body)
+
+        status, headers, body = await self.get('/logo.png')
+        self.assertEqual((status, body), (200, IMAGE))
+        self.assertEqual(headers['ETag'], in_memory['ETag'])
+        status, _, _ = await self.get('/logo.png', **{'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 304)
+
+    async def test_unknown_path_is_404(self):
+        status, _, _ = await self.get('/missing.js')
+        self.assertEqual(status, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Cached output volume for the /ws control endpoint.
+
+Reading or setting the volume costs a round trip to the input backend
+(a subprocess per call before the persistent workers). A volume slider
+drag fires setVolume on every tick, and each used to be followed by a
+read. VolumeService instead:
+
+- keeps the last known level in memory and answers auth and getVolume
+  from it
+- coalesces setVolume: at most one apply per APPLY_INTERVAL, always with
+  the latest requested level; older requests are never applied
+- re-reads the real level every REFRESH_INTERVAL (the volume keys on the
+  machine can change it) or on demand
+- pushes volumeUpdate to every subscribed client once a set has settled
+  or a refresh found a change
+"""
+import asyncio
+import logging
+import time
+from metrics import VOLUME_REQUESTS, VOLUME_APPLIES
+
+logger = logging.getLogger(__name__)
+
+APPLY_INTERVAL = 0.1     # seconds between two applies during a drag
+REFRESH_INTERVAL = 30.0  # seconds between reads of the real level
+DEFAULT_VOLUME = 50      # reported until the first read succeeds
+
+
+class VolumeService:
+    """Last known volume, debounced sets and volumeUpdate broadcasts."""
+
+    def __init__(self, backend, call, refresh_interval=REFRESH_INTERVAL):
+        self.backend = backend
+        self.call = call  # async call(func, *args), runs func off the loop
+        self.refresh_interval = refresh_interval
+        self.level = None
+        self.clients = set()
+        self.requests = 0
+        self.applies = 0
+        self._target = None  # latest requested level not yet applied
+        self._apply_task = None
+
+    def subscribe(self, ws):
+        self.clients.add(ws)
+
+    def unsubscribe(self, ws):
+        self.clients.discard(ws)
+
+    async def get(self) -> int:
+        """The cached level, read once if still unknown."""
+        if self.level is None:
+            await self.refresh()
+        return self.level if self.level is not None else DEFAULT_VOLUME
+
+    def set(self, level: int) -> int:
+        """Request a level; applied shortly, coalesced with later requests."""
+        level = max(0, min(100, int(level)))
+        self.requests += 1
+        VOLUME_REQUESTS.inc()
+        self._target = level
+        self.level = level  # optimistic until the backend confirms
+        if self._apply_task is None or self._apply_task.done():
+            self._apply_task = asyncio.create_task(self._apply())
+        return level
+
+    async def refresh(self, broadcast=True):
+        """Read the real level; broadcast it if it changed."""
+        try:
+            level = await self.call(self.backend.get_volume)
+        except Exception as e:
+            logger.error(f'❌ Failed to get volume: {e}')
+            return
+        if self._target is not None:
+            return  # a set is in flight; its result wins
+        changed = level != self.level
+        self.level = level
+        if changed and broadcast:
+            await self.broadcast()
+
+    async def broadcast(self):
+        message = {"type": "volumeUpdate", "volume": self.level}
+        for ws in list(self.clients):
+            try:
+                await ws.send_json(message)
+            except Exception:
+                self.clients.discard(ws)
+
+    async def run(self):
+        """Background task: periodic refresh while someone is connected."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            if self.clients and (self._apply_task is None or self._apply_task.done()):
+                await self.refresh()
+
+    async def _apply(self):
+        while self._target is not None:
+            target = self._target
+            start = time.monotonic()
+            try:
+                actual = await self.call(self.backend.set_volume, target)
+            except Exception as e:
+                logger.error(f'❌ Failed to set volume: {e}')
+                actual = None
+            self.applies += 1
+            VOLUME_APPLIES.inc()
+
+            if self._target == target:
+                # Settled: nothing newer was requested meanwhile
+                self._target = None
+                if actual is not None:
+                    self.level = actual
+                logger.info(f'🔊 Volume set to {self.level}% '
+                            f'({self.requests} requests, {self.applies} applied)')
+                await self.broadcast()
+                return
+
+            await asyncio.sleep(max(APPLY_INTERVAL - (time.monotonic() - start), 0))
@@ -11,6 +11,8 @@ import {
   MousePointer,
   MousePointerClick,
   Settings,
+  Layers,
+  Navigation,
   X,
 } from "lucide-react";
 
@@ -20,6 +22,84 @@ interface ScreenMirrorProps {
 }
 
 type ConnectionState = "disconnected" | "connecting" | "streaming" | "failed";
+type StreamMode = "jpeg" | "delta";
+
+interface Tile {
+  x: number;
+  y: number;
+  w: number;
+  h: number;
+  start: number; // image bytes, within the message
+  end: number;
+}
+
+// Cursor channel messages (server/cursor.py), in frame pixels
+interface CursorState {
+  x: number;
+  y: number;
+  visible: boolean;
+  scale: number; // screen pixels (the shape) to frame pixels
+}
+
+interface CursorShape {
+  image: HTMLImageElement;
+  width: number;
+  height: number;
+  hotX: number;
+  hotY: number;
+}
+
+interface TileMessage {
+  keyframe: boolean;
+  width: number;
+  height: number;
+  tiles: Tile[];
+}
+
+// Delta mode message (server/delta.py): '<2sBBHHH' header (magic "DT",
+// flags, reserved, width, height, tile count), then per tile '<HHHHI'
+// (x, y, w, h, image length) and the image bytes
+const DELTA_HEADER_SIZE = 10;
+const DELTA_TILE_HEADER_SIZE = 12;
+
+function parseTiles(buffer: ArrayBuffer): TileMessage {
+  const bytes = new Uint8Array(buffer);
+  const view = new DataView(buffer);
+  if (
+    bytes.length < DELTA_HEADER_SIZE ||
+    bytes[0] !== 0x44 ||
+    bytes[1] !== 0x54
+  ) {
+    throw new Error("Not a delta message");
+  }
+  const message: TileMessage = {
+    keyframe: (bytes[2] & 1) === 1,
+    width: view.getUint16(4, true),
+    height: view.getUint16(6, true),
+    tiles: [],
+  };
+  let offset = DELTA_HEADER_SIZE;
+  for (let count = view.getUint16(8, true); count > 0; count--) {
+    if (offset + DELTA_TILE_HEADER_SIZE > bytes.length) {
+      throw new Error("Truncated delta message");
+    }
+    const length = view.getUint32(offset + 8, true);
+    const start = offset + DELTA_TILE_HEADER_SIZE;
+    if (start + length > bytes.length) {
+      throw new Error("Truncated delta message");
+    }
+    message.tiles.push({
+      x: view.getUint16(offset, true),
+      y: view.getUint16(offset + 2, true),
+      w: view.getUint16(offset + 4, true),
+      h: view.getUint16(offset + 6, true),
+      start,
+      end: start + length,
+    });
+    offset = start + length;
+  }
+  return message;
+}
 
 export default function ScreenMirror({
   serverUrl,
@@ -33,8 +113,16 @@ export default function ScreenMirror({
   const [showControls, setShowControls] = useState(true);
   const [stats, setStats] = useState({ fps: 0, frames: 0 });
   const [quality, setQuality] = useState(60);
+  // Delta mode sends only the screen areas that changed
+  const [deltaMode, setDeltaMode] = useState(false);
+  const [streamMode, setStreamMode] = useState<StreamMode>("jpeg");
+  // Cursor channel: the pointer is sent apart from the frames and drawn on top
+  const [cursorChannel, setCursorChannel] = useState(false);
+  const [streamCursor, setStreamCursor] = useState("frame");
 
   const imgRef = useRef<HTMLImageElement>(null);
+  const canvasRef = useRef<HTMLCanvasElement>(null); // delta mode picture
+  const cursorCanvasRef = useRef<HTMLCanvasElement>(null);
   const containerRef = useRef<HTMLDivElement>(null);
   const screenWsRef = useRef<WebSocket | null>(null);
   const controlWsRef = useRef<WebSocket | null>(null);
@@ -42,6 +130,93 @@ export default function ScreenMirror({
   const frameCountRef = useRef(0);
   const startTimeRef = useRef<number | null>(null);
   const blobUrlRef = useRef<string | null>(null); // For binary frame URLs
+  const streamModeRef = useRef<StreamMode>("jpeg");
+  const mimeRef = useRef("image/jpeg");
+  const syncedRef = useRef(false); // delta: a keyframe has been drawn
+  const resyncingRef = useRef(false); // delta: a keyframe was asked for
+  const drawingRef = useRef<Promise<void>>(Promise.resolve()); // in arrival order
+  const cursorRef = useRef<CursorState | null>(null);
+  const cursorShapeRef = useRef<CursorShape | null>(null);
+
+  // The cursor canvas has the frame's size and is fitted like it, so
+  // positions in frame pixels can be drawn as they are
+  const drawCursor = useCallback(() => {
+    const overlay = cursorCanvasRef.current;
+    const frame = canvasRef.current ?? imgRef.current;
+    if (!overlay || !frame) {
+      return;
+    }
+    const width =
+      frame instanceof HTMLCanvasElement ? frame.width : frame.naturalWidth;
+    const height =
+      frame instanceof HTMLCanvasElement ? frame.height : frame.naturalHeight;
+    if (overlay.width !== width || overlay.height !== height) {
+      overlay.width = width;
+      overlay.height = height;
+    }
+    const context = overlay.getContext("2d");
+    const cursor = cursorRef.current;
+    if (!context) {
+      return;
+    }
+    context.clearRect(0, 0, overlay.width, overlay.height);
+    if (!cursor || !cursor.visible) {
+      return;
+    }
+
+    const shape = cursorShapeRef.current;
+    if (shape && shape.image.complete) {
+      context.drawImage(
+        shape.image,
+        cursor.x - shape.hotX * cursor.scale,
+        cursor.y - shape.hotY * cursor.scale,
+        shape.width * cursor.scale,
+        shape.height * cursor.scale,
+      );
+    } else {
+      // No shape from this platform: a dot
+      context.beginPath();
+      context.arc(
+        cursor.x,
+        cursor.y,
+        Math.max(3, 6 * cursor.scale),
+        0,
+        2 * Math.PI,
+      );
+      context.fillStyle = "white";
+      context.fill();
+      context.strokeStyle = "black";
+      context.stroke();
+    }
+  }, []);
+
+  // Draw a delta message on top of the last picture; a keyframe covers it all
+  const drawTiles = useCallback(async (blob: Blob) => {
+    const message = parseTiles(await blob.arrayBuffer());
+    const canvas = canvasRef.current;
+    if (!canvas || (!message.keyframe && !syncedRef.current)) {
+      return false;
+    }
+    const images = await Promise.all(
+      message.tiles.map((tile) =>
+        createImageBitmap(blob.slice(tile.start, tile.end, mimeRef.current)),
+      ),
+    );
+    if (message.keyframe) {
+      if (canvas.width !== message.width || canvas.height !== message.height) {
+        canvas.width = message.width;
+        canvas.height = message.height;
+      }
+      syncedRef.current = true;
+      resyncingRef.current = false;
+    }
+    const context = canvas.getContext("2d");
+    message.tiles.forEach((tile, i) => {
+      context?.drawImage(images[i], tile.x, tile.y, tile.w, tile.h);
+      images[i].close();
+    });
+    return true;
+  }, []);
 
   // Build screen server WebSocket URL (uses /screen endpoint on same server)
   const getScreenWsUrl = useCallback(() => {
@@ -85,7 +260,48 @@ export default function ScreenMirror({
 
       ws.binaryType = "blob"; // Receive binary frames as Blob
 
+      const countFrame = () => {
+        frameCountRef.current++;
+
+        // Update FPS stats
+        if (startTimeRef.current) {
+          const elapsed = (Date.now() - startTimeRef.current) / 1000;
+          const fps = frameCountRef.current / elapsed;
+          setStats({
+            fps: Math.round(fps),
+            frames: frameCountRef.current,
+          });
+        }
+      };
+
+      // Delta mode: ask for a keyframe to draw the next tiles on
+      const resync = () => {
+        if (!resyncingRef.current && ws.readyState === WebSocket.OPEN) {
+          resyncingRef.current = true;
+          ws.send(JSON.stringify({ command: "resync" }));
+        }
+      };
+
       ws.onmessage = (event) => {
+        // Delta mode: changed tiles, drawn one message after the other
+        if (event.data instanceof Blob && streamModeRef.current === "delta") {
+          const blob = event.data;
+          drawingRef.current = drawingRef.current
+            .then(async () => {
+              // Nothing to draw on yet, e.g. the keyframe came before the canvas
+              if (!(await drawTiles(blob))) resync();
+              else if (cursorRef.current) drawCursor();
+            })
+            .catch((e) => {
+              console.warn("Undrawable delta message, resyncing:", e);
+              syncedRef.current = false;
+              resyncingRef.current = false;
+              resync();
+            });
+          countFrame();
+          return;
+        }
+
         // Handle binary frames (JPEG images)
         if (event.data instanceof Blob) {
           // Revoke previous blob URL to prevent memory leak
@@ -98,17 +314,7 @@ export default function ScreenMirror({
           if (imgRef.current) {
             imgRef.current.src = url;
           }
-          frameCountRef.current++;
-
-          // Update FPS stats
-          if (startTimeRef.current) {
-            const elapsed = (Date.now() - startTimeRef.current) / 1000;
-            const fps = frameCountRef.current / elapsed;
-            setStats({
-              fps: Math.round(fps),
-              frames: frameCountRef.current,
-            });
-          }
+          countFrame();
           return;
         }
 
@@ -127,6 +333,8 @@ export default function ScreenMirror({
                   height: 720,
                   fps: 30,
                   quality: quality,
+                  mode: deltaMode ? "delta" : "jpeg",
+                  cursor: cursorChannel ? "channel" : undefined,
                 }),
               );
               break;
@@ -138,6 +346,13 @@ export default function ScreenMirror({
 
             case "streamStarted":
               console.log("Stream started:", data);
+              streamModeRef.current = data.mode;
+              mimeRef.current = data.mime;
+              syncedRef.current = false;
+              resyncingRef.current = false;
+              cursorRef.current = null;
+              setStreamMode(data.mode);
+              setStreamCursor(data.cursor);
               setConnectionState("streaming");
               frameCountRef.current = 0;
               startTimeRef.current = Date.now();
@@ -148,19 +363,28 @@ export default function ScreenMirror({
               if (imgRef.current) {
                 imgRef.current.src = `data:image/jpeg;base64,${data.data}`;
               }
-              frameCountRef.current++;
-
-              // Update FPS stats
-              if (startTimeRef.current) {
-                const elapsed = (Date.now() - startTimeRef.current) / 1000;
-                const fps = frameCountRef.current / elapsed;
-                setStats({
-                  fps: Math.round(fps),
-                  frames: frameCountRef.current,
-                });
-              }
+              countFrame();
               break;
 
+            case "cursor":
+              cursorRef.current = data;
+              drawCursor();
+              break;
+
+            case "cursorShape": {
+              const image = new Image();
+              image.onload = drawCursor;
+              image.src = `data:image/png;base64,${data.data}`;
+              cursorShapeRef.current = {
+                image,
+                width: data.width,
+                height: data.height,
+                hotX: data.hotX,
+                hotY: data.hotY,
+              };
+              break;
+            }
+
             case "streamStopped":
               setConnectionState("disconnected");
               break;
@@ -185,7 +409,15 @@ export default function ScreenMirror({
       console.error("Failed to connect to screen server:", error);
       setConnectionState("failed");
     }
-  }, [getScreenWsUrl, quality, connectionState]);
+  }, [
+    getScreenWsUrl,
+    quality,
+    deltaMode,
+    cursorChannel,
+    drawTiles,
+    drawCursor,
+    connectionState,
+  ]);
 
   // Disconnect from screen server
   const disconnectScreen = useCallback(() => {
@@ -356,11 +588,14 @@ export default function ScreenMirror({
         }
         onClick={() => isInFullscreen && setShowControls(!showControls)}
       >
-        {connectionState === "streaming" ? (
+        {connectionState === "streaming" && streamMode === "delta" ? (
+          <canvas ref={canvasRef} className="w-full h-full object-contain" />
+        ) : connectionState === "streaming" ? (
           <img
             ref={imgRef}
             alt="Screen stream"
             className="w-full h-full object-contain"
+            onLoad={() => cursorRef.current && drawCursor()}
           />
         ) : (
           <div className="absolute inset-0 flex flex-col items-center justify-center text-gray-400">
@@ -380,6 +615,14 @@ export default function ScreenMirror({
           </div>
         )}
 
+        {/* Pointer from the cursor channel, over the frame */}
+        {connectionState === "streaming" && streamCursor === "channel" && (
+          <canvas
+            ref={cursorCanvasRef}
+            className="absolute inset-0 w-full h-full object-contain pointer-events-none"
+          />
+        )}
+
         {/* Stats overlay */}
         {connectionState === "streaming" && (
           <div className="absolute top-2 right-2 bg-black/70 px-2 py-1 rounded text-xs text-green-400">
@@ -526,6 +769,36 @@ export default function ScreenMirror({
             </div>
           </div>
 
+          {/* Delta mode (applies on the next Connect) */}
+          <label className="flex items-center justify-between bg-gray-800 p-4 rounded-lg cursor-pointer">
+            <span className="text-sm font-medium text-gray-300 flex items-center gap-2">
+              <Layers size={18} />
+              Envoyer seulement les zones modifiées
+            </span>
+            <input
+              type="checkbox"
+              checked={deltaMode}
+              disabled={connectionState === "streaming"}
+              onChange={(e) => setDeltaMode(e.target.checked)}
+              className="w-5 h-5 accent-blue-600"
+            />
+          </label>
+
+          {/* Cursor channel (applies on the next Connect) */}
+          <label className="flex items-center justify-between bg-gray-800 p-4 rounded-lg cursor-pointer">
+            <span className="text-sm font-medium text-gray-300 flex items-center gap-2">
+              <Navigation size={18} />
+              Curseur envoyé à part (plus fluide)
+            </span>
+            <input
+              type="checkbox"
+              checked={cursorChannel}
+              disabled={connectionState === "streaming"}
+              onChange={(e) => setCursorChannel(e.target.checked)}
+              className="w-5 h-5 accent-blue-600"
+            />
+          </label>
+
           {/* Sensitivity slider */}
           <div className="space-y-3 bg-gray-800 p-4 rounded-lg">
             <div className="flex items-center justify-between">